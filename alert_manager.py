@@ -1,33 +1,66 @@
 #!/usr/bin/env python3
 """
 Alert Manager - wysyła maile przy anomaliach
-Modyfikacja:
-- Wysyłka zbiorcza (summary)
-- Ignorowanie 'failed_login' w mailach (tylko oznaczane jako wysłane)
+Usage: python3 alert_manager.py [--loop]
+
+- Wysyłka zbiorcza (summary): niewysłane alerty są sklejane w jeden digest
+  w kolejce email_outbox; burza banów w oknie EMAIL_COALESCE_SECONDS
+  i nie częściej niż co EMAIL_DIGEST_INTERVAL daje jeden mail
+- Ignorowanie typów z EMAIL_SKIP_ALERT_TYPES (np. 'failed_login') - tylko oznaczane jako wysłane
+- Dostarczanie: jedno połączenie SMTP (STARTTLS + login) na całą paczkę
+  wiadomości; nieudane próby wracają do kolejki z wykładniczym backoffem,
+  po EMAIL_MAX_ATTEMPTS wiadomość zostaje jako 'failed'
+
+--loop: tryb demona, kolejka sprawdzana co EMAIL_POLL_INTERVAL s
 """
 
 import smtplib
+import sys
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import sqlite3
 from config import Config
+import db
 from datetime import datetime
 
-def send_summary_email(alerts_to_send):
-    """Wyślij zbiorczy email o alertach (tylko security_ban)"""
-    
-    if not alerts_to_send:
-        return True
+# Zapytania kolejki - sprawdzane też przez migrate_db.py --check
+QUERIES = {
+    'alerts_unsent': '''
+        SELECT * FROM alerts
+        WHERE email_sent = 0
+        ORDER BY created_at ASC
+    ''',
+    'outbox_due': '''
+        SELECT id, recipients, message, attempts FROM email_outbox
+        WHERE state = 'pending' AND next_attempt_at <= ?
+        ORDER BY id
+        LIMIT ?
+    ''',
+}
+
+# alert_type -> (ikona, kolor, tytuł) w digeście
+ALERT_STYLES = {
+    'security_ban': ("🚫", "#e74c3c", "IP Banned"),
+    'password_spray_user': ("🎯", "#e67e22", "Password Spraying"),
+    'password_spray_subnet': ("🎯", "#e67e22", "Password Spraying"),
+    'username_attempts': ("🎯", "#e67e22", "Targeted Username"),
+}
+DEFAULT_ALERT_STYLE = ("⚠️", "#f39c12", "Alert")
 
+def build_summary_email(alerts_to_send):
+    """Zbiorczy email o alertach (MIME); powyżej EMAIL_DIGEST_MAX_ITEMS tylko liczba pozostałych"""
     count = len(alerts_to_send)
-    subject = f"⚠️ Hoblera Summary: {count} Banned IPs"
+    bans = sum(1 for alert in alerts_to_send if alert['alert_type'] == 'security_ban')
+    if bans == count:
+        subject = f"⚠️ Hoblera Summary: {count} Banned IPs"
+    else:
+        subject = f"⚠️ Hoblera Summary: {count} Alerts ({bans} Banned IPs)"
     
     alerts_html = ""
-    for alert in alerts_to_send:
+    for alert in alerts_to_send[:Config.EMAIL_DIGEST_MAX_ITEMS]:
         # Determine icon/color based on alert type
-        icon = "🚫" 
-        color = "#e74c3c" # Red
-        title = "IP Banned"
+        icon, color, title = ALERT_STYLES.get(alert['alert_type'], DEFAULT_ALERT_STYLE)
         
         alerts_html += f"""
         <div style="background-color: #ffffff; border-left: 4px solid {color}; padding: 15px; margin-bottom: 15px; border-radius: 4px; box-shadow: 0 1px 3px rgba(0,0,0,0.1);">
@@ -40,6 +73,10 @@ def send_summary_email(alerts_to_send):
             </div>
         </div>
         """
+    if count > Config.EMAIL_DIGEST_MAX_ITEMS:
+        alerts_html += f"""
+        <p style="color: #7f8c8d; font-size: 14px;">... and {count - Config.EMAIL_DIGEST_MAX_ITEMS} more alerts on the dashboard.</p>
+        """
 
     html = f"""
     <!DOCTYPE html>
@@ -84,80 +121,182 @@ def send_summary_email(alerts_to_send):
     msg['From'] = f"Hoblera Monitoring <{Config.EMAIL_FROM}>"
     msg['To'] = Config.EMAIL_TO
     msg.attach(MIMEText(html, 'html'))
-    
-    try:
-        server = smtplib.SMTP(Config.SMTP_HOST, Config.SMTP_PORT)
-        server.starttls()
-        server.login(Config.SMTP_USER, Config.SMTP_PASS)
-        server.send_message(msg)
-        server.quit()
-        return True
-    except Exception as e:
-        print(f"Email error: {e}")
-        return False
+    return msg
+
+def enqueue_alerts(conn, now=None):
+    """Sklej niewysłane alerty w digest w email_outbox; zwraca liczbę zakolejkowanych maili.
 
-def check_and_send_alerts():
-    """Sprawdź niewysłane alerty i wyślij maile"""
-    conn = sqlite3.connect(Config.DB_FILE)
-    conn.row_factory = sqlite3.Row
+    Alerty czekają, aż najstarszy ma EMAIL_COALESCE_SECONDS, a od poprzedniego
+    digestu minęło EMAIL_DIGEST_INTERVAL - dzięki temu burza banów to jeden mail.
+    Alert raz zakolejkowany ma email_sent = 1 i nie jest już przeglądany.
+    """
+    now = now or time.time()
     cursor = conn.cursor()
-    
-    # Pobierz niewysłane alerty
-    cursor.execute('''
-        SELECT * FROM alerts 
-        WHERE email_sent = 0
-        ORDER BY created_at ASC
-    ''')
-    
-    alerts = cursor.fetchall()
-    
+    cursor.execute(QUERIES['alerts_unsent'])
+    alerts = [dict(row) for row in cursor.fetchall()]
     if not alerts:
-        print("No new alerts to process.")
-        conn.close()
-        return
+        return 0
 
-    # Filter alerts
-    alerts_to_email = []
-    ids_to_mark_sent = []
+    skipped = [alert['id'] for alert in alerts if alert['alert_type'] in Config.EMAIL_SKIP_ALERT_TYPES]
+    to_email = [alert for alert in alerts if alert['alert_type'] not in Config.EMAIL_SKIP_ALERT_TYPES]
+    _mark_sent(cursor, skipped)
+    if skipped:
+        print(f"Skipped email for {len(skipped)} alerts ({', '.join(Config.EMAIL_SKIP_ALERT_TYPES)})")
 
-    print(f"Processing {len(alerts)} new alerts...")
+    queued = 0
+    if to_email and _digest_due(cursor, to_email[0], now):
+        msg = build_summary_email(to_email)
+        cursor.execute('''
+            INSERT INTO email_outbox (subject, recipients, message, alert_count, next_attempt_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (msg['Subject'], Config.EMAIL_TO, msg.as_string(), len(to_email), now, now))
+        _mark_sent(cursor, [alert['id'] for alert in to_email])
+        print(f"Queued summary email with {len(to_email)} alerts")
+        queued = 1
+    conn.commit()
+    return queued
 
-    for alert in alerts:
-        alert_dict = dict(alert)
-        ids_to_mark_sent.append(alert['id'])
+def _digest_due(cursor, oldest_alert, now):
+    # created_at alertów to CURRENT_TIMESTAMP, czyli UTC
+    cursor.execute("SELECT CAST(strftime('%s', ?) AS INTEGER)", (oldest_alert['created_at'],))
+    oldest = cursor.fetchone()[0]
+    if oldest is not None and now - oldest < Config.EMAIL_COALESCE_SECONDS:
+        return False
+    cursor.execute("SELECT created_at FROM email_outbox ORDER BY id DESC LIMIT 1")
+    last = cursor.fetchone()
+    return last is None or now - last[0] >= Config.EMAIL_DIGEST_INTERVAL
 
-        # Logic: 
-        # - 'failed_login' -> Mark as sent, DO NOT EMAIL
-        # - 'security_ban' (or others) -> Mark as sent, ADD TO EMAIL
-        if alert['alert_type'] == 'failed_login':
-            print(f"Skipping email for failed_login alert ID {alert['id']}")
-            continue
-        
-        alerts_to_email.append(alert_dict)
-
-    # Send valid alerts
-    success = True
-    if alerts_to_email:
-        print(f"Sending summary email with {len(alerts_to_email)} alerts...")
-        if send_summary_email(alerts_to_email):
-            print("✓ Email sent successfully.")
-        else:
-            print("✗ Failed to send email.")
-            success = False
-    else:
-        print("No alerts requiring email.")
-
-    # Mark as sent ONLY if email was successful (or no email needed)
-    if success:
-        placeholders = ','.join('?' for _ in ids_to_mark_sent)
-        if ids_to_mark_sent:
-            cursor.execute(f'''
-                UPDATE alerts SET email_sent = 1 WHERE id IN ({placeholders})
-            ''', ids_to_mark_sent)
+def _mark_sent(cursor, ids):
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ','.join('?' for _ in chunk)
+        cursor.execute(f'''
+            UPDATE alerts SET email_sent = 1 WHERE id IN ({placeholders})
+        ''', chunk)
+
+def retry_delay(attempts):
+    """Wykładniczy backoff: EMAIL_RETRY_BASE * 2^(próby-1), najwyżej EMAIL_RETRY_MAX"""
+    return min(Config.EMAIL_RETRY_BASE * 2 ** (attempts - 1), Config.EMAIL_RETRY_MAX)
+
+class SmtpSession:
+    """Jedno połączenie SMTP (STARTTLS + login) otwierane przy pierwszej wiadomości paczki"""
+
+    def __init__(self):
+        self.server = None
+
+    def send(self, recipients, message):
+        if self.server is None:
+            server = smtplib.SMTP(Config.SMTP_HOST, Config.SMTP_PORT, timeout=Config.EMAIL_SMTP_TIMEOUT)
+            try:
+                server.starttls()
+                server.login(Config.SMTP_USER, Config.SMTP_PASS)
+            except Exception:
+                server.close()
+                raise
+            self.server = server
+        self.server.sendmail(Config.EMAIL_FROM, [r.strip() for r in recipients.split(',') if r.strip()], message)
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                self.server.close()
+            self.server = None
+
+def deliver(conn, now=None):
+    """Wyślij należne wiadomości z kolejki jednym połączeniem; zwraca (wysłane, odłożone)"""
+    now = now or time.time()
+    cursor = conn.cursor()
+    cursor.execute(QUERIES['outbox_due'], (now, Config.EMAIL_BATCH_SIZE))
+    due = cursor.fetchall()
+    if not due:
+        return 0, 0
+
+    sent = deferred = 0
+    session = SmtpSession()
+    try:
+        for message_id, recipients, message, attempts in due:
+            try:
+                session.send(recipients, message)
+            except (smtplib.SMTPException, OSError) as e:
+                deferred += 1
+                _defer(cursor, message_id, attempts + 1, e, now)
+                # Zerwane połączenie / błąd logowania - reszta paczki i tak by nie przeszła
+                if not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)):
+                    session.close()
+                    for other_id, _, _, other_attempts in due[sent + deferred:]:
+                        deferred += 1
+                        _defer(cursor, other_id, other_attempts + 1, e, now)
+                    break
+                continue
+            cursor.execute('''
+                UPDATE email_outbox
+                SET state = 'sent', attempts = ?, sent_at = ?, last_error = NULL
+                WHERE id = ?
+            ''', (attempts + 1, time.time(), message_id))
+            sent += 1
+            # Zapis po każdej wiadomości - wysłany mail nie pójdzie drugi raz po awarii
             conn.commit()
-            print(f"Marked {len(ids_to_mark_sent)} alerts as processed.")
+    finally:
+        session.close()
+        conn.commit()
+    return sent, deferred
+
+def _defer(cursor, message_id, attempts, error, now):
+    if attempts >= Config.EMAIL_MAX_ATTEMPTS:
+        state, next_attempt_at = 'failed', None
+        print(f"✗ Email {message_id} failed permanently after {attempts} attempts: {error}")
+    else:
+        state, next_attempt_at = 'pending', now + retry_delay(attempts)
+        print(f"✗ Email {message_id} failed (attempt {attempts}), retrying in {int(next_attempt_at - now)}s: {error}")
+    cursor.execute('''
+        UPDATE email_outbox SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ?
+        WHERE id = ?
+    ''', (state, attempts, next_attempt_at, str(error)[:500], message_id))
+
+def prune_outbox(conn, now=None):
+    """Usuń wysłane wiadomości starsze niż EMAIL_OUTBOX_RETENTION_DAYS ('failed' zostają do wglądu)"""
+    now = now or time.time()
+    conn.execute('''
+        DELETE FROM email_outbox WHERE state = 'sent' AND sent_at < ?
+    ''', (now - Config.EMAIL_OUTBOX_RETENTION_DAYS * 86400,))
+    conn.commit()
 
-    conn.close()
+def check_and_send_alerts(conn=None):
+    """Zakolejkuj nowe alerty i wyślij należne maile"""
+    own_conn = conn is None
+    if own_conn:
+        conn = db.connect(row_factory=sqlite3.Row)
+    try:
+        enqueue_alerts(conn)
+        sent, deferred = deliver(conn)
+        if sent or deferred:
+            print(f"✓ Sent {sent} emails, {deferred} waiting for retry")
+        prune_outbox(conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+def run_loop():
+    """Tryb demona: alerty wychodzą najpóźniej po EMAIL_COALESCE_SECONDS + EMAIL_POLL_INTERVAL"""
+    conn = db.connect(row_factory=sqlite3.Row)
+    print(f"Alert manager running, polling every {Config.EMAIL_POLL_INTERVAL}s")
+    try:
+        while True:
+            try:
+                check_and_send_alerts(conn)
+            except Exception as e:
+                print(f"[ERROR] Alert manager: {e}", file=sys.stderr)
+                conn.rollback()
+            time.sleep(Config.EMAIL_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        print("Stopping alert manager")
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
-    check_and_send_alerts()
+    if '--loop' in sys.argv[1:]:
+        run_loop()
+    else:
+        check_and_send_alerts()
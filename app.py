@@ -4,81 +4,149 @@ Hoblera Monitor - Enhanced v2.1
 With Django Applications Monitoring
 """
 
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
 import sqlite3
 import psutil
 import subprocess
 from datetime import datetime, timedelta
 from config import Config
+import db
+import rollups
+import metrics_tiers
+import downsample
+import heavy_hitters
+import net_rates
+import systemd_status
+from process_sampler import ProcessSampler
+import live_events
+from metrics_ring import RingReader
 from pathlib import Path
 import sys
 import requests
 import time as time_module
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 import configparser
+import hashlib
+import json
+import re
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
 def get_db():
-    conn = sqlite3.connect(Config.DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db.connect(row_factory=sqlite3.Row)
+
+TRUSTED_IP_LIST = ('10.10.10.102', '10.10.10.103', '127.0.0.1', '10.10.10.111')
+TRUSTED_IPS = str(TRUSTED_IP_LIST)
+# Jak w top_ips: zaufane hosty i nasze instancje EC2 nie są atakującymi
+TRUSTED_DNS_RE = re.compile(r'^ec2-.*\.eu-central-1\.compute\.amazonaws\.com$')
+
+# Zapytania endpointów API w jednym miejscu - `migrate_db.py --check`
+# sprawdza przez EXPLAIN QUERY PLAN, że każde z nich korzysta z indeksu
+API_QUERIES = {
+    'stats_unique_ips': '''
+        SELECT COUNT(*) as unique_ips
+        FROM ips
+        WHERE last_seen > datetime('now', 'localtime', '-1 day')
+    ''',
+    'stats_alerts': '''
+        SELECT COUNT(*) as active_alerts
+        FROM alerts
+        WHERE created_at > datetime('now', 'localtime', '-1 day')
+    ''',
+    # Liczniki w ips są narastające od pierwszego wystąpienia IP;
+    # okno czasowe wybiera tylko IP aktywne ostatnio (last_seen) - panele
+    # dashboardu opisują to jako "active in 7 days / 24h, all-time attempts"
+    'top_ips': f'''
+        SELECT
+            ip_address,
+            dns_name,
+            usernames,
+            accepted_count + failed_count + invalid_count as total_attempts,
+            accepted_count as successful,
+            failed_count + invalid_count as failed,
+            last_seen
+        FROM ips
+        WHERE last_seen > datetime('now', 'localtime', '-7 days')
+        AND (dns_name IS NULL OR dns_name NOT LIKE 'ec2-%.eu-central-1.compute.amazonaws.com')
+        AND ip_address NOT IN {TRUSTED_IPS}
+        ORDER BY total_attempts DESC
+        LIMIT 20
+    ''',
+    'trusted_hosts': f'''
+        SELECT
+            ip_address,
+            dns_name,
+            usernames,
+            accepted_count + failed_count + invalid_count as total_attempts,
+            accepted_count as successful,
+            failed_count + invalid_count as failed,
+            last_seen
+        FROM ips
+        WHERE last_seen > datetime('now', 'localtime', '-1 day')
+        AND (
+            dns_name LIKE 'ec2-%.eu-central-1.compute.amazonaws.com'
+            OR ip_address IN {TRUSTED_IPS}
+        )
+        ORDER BY last_seen DESC
+        LIMIT 20
+    ''',
+    # dns_name z ips - resolver uzupełnia nazwę tylko tam, nie w historii logów
+    'recent_logs': '''
+        SELECT l.id, l.timestamp, l.username, l.ip_address,
+               COALESCE(i.dns_name, l.dns_name) as dns_name,
+               l.port, l.status, l.message, l.created_at
+        FROM ssh_logs l
+        LEFT JOIN ips i ON i.ip_address = l.ip_address
+        ORDER BY l.timestamp DESC
+        LIMIT 100
+    ''',
+    'alerts': '''
+        SELECT *
+        FROM alerts
+        WHERE created_at > datetime('now', 'localtime', '-7 days')
+        AND email_sent = 0
+        ORDER BY created_at DESC
+        LIMIT 50
+    ''',
+    # Wersje sekcji /api/dashboard - muszą być tańsze niż same dane
+    'version_ssh': '''
+        SELECT id FROM ssh_logs_latest
+    ''',
+    'version_alerts': '''
+        SELECT
+            (SELECT MAX(id) FROM alerts) as last_id,
+            (SELECT COUNT(*) FROM alerts WHERE email_sent = 0) as unsent
+    ''',
+    'version_system_history': '''
+        SELECT MAX(id) FROM system_metrics
+    ''',
+}
 
 def run_command(cmd):
     """Bezpieczne uruchomienie komendy"""
     try:
         result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=5)
         stdout = result.stdout.strip() if result.stdout else ""
-        stderr = result.stderr.strip() if result.stderr else ""
-        
-        # Debug log
-        print(f"[DEBUG] CMD: {cmd}", file=sys.stderr)
-        print(f"[DEBUG] Return: {result.returncode}, Stdout: '{stdout}', Stderr: '{stderr}'", file=sys.stderr)
-        
         return stdout, result.returncode
     except Exception as e:
         print(f"[ERROR] Command failed: {cmd}, Error: {e}", file=sys.stderr)
         return "", -1
 
-@app.route('/')
-def index():
-    return render_template('dashboard.html')
+# Próbkowanie systemu w tle: /api/stats oddaje gotowy snapshot zamiast
+# czekać sekundę na cpu_percent(interval=1) przy każdym odświeżeniu
+_system_snapshot = None
+_snapshot_ready = threading.Event()
+# Numery kolejnych próbek - wersje sekcji stats i top_processes w /api/dashboard
+_system_generation = 0
+_processes_generation = 0
+_sampler_lock = threading.Lock()
+_sampler_thread = None
+_process_sampler = ProcessSampler(top_k=10)
 
-@app.route('/api/stats')
-def api_stats():
-    """Statystyki ogólne"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # SSH stats (last 24h)
-    cursor.execute('''
-        SELECT 
-            COUNT(*) as total,
-            SUM(CASE WHEN status = 'accepted' THEN 1 ELSE 0 END) as successful,
-            SUM(CASE WHEN status IN ('failed', 'invalid') THEN 1 ELSE 0 END) as failed
-        FROM ssh_logs
-        WHERE timestamp > datetime('now', 'localtime', '-1 day')
-    ''')
-    ssh_stats = dict(cursor.fetchone())
-    
-    cursor.execute('''
-        SELECT COUNT(DISTINCT ip_address) as unique_ips
-        FROM ssh_logs
-        WHERE timestamp > datetime('now', 'localtime', '-1 day')
-    ''')
-    ssh_stats['unique_ips'] = cursor.fetchone()[0]
-    
-    cursor.execute('''
-        SELECT COUNT(*) as active_alerts
-        FROM alerts
-        WHERE created_at > datetime('now', 'localtime', '-1 day')
-    ''')
-    alerts_count = cursor.fetchone()[0]
-    
-    memory = psutil.virtual_memory()
-    net = psutil.net_io_counters()
-    
-    # Media disk (/dev/sdb1)
+def _sample_disks():
+    """Dysk główny i media (/dev/sdb1) - odświeżane rzadziej niż CPU/RAM"""
     media_disk = None
     for partition in psutil.disk_partitions():
         if '/media' in partition.mountpoint or 'sdb' in partition.device:
@@ -96,36 +164,127 @@ def api_stats():
             except:
                 continue
     
-    # Root disk
     root_disk = psutil.disk_usage('/')
-    
-    system = {
-        'cpu_percent': psutil.cpu_percent(interval=1),
-        'cpu_count': psutil.cpu_count(),
-        'memory_percent': memory.percent,
-        'memory_total_gb': round(memory.total / (1024**3), 2),
-        'memory_used_gb': round(memory.used / (1024**3), 2),
+    return {
         'root_disk_percent': root_disk.percent,
         'root_disk_total_gb': round(root_disk.total / (1024**3), 2),
         'root_disk_used_gb': round(root_disk.used / (1024**3), 2),
         'root_disk_free_gb': round(root_disk.free / (1024**3), 2),
         'media_disk': media_disk,
+    }
+
+# Prędkości sieci między kolejnymi próbkami wątku samplera
+_net_rates = net_rates.RateTracker()
+
+def _sample_system(disks):
+    memory = psutil.virtual_memory()
+    net = psutil.net_io_counters()
+    nic_rates = _net_rates.update()
+    now = datetime.now()
+    uptime = int((now - datetime.fromtimestamp(psutil.boot_time())).total_seconds())
+    
+    return {
+        # CPU od poprzedniego wywołania, czyli średnia z ostatniego okresu próbkowania
+        'cpu_percent': psutil.cpu_percent(interval=None),
+        'cpu_count': psutil.cpu_count(),
+        'memory_percent': memory.percent,
+        'memory_total_gb': round(memory.total / (1024**3), 2),
+        'memory_used_gb': round(memory.used / (1024**3), 2),
+        **disks,
         'network_sent_mb': round(net.bytes_sent / (1024**2), 2),
         'network_recv_mb': round(net.bytes_recv / (1024**2), 2),
-        'uptime_seconds': int((datetime.now() - datetime.fromtimestamp(psutil.boot_time())).total_seconds()),
-        'uptime_human': str(timedelta(seconds=int((datetime.now() - datetime.fromtimestamp(psutil.boot_time())).total_seconds())))
+        # B/s i pakiety/s od poprzedniej próbki (puste przy pierwszej)
+        'network_rates': nic_rates,
+        'network_total_rates': net_rates.totals(nic_rates),
+        'uptime_seconds': uptime,
+        'uptime_human': str(timedelta(seconds=uptime)),
+        'sampled_at': now.isoformat(timespec='seconds'),
     }
+
+def _sampler_loop():
+    global _system_snapshot, _system_generation, _processes_generation
+    # Pierwsze wywołanie cpu_percent(None) zawsze zwraca 0.0 - tylko ustawia punkt odniesienia
+    psutil.cpu_percent(interval=None)
+    _process_sampler.tick()
+    time_module.sleep(Config.STATS_FIRST_SAMPLE_DELAY)
+    disks = None
+    disks_at = 0
+    processes_at = 0
+    live_at = time_module.monotonic()
+    while True:
+        try:
+            if disks is None or time_module.monotonic() - disks_at >= Config.STATS_DISK_INTERVAL:
+                disks = _sample_disks()
+                disks_at = time_module.monotonic()
+            if time_module.monotonic() - processes_at >= Config.PROCESS_SAMPLE_INTERVAL:
+                _process_sampler.tick()
+                _processes_generation += 1
+                processes_at = time_module.monotonic()
+            # Podmiana całego słownika - czytelnicy nie potrzebują blokady
+            _system_snapshot = _sample_system(disks)
+            _system_generation += 1
+            _snapshot_ready.set()
+        except Exception as e:
+            print(f"[ERROR] System sampler: {e}", file=sys.stderr)
+        if time_module.monotonic() - live_at >= Config.DASHBOARD_LIVE_INTERVAL:
+            # Podprocesy i sondy HTTP tutaj, a nie przy każdym sprawdzeniu wersji dashboardu
+            _refresh_live_sections()
+            live_at = time_module.monotonic()
+        time_module.sleep(Config.STATS_SAMPLE_INTERVAL)
+
+def start_system_sampler():
+    """Uruchom wątek próbkujący (raz na proces, przy pierwszym żądaniu)"""
+    global _sampler_thread
+    with _sampler_lock:
+        if _sampler_thread is None:
+            _sampler_thread = threading.Thread(target=_sampler_loop, name='system-sampler', daemon=True)
+            _sampler_thread.start()
+
+def _wait_for_first_sample():
+    start_system_sampler()
+    if not _snapshot_ready.is_set():
+        _snapshot_ready.wait(Config.STATS_FIRST_SAMPLE_DELAY + 5)
+
+def get_system_snapshot():
+    """Ostatni snapshot metryk systemu (z polem sampled_at)"""
+    _wait_for_first_sample()
+    return _system_snapshot
+
+@app.route('/')
+def index():
+    return render_template('dashboard.html')
+
+def _stats_data(conn):
+    """Statystyki ogólne"""
+    cursor = conn.cursor()
     
-    conn.close()
+    # SSH stats (last 24h) - z agregatów godzinowych + surowe brzegi
+    ssh_stats = rollups.ssh_counts(conn, datetime.now() - timedelta(days=1))
     
-    return jsonify({
+    cursor.execute(API_QUERIES['stats_unique_ips'])
+    ssh_stats['unique_ips'] = cursor.fetchone()[0]
+    
+    cursor.execute(API_QUERIES['stats_alerts'])
+    alerts_count = cursor.fetchone()[0]
+    
+    # Metryki systemu z wątku próbkującego - bez blokowania na cpu_percent
+    system = get_system_snapshot()
+    
+    return {
         'ssh': ssh_stats,
         'system': system,
         'alerts': alerts_count
-    })
+    }
 
-@app.route('/api/disk_partitions')
-def api_disk_partitions():
+@app.route('/api/stats')
+def api_stats():
+    """Statystyki ogólne"""
+    conn = get_db()
+    data = _stats_data(conn)
+    conn.close()
+    return jsonify(data)
+
+def _disk_partitions_data():
     """Kompaktowa lista partycji"""
     partitions = []
     for partition in psutil.disk_partitions():
@@ -141,36 +300,23 @@ def api_disk_partitions():
         except:
             continue
     
-    return jsonify(partitions)
+    return partitions
+
+@app.route('/api/disk_partitions')
+def api_disk_partitions():
+    """Kompaktowa lista partycji"""
+    return jsonify(_disk_partitions_data())
 
 @app.route('/api/top_processes')
 def api_top_processes():
-    """Top procesy"""
-    processes = []
-    
-    for proc in psutil.process_iter(['pid', 'name', 'username', 'cpu_percent', 'memory_percent']):
-        try:
-            pinfo = proc.info
-            processes.append({
-                'pid': pinfo['pid'],
-                'name': pinfo['name'],
-                'username': pinfo['username'],
-                'cpu_percent': pinfo['cpu_percent'],
-                'memory_percent': round(pinfo['memory_percent'], 2)
-            })
-        except:
-            continue
-    
-    processes_cpu = sorted(processes, key=lambda x: x['cpu_percent'] or 0, reverse=True)[:10]
-    processes_mem = sorted(processes, key=lambda x: x['memory_percent'] or 0, reverse=True)[:10]
-    
-    return jsonify({
-        'by_cpu': processes_cpu,
-        'by_memory': processes_mem
-    })
+    """Top procesy z ostatniego ticku samplera (CPU liczone między tickami)"""
+    return jsonify(_top_processes_data())
 
-@app.route('/api/systemd_services')
-def api_systemd_services():
+def _top_processes_data():
+    _wait_for_first_sample()
+    return _process_sampler.latest() or {'by_cpu': [], 'by_memory': [], 'sampled_at': None}
+
+def _systemd_services_data():
     """Status serwisów"""
     services = [
         'instagram-gallery',
@@ -180,115 +326,126 @@ def api_systemd_services():
         'cron'
     ]
     
-    statuses = []
-    for service in services:
-        output, returncode = run_command(f"/usr/bin/systemctl is-active {service}")
-        
-        # Explicit check
-        active = (returncode == 0 and output.strip() == 'active')
-        
-        print(f"[SERVICE] {service}: output='{output}', returncode={returncode}, active={active}", file=sys.stderr)
-        
-        statuses.append({
-            'name': service,
-            'active': active,
-            'status': output if output else 'unknown'
-        })
-    
-    return jsonify(statuses)
+    # Jedno `systemctl show` dla wszystkich serwisów (z krótkim cache)
+    units = systemd_status.get_unit_statuses(services)
+    return [{'name': service, **systemd_status.summarize(units[service])} for service in services]
 
-@app.route('/api/apps')
-def api_apps():
-    """Status applications (Django & Flask)"""
-    apps = [
-        {
-            'name': 'HobleraVOD',
-            'type': 'Django',
-            'service': 'hoblera-vod',
-            'url': 'http://10.10.10.111:8000',
-            'path': '/www/HobleraVOD',
-            'process_match': 'HobleraVOD'
-        },
-        {
-            'name': 'Instagram Gallery',
-            'type': 'Flask',
-            'service': 'instagram-gallery',
-            'url': 'http://10.10.10.111:8001',
-            'path': '/www/InstagramGallery',
-            'process_match': 'InstagramGallery/app.py'
-        },
-        {
-            'name': 'Hoblera Monitor',
-            'type': 'Flask',
-            'service': 'hoblera-monitor',
-            'url': 'http://10.10.10.111:8002',
-            'path': '/www/HobleraMonitor',
-            'process_match': 'HobleraMonitor/app.py'
-        },
-        {
-            'name': 'MiniDLNA',
-            'type': 'Media Server',
-            'service': 'minidlna',
-            'url': 'http://10.10.10.111:8200/',
-            'path': '/var/cache/minidlna',
-            'process_match': 'minidlnad'
-        }
-    ]
-    
-    results = []
-    for app in apps:
-        # Check systemd service
-        output, returncode = run_command(f"/usr/bin/systemctl is-active {app['service']}")
-        service_active = (returncode == 0 and output.strip() == 'active')
-        
-        # Check HTTP response
-        http_ok = False
-        response_time = None
-        try:
-            start = time_module.time()
-            resp = requests.get(app['url'], timeout=5)
-            response_time = round((time_module.time() - start) * 1000, 2)  # ms
-            # Treat any non-server-error as online (e.g. 403 Forbidden means it's running)
-            http_ok = (resp.status_code < 500)
-        except Exception as e:
-            print(f"[ERROR] HTTP check failed for {app['name']}: {e}", file=sys.stderr)
-        
-        # Check if directory exists
-        path_exists = Path(app['path']).exists()
-        
-        # Get process info
-        process_info = None
+@app.route('/api/systemd_services')
+def api_systemd_services():
+    """Status serwisów"""
+    return jsonify(_systemd_services_data())
+
+MONITORED_APPS = [
+    {
+        'name': 'HobleraVOD',
+        'type': 'Django',
+        'service': 'hoblera-vod',
+        'url': 'http://10.10.10.111:8000',
+        'path': '/www/HobleraVOD',
+        'process_match': 'HobleraVOD'
+    },
+    {
+        'name': 'Instagram Gallery',
+        'type': 'Flask',
+        'service': 'instagram-gallery',
+        'url': 'http://10.10.10.111:8001',
+        'path': '/www/InstagramGallery',
+        'process_match': 'InstagramGallery/app.py'
+    },
+    {
+        'name': 'Hoblera Monitor',
+        'type': 'Flask',
+        'service': 'hoblera-monitor',
+        'url': 'http://10.10.10.111:8002',
+        'path': '/www/HobleraMonitor',
+        'process_match': 'HobleraMonitor/app.py'
+    },
+    {
+        'name': 'MiniDLNA',
+        'type': 'Media Server',
+        'service': 'minidlna',
+        'url': 'http://10.10.10.111:8200/',
+        'path': '/var/cache/minidlna',
+        'process_match': 'minidlnad'
+    }
+]
+
+# Sondy aplikacji idą równolegle; wspólna sesja HTTP trzyma połączenia keep-alive
+_probe_executor = ThreadPoolExecutor(max_workers=Config.APPS_PROBE_WORKERS, thread_name_prefix='probe')
+_http_session = requests.Session()
+_http_session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=Config.APPS_PROBE_WORKERS))
+
+def _probe_http(app):
+    """Check HTTP response - (http_ok, response_time_ms)"""
+    try:
+        start = time_module.time()
+        resp = _http_session.get(app['url'], timeout=Config.APPS_HTTP_TIMEOUT)
+        response_time = round((time_module.time() - start) * 1000, 2)  # ms
+        # Treat any non-server-error as online (e.g. 403 Forbidden means it's running)
+        return resp.status_code < 500, response_time
+    except Exception as e:
+        print(f"[ERROR] HTTP check failed for {app['name']}: {e}", file=sys.stderr)
+        return False, None
+
+def _apps_data():
+    """Status applications (Django & Flask)
+
+    Sondy systemctl/HTTP lecą równolegle, procesy z ostatniego ticku samplera; po APPS_PROBE_DEADLINE
+    zwracamy to, co jest, a aplikacje z niedokończonymi sondami mają timed_out.
+    """
+    _wait_for_first_sample()
+    found = _process_sampler.find([app['process_match'] for app in MONITORED_APPS])
+    units = _probe_executor.submit(systemd_status.get_unit_statuses, [app['service'] for app in MONITORED_APPS])
+    http_checks = [_probe_executor.submit(_probe_http, app) for app in MONITORED_APPS]
+    
+    wait([units] + http_checks, timeout=Config.APPS_PROBE_DEADLINE)
+    unit_statuses = {}
+    if units.done():
         try:
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'memory_percent', 'cpu_percent']):
-                cmdline = ' '.join(proc.info['cmdline'] or [])
-                # Generalize matching logic
-                if app['process_match'] in cmdline:
-                    process_info = {
-                        'pid': proc.info['pid'],
-                        'memory_percent': round(proc.info['memory_percent'], 2),
-                        'cpu_percent': round(proc.info['cpu_percent'] or 0, 2)
-                    }
-                    break
+            unit_statuses = units.result()
         except Exception as e:
-            print(f"[ERROR] Process check failed for {app['name']}: {e}", file=sys.stderr)
+            # Nieudana sonda systemctl - unity nieznane, jak przy spóźnionej
+            print(f"[ERROR] systemctl probe failed: {e}", file=sys.stderr)
+    
+    results = []
+    for app, http_check in zip(MONITORED_APPS, http_checks):
+        http_ok, response_time = http_check.result() if http_check.done() else (False, None)
+        status = unit_statuses.get(app['service'])
+        unit = systemd_status.summarize(status) if status else {}
         
         results.append({
             'name': app['name'],
             'type': app['type'],
             'service': app['service'],
-            'service_active': service_active,
+            'service_active': unit.get('active', False),
+            'service_memory_mb': unit.get('memory_mb'),
+            'service_cpu_seconds': unit.get('cpu_seconds'),
             'http_ok': http_ok,
             'response_time_ms': response_time,
             'path': app['path'],
-            'path_exists': path_exists,
+            'path_exists': Path(app['path']).exists(),
             'url': app['url'],
-            'process': process_info
+            'process': found.get(app['process_match']),
+            'timed_out': not (units.done() and http_check.done())
         })
     
-    return jsonify(results)
+    return results
 
-@app.route('/api/banned_ips')
-def api_banned_ips():
+_apps_cache = {'at': 0.0, 'data': None}
+
+def _cached_apps_data():
+    """Wynik sond aplikacji sprzed najwyżej APPS_CACHE_TTL sekund"""
+    if _apps_cache['data'] is None or time_module.monotonic() - _apps_cache['at'] >= Config.APPS_CACHE_TTL:
+        _apps_cache['data'] = _apps_data()
+        _apps_cache['at'] = time_module.monotonic()
+    return _apps_cache['data']
+
+@app.route('/api/apps')
+def api_apps():
+    """Status applications (Django & Flask)"""
+    return jsonify(_cached_apps_data())
+
+def _banned_ips_data():
     """Lista zbanowanych IP z fail2ban"""
     # Process runs as root, sudo not needed (and not in path)
     output, returncode = run_command("/usr/bin/fail2ban-client status sshd")
@@ -305,158 +462,328 @@ def api_banned_ips():
                 break
     
     # Return list of objects for easier future extensibility (e.g. adding ban time)
-    return jsonify([{'ip': ip} for ip in banned_ips])
+    return [{'ip': ip} for ip in banned_ips]
+
+@app.route('/api/banned_ips')
+def api_banned_ips():
+    """Lista zbanowanych IP z fail2ban"""
+    return jsonify(_banned_ips_data())
+
+def _query_rows(conn, name):
+    """Wiersze zapytania z API_QUERIES jako lista słowników"""
+    cursor = conn.cursor()
+    cursor.execute(API_QUERIES[name])
+    return [dict(row) for row in cursor.fetchall()]
+
+def _local_datetime(value):
+    """ISO 8601 -> naiwny czas lokalny (wartość z przesunięciem jest przeliczana)"""
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+def _range_args(default_span, max_span):
+    """(start, end) z ?from=&to= (ISO 8601, czas lokalny); domyślnie ostatnie default_span.
+
+    Zakres jest przycinany do max_span; błędny format -> ValueError.
+    """
+    end = _local_datetime(request.args['to']) if request.args.get('to') else datetime.now()
+    start = _local_datetime(request.args['from']) if request.args.get('from') else end - default_span
+    if start >= end:
+        raise ValueError("'from' must be earlier than 'to'")
+    return max(start, end - max_span), end
+
+def _max_points_arg():
+    max_points = request.args.get('max_points', Config.HISTORY_DEFAULT_POINTS, type=int)
+    return max(3, min(max_points, Config.HISTORY_MAX_POINTS))
 
 @app.route('/api/ssh_timeline')
 def api_ssh_timeline():
+    """Oś czasu SSH w kolumnach; ?from=&to=&max_points= (albo ?days=N, domyślnie 1)"""
+    days = max(request.args.get('days', 1, type=int), 1)
+    try:
+        start, end = _range_args(timedelta(days=days), timedelta(days=Config.SSH_TIMELINE_MAX_DAYS))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            strftime('%Y-%m-%d %H:00:00', timestamp) as hour,
-            status,
-            COUNT(*) as count
-        FROM ssh_logs
-        WHERE timestamp > datetime('now', 'localtime', '-1 day')
-        GROUP BY hour, status
-        ORDER BY hour
-    ''')
-    
-    data = cursor.fetchall()
+    data = rollups.ssh_timeline_columns(conn, start, end, _max_points_arg())
     conn.close()
     
-    return jsonify([dict(row) for row in data])
+    return jsonify(data)
 
 @app.route('/api/top_ips')
 def api_top_ips():
     conn = get_db()
-    cursor = conn.cursor()
-    
-    trusted_ips = "('10.10.10.102', '10.10.10.103', '127.0.0.1', '10.10.10.111')"
-    
-    cursor.execute(f'''
-        SELECT 
-            ip_address,
-            MAX(dns_name) as dns_name,
-            GROUP_CONCAT(DISTINCT username) as usernames,
-            COUNT(*) as total_attempts,
-            SUM(CASE WHEN status = 'accepted' THEN 1 ELSE 0 END) as successful,
-            SUM(CASE WHEN status IN ('failed', 'invalid') THEN 1 ELSE 0 END) as failed,
-            MAX(timestamp) as last_seen
-        FROM ssh_logs
-        WHERE timestamp > datetime('now', 'localtime', '-7 days')
-        AND (dns_name IS NULL OR dns_name NOT LIKE 'ec2-%.eu-central-1.compute.amazonaws.com')
-        AND ip_address NOT IN {trusted_ips}
-        GROUP BY ip_address
-        ORDER BY total_attempts DESC
-        LIMIT 20
-    ''')
+    data = _query_rows(conn, 'top_ips')
+    conn.close()
     
-    data = cursor.fetchall()
+    return jsonify(data)
+
+def _top_attackers_data(conn, window, limit):
+    """Top atakujących z kubełków Space-Saving, z nazwą DNS i ostatnią aktywnością z ips"""
+    cursor = conn.cursor()
+    dns_names = {}
+    
+    def excluded(ip):
+        if ip in TRUSTED_IP_LIST:
+            return True
+        if ip not in dns_names:
+            cursor.execute("SELECT dns_name FROM ips WHERE ip_address = ?", (ip,))
+            row = cursor.fetchone()
+            dns_names[ip] = row[0] if row else None
+        return bool(dns_names[ip] and TRUSTED_DNS_RE.match(dns_names[ip]))
+    
+    data = heavy_hitters.top_attackers(conn, window, limit, exclude=excluded)
+    for item in data['items']:
+        item['dns_name'] = dns_names.get(item['ip_address'])
+    return data
+
+@app.route('/api/top_attackers')
+def api_top_attackers():
+    """Top IP po nieudanych próbach w oknie ?window=1h|24h|30d (domyślnie 24h), ?limit=
+
+    Liczby są przybliżone: count to górne, min_count dolne oszacowanie,
+    IP spoza listy miało najwyżej max_error prób.
+    """
+    limit = max(1, min(request.args.get('limit', Config.TOPK_DEFAULT_LIMIT, type=int), Config.TOPK_CAPACITY))
+    try:
+        window = heavy_hitters.parse_window(request.args.get('window', '24h'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    conn = get_db()
+    data = _top_attackers_data(conn, window, limit)
     conn.close()
     
-    return jsonify([dict(row) for row in data])
+    data['window'] = request.args.get('window', '24h')
+    return jsonify(data)
 
 @app.route('/api/trusted_hosts')
 def api_trusted_hosts():
     conn = get_db()
-    cursor = conn.cursor()
-    
-    trusted_ips = "('10.10.10.102', '10.10.10.103', '127.0.0.1', '10.10.10.111')"
-    
-    cursor.execute(f'''
-        SELECT 
-            ip_address,
-            MAX(dns_name) as dns_name,
-            GROUP_CONCAT(DISTINCT username) as usernames,
-            COUNT(*) as total_attempts,
-            SUM(CASE WHEN status = 'accepted' THEN 1 ELSE 0 END) as successful,
-            SUM(CASE WHEN status IN ('failed', 'invalid') THEN 1 ELSE 0 END) as failed,
-            MAX(timestamp) as last_seen
-        FROM ssh_logs
-        WHERE timestamp > datetime('now', 'localtime', '-1 day')
-        AND (
-            dns_name LIKE 'ec2-%.eu-central-1.compute.amazonaws.com'
-            OR ip_address IN {trusted_ips}
-        )
-        GROUP BY ip_address
-        ORDER BY last_seen DESC
-        LIMIT 20
-    ''')
-    
-    data = cursor.fetchall()
+    data = _query_rows(conn, 'trusted_hosts')
     conn.close()
     
-    return jsonify([dict(row) for row in data])
+    return jsonify(data)
 
 @app.route('/api/recent_logs')
 def api_recent_logs():
     conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT *
-        FROM ssh_logs
-        ORDER BY timestamp DESC
-        LIMIT 100
-    ''')
-    
-    data = cursor.fetchall()
+    data = _query_rows(conn, 'recent_logs')
     conn.close()
     
-    return jsonify([dict(row) for row in data])
+    return jsonify(data)
 
 @app.route('/api/alerts')
 def api_alerts():
     conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT *
-        FROM alerts
-        WHERE created_at > datetime('now', 'localtime', '-7 days')
-        AND email_sent = 0
-        ORDER BY created_at DESC
-        LIMIT 50
-    ''')
-    
-    data = cursor.fetchall()
+    data = _query_rows(conn, 'alerts')
     conn.close()
     
-    return jsonify([dict(row) for row in data])
+    return jsonify(data)
+
+# Gauge idą przez LTTB, liczniki bajtów jako średnia prędkość w kubełku
+METRIC_GAUGES = ('cpu_percent', 'memory_percent', 'disk_percent')
+METRIC_COUNTERS = ('net_sent_bytes', 'net_recv_bytes')
+
+def _system_history_data(conn, start, end, max_points):
+    """Historia metryk w kolumnach, co najwyżej max_points punktów.
+
+    last = ostatnia próbka z licznikami, od której dashboard liczy prędkości
+    dla próbek przychodzących przez SSE.
+    """
+    tier, rows = metrics_tiers.history(conn, start, end, Config.HISTORY_SCAN_ROWS)
+    data = downsample.series_columns(rows, max_points, METRIC_GAUGES, METRIC_COUNTERS)
+    data['tier'] = tier
+    data['last'] = {name: rows[-1][name] for name in ('timestamp',) + METRIC_COUNTERS} if rows else None
+    return data
 
 @app.route('/api/system_history')
 def api_system_history():
+    """Historia metryk w kolumnach; ?from=&to=&max_points= (albo ?hours=N, domyślnie 24)"""
+    hours = max(request.args.get('hours', 24, type=int), 1)
+    try:
+        start, end = _range_args(timedelta(hours=hours), timedelta(hours=Config.HISTORY_MAX_HOURS))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT *
-        FROM system_metrics
-        WHERE timestamp > datetime('now', 'localtime', '-1 day')
-        ORDER BY timestamp
-    ''')
+    data = _system_history_data(conn, start, end, _max_points_arg())
+    conn.close()
     
-    data = cursor.fetchall()
+    response = jsonify(data)
+    response.headers['X-History-Tier'] = data['tier']
+    return response
+
+@app.route('/api/network_history')
+def api_network_history():
+    """Prędkości sieci per interfejs i suma w kolumnach; ?from=&to=&max_points= (albo ?hours=N, domyślnie 24)"""
+    hours = max(request.args.get('hours', 24, type=int), 1)
+    try:
+        start, end = _range_args(timedelta(hours=hours), timedelta(days=Config.NET_RATES_RETENTION_DAYS))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    conn = get_db()
+    data = net_rates.history(conn, start, end, _max_points_arg())
     conn.close()
     
-    return jsonify([dict(row) for row in data])
+    return jsonify(data)
 
-@app.route('/api/fail2ban/config', methods=['GET'])
-def get_fail2ban_config():
+def _content_version(data):
+    """Wersja sekcji bez licznika w bazie - skrót z treści"""
+    payload = json.dumps(data, sort_keys=True, default=str).encode()
+    return hashlib.sha1(payload).hexdigest()[:12]
+
+# Sekcje dashboardu bez licznika w bazie: {sekcja: (wersja, dane)},
+# odświeżane przez wątek samplera co DASHBOARD_LIVE_INTERVAL
+_live_sections = {}
+
+def _refresh_live_sections():
+    """Załaduj sekcje na żywo i policz ich wersje (skrót treści)"""
+    global _live_sections
+    live = {
+        'services': _systemd_services_data,
+        'partitions': _disk_partitions_data,
+        'apps': _cached_apps_data,
+        'banned_ips': _banned_ips_data,
+        'fail2ban_config': _fail2ban_config_data,
+    }
+    sections = {}
+    for name, loader in live.items():
+        try:
+            data = loader()
+        except Exception as e:
+            data = {'error': str(e)}
+        sections[name] = (_content_version(data), data)
+    _live_sections = sections
+    return sections
+
+def _dashboard_sections(conn):
+    """{sekcja: (wersja, loader)}
+
+    Wersje pochodzą tylko z liczników: MAX(id) ingestu i alertów, numer próbki
+    samplera, skrót sekcji na żywo z ostatniego odświeżenia w wątku samplera.
+    Sprawdzenie wersji to kilka odczytów z indeksu, bez podprocesów, a zapytań
+    sekcji nie wykonujemy, gdy klient ma już tę wersję. Sekcje z oknem czasowym
+    (ostatnie 24h, 7 dni) przesuwają się razem z nowymi danymi.
+    """
+    _wait_for_first_sample()
+    cursor = conn.cursor()
+    cursor.execute(API_QUERIES['version_ssh'])
+    ssh = cursor.fetchone()[0]
+    cursor.execute(API_QUERIES['version_alerts'])
+    alerts = '.'.join(str(v) for v in cursor.fetchone())
+    cursor.execute(API_QUERIES['version_system_history'])
+    metrics = cursor.fetchone()[0]
+    
+    sections = {
+        'stats': (f"{ssh}.{alerts}.{_system_generation}", lambda: _stats_data(conn)),
+        'ssh_timeline': (f"{ssh}", lambda: rollups.ssh_timeline_columns(conn, datetime.now() - timedelta(days=1))),
+        'system_history': (f"{metrics}",
+                           lambda: _system_history_data(conn, datetime.now() - timedelta(days=1), datetime.now(),
+                                                        Config.HISTORY_DEFAULT_POINTS)),
+        'top_ips': (f"{ssh}", lambda: _query_rows(conn, 'top_ips')),
+        'trusted_hosts': (f"{ssh}", lambda: _query_rows(conn, 'trusted_hosts')),
+        'recent_logs': (f"{ssh}", lambda: _query_rows(conn, 'recent_logs')),
+        'alerts': (f"{alerts}", lambda: _query_rows(conn, 'alerts')),
+        'top_processes': (f"{_processes_generation}", _top_processes_data),
+    }
+    
+    live = _live_sections or _refresh_live_sections()
+    for name, (version, data) in live.items():
+        sections[name] = (version, lambda data=data: data)
+    
+    return sections
+
+@app.route('/api/dashboard')
+def api_dashboard():
+    """Wszystkie panele dashboardu w jednej odpowiedzi.
+
+    ?known=sekcja:wersja,... - sekcje w tej wersji są pomijane (bez zapytań).
+    ETag to skrót wszystkich wersji; If-None-Match z tym samym ETagiem daje 304.
+    """
+    known = dict(item.split(':', 1) for item in request.args.get('known', '').split(',') if ':' in item)
+    conn = get_db()
+    try:
+        sections = _dashboard_sections(conn)
+        versions = {name: version for name, (version, _) in sections.items()}
+        etag = _content_version(versions)
+        
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify({
+                'versions': versions,
+                'sections': {name: loader() for name, (version, loader) in sections.items()
+                             if known.get(name) != version}
+            })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    finally:
+        conn.close()
+
+# Jeden obserwator bazy dla wszystkich klientów /api/stream
+_event_hub = live_events.EventHub()
+_stream_watcher = live_events.StreamWatcher(_event_hub, bans_loader=lambda: _banned_ips_data())
+
+@app.route('/api/stream')
+def api_stream():
+    """Server-Sent Events: nowe logi SSH, alerty, próbki metryk i zmiany banów.
+
+    Last-Event-ID pozwala wznowić po zerwaniu połączenia; gdy zdarzenia już
+    wypadły z bufora, klient dostaje `resync` i przeładowuje /api/dashboard.
+    """
+    _stream_watcher.start()
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    
+    def generate():
+        after = _event_hub.last_seq() if last_id is None else last_id
+        yield f"retry: {Config.STREAM_RETRY_MS}\n\n"
+        while True:
+            texts, after, missed = _event_hub.wait_for(after, Config.STREAM_KEEPALIVE)
+            if missed:
+                yield "event: resync\ndata: {}\n\n"
+            for text in texts:
+                yield text
+            if not texts and not missed:
+                yield ": keepalive\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _fail2ban_config_data():
     """Pobierz konfigurację fail2ban"""
     config = configparser.ConfigParser()
     # Use path relative to app.py
     config_path = Path(app.root_path) / 'jail.local.strict'
     
+    config.read(config_path)
+    return {
+        'bantime': config.get('DEFAULT', 'bantime', fallback='86400'),
+        'findtime': config.get('DEFAULT', 'findtime', fallback='600'),
+        'maxretry': config.get('DEFAULT', 'maxretry', fallback='5')
+    }
+
+_metrics_ring = RingReader()
+
+@app.route('/api/system_history_hires')
+def api_system_history_hires():
+    """Próbki co sekundę z pierścienia mmap kolektora w kolumnach; ?seconds=N (domyślnie 600), ?max_points="""
+    max_seconds = Config.METRICS_RING_SLOTS * Config.METRICS_RING_INTERVAL
+    seconds = min(max(request.args.get('seconds', 600, type=int), 1), max_seconds)
+    samples = _metrics_ring.read(since=time_module.time() - seconds)
+    for sample in samples:
+        sample['cpu_percent'] = round(sample['cpu_percent'], 1)
+        sample['memory_percent'] = round(sample['memory_percent'], 1)
+    data = downsample.series_columns(samples, _max_points_arg(), METRIC_GAUGES[:2], METRIC_COUNTERS)
+    # Ten sam format co system_metrics.timestamp (czas lokalny)
+    data['timestamp'] = [datetime.fromtimestamp(ts).isoformat(' ', 'seconds') for ts in data['timestamp']]
+    return jsonify(data)
+
+@app.route('/api/fail2ban/config', methods=['GET'])
+def get_fail2ban_config():
+    """Pobierz konfigurację fail2ban"""
     try:
-        config.read(config_path)
-        return jsonify({
-            'bantime': config.get('DEFAULT', 'bantime', fallback='86400'),
-            'findtime': config.get('DEFAULT', 'findtime', fallback='600'),
-            'maxretry': config.get('DEFAULT', 'maxretry', fallback='5')
-        })
+        return jsonify(_fail2ban_config_data())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Odbiornik banów fail2ban na gniazdku Unix - zamiast interpretera i połączenia z bazą na każdy ban
+Usage: python3 ban_listener.py
+
+Protokół liniowy (zgodny z socat), jedna komenda na linię, odpowiedź "ok" albo "error ...":
+    ban 1.2.3.4
+    unban 1.2.3.4
+np. echo "ban 1.2.3.4" | socat - UNIX-CONNECT:/run/hoblera/bans.sock
+
+Zdarzenia są zbierane w pamięci, powtórzona akcja dla IP w jednej paczce sklejana,
+a paczka zapisywana w jednej transakcji co BAN_FLUSH_INTERVAL s (albo po BAN_BATCH_SIZE).
+Klient: create_ban_alert.py (z zapisem bezpośrednim, gdy odbiornik nie działa).
+"""
+import ipaddress
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from config import Config
+import db
+
+ACTIONS = ('ban', 'unban')
+
+def alert_for(action, ip_address):
+    """(alert_type, severity, message, details) dla zdarzenia fail2ban"""
+    if action == 'ban':
+        message = f"⛔ Fail2Ban: IP {ip_address} has been banned for repeated failed logins."
+        return ('security_ban', 'critical', message, ip_address)
+    message = f"Fail2Ban: IP {ip_address} has been unbanned."
+    return ('security_unban', 'info', message, ip_address)
+
+def write_events(conn, events):
+    """Zapisz zdarzenia [(akcja, ip)] jako alerty w jednej transakcji"""
+    conn.executemany('''
+        INSERT INTO alerts (alert_type, severity, message, details)
+        VALUES (?, ?, ?, ?)
+    ''', [alert_for(action, ip) for action, ip in events])
+    conn.commit()
+
+def parse_command(line):
+    """'ban 1.2.3.4' -> ('ban', '1.2.3.4'); ValueError dla złej komendy"""
+    parts = line.split()
+    if len(parts) != 2 or parts[0] not in ACTIONS:
+        raise ValueError("expected 'ban <ip>' or 'unban <ip>'")
+    return parts[0], str(ipaddress.ip_address(parts[1]))
+
+class BanQueue:
+    """Zdarzenia czekające na zapis; kolejność zachowana, powtórzenie ostatniej
+    akcji dla tego samego IP w paczce pominięte (ban, unban, ban zostaje w całości)"""
+
+    def __init__(self):
+        self._events = []
+        self._last_action = {}
+        self._lock = threading.Lock()
+        self._full = threading.Event()
+
+    def add(self, action, ip_address):
+        with self._lock:
+            self._add(action, ip_address)
+
+    def _add(self, action, ip_address):
+        if self._last_action.get(ip_address) == action:
+            return
+        self._last_action[ip_address] = action
+        self._events.append((action, ip_address))
+        if len(self._events) >= Config.BAN_BATCH_SIZE:
+            self._full.set()
+
+    def put_back(self, events):
+        """Niezapisana paczka wraca przed zdarzenia, które przyszły w międzyczasie"""
+        with self._lock:
+            pending, self._events, self._last_action = self._events, [], {}
+            for action, ip_address in events + pending:
+                self._add(action, ip_address)
+
+    def wait(self, timeout):
+        self._full.wait(timeout)
+
+    def take(self):
+        with self._lock:
+            events, self._events = self._events, []
+            self._last_action = {}
+            self._full.clear()
+        return events
+
+class BanHandler(socketserver.StreamRequestHandler):
+    timeout = 5
+
+    def handle(self):
+        try:
+            for raw_line in self.rfile:
+                line = raw_line.decode('utf-8', errors='replace').strip()
+                if not line:
+                    continue
+                try:
+                    action, ip_address = parse_command(line)
+                except ValueError as e:
+                    self.wfile.write(f"error {e}\n".encode())
+                    continue
+                self.server.queue.add(action, ip_address)
+                self.wfile.write(b"ok\n")
+        except socket.timeout:
+            # Bezczynny klient (np. socat bez EOF) - zamykamy po cichu
+            return
+
+class BanServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, queue):
+        self.queue = queue
+        super().__init__(path, BanHandler)
+
+def _writer_loop(queue, stop):
+    conn = db.connect()
+    try:
+        while True:
+            queue.wait(Config.BAN_FLUSH_INTERVAL)
+            events = queue.take()
+            if events:
+                try:
+                    write_events(conn, events)
+                    print(f"Saved {len(events)} fail2ban events")
+                except Exception as e:
+                    print(f"[ERROR] Saving fail2ban events: {e}", file=sys.stderr)
+                    conn.rollback()
+                    # Zostaną dopisane do następnej paczki
+                    queue.put_back(events)
+                    time.sleep(Config.BAN_FLUSH_INTERVAL)
+            elif stop.is_set():
+                break
+    finally:
+        conn.close()
+
+def _terminate(signum, frame):
+    # systemctl stop - zamknij jak przy Ctrl+C, z zapisem ostatniej paczki
+    raise KeyboardInterrupt
+
+def serve():
+    signal.signal(signal.SIGTERM, _terminate)
+    path = Config.BAN_SOCKET
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+    queue = BanQueue()
+    # Błąd bind/chmod kończy proces (Restart=always), zanim powstanie wątek zapisu
+    server = BanServer(path, queue)
+    try:
+        os.chmod(path, Config.BAN_SOCKET_MODE)
+    except OSError:
+        server.server_close()
+        os.unlink(path)
+        raise
+    stop = threading.Event()
+    writer = threading.Thread(target=_writer_loop, args=(queue, stop), name='ban-writer')
+    writer.start()
+    print(f"Listening for fail2ban events on {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping ban listener")
+    finally:
+        # Ostatnia paczka przed wyjściem - stop ustawiamy zawsze, inaczej wątek trzyma proces
+        stop.set()
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+        writer.join()
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark dopasowywania linii sshd w auth.log
+Usage: python3 bench_log_parser.py [LINES]
+
+Generuje syntetyczny auth.log (domyślnie 2 mln linii, większość to szum
+z innych procesów i nieinteresujące komunikaty sshd) i porównuje lines/sec
+starej pętli po czterech regexach z .*sshd\\[\\d+\\] z jednym matcherem
+match_sshd_line() z log_parser.py.
+"""
+import re
+import sys
+import time
+import random
+import tempfile
+from log_parser import match_sshd_line
+
+# Wzorce sprzed zmiany - pętla po słowniku, jak w starym parse_ssh_log()
+OLD_PATTERNS = {
+    'accepted_password': re.compile(
+        r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}).*sshd\[\d+\]: Accepted password for (\w+) from ([\da-fA-F:.%]+) port (\d+)'
+    ),
+    'accepted_publickey': re.compile(
+        r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}).*sshd\[\d+\]: Accepted publickey for (\w+) from ([\da-fA-F:.%]+) port (\d+)'
+    ),
+    'failed': re.compile(
+        r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}).*sshd\[\d+\]: Failed password for (?:invalid user )?(\w+) from ([\da-fA-F:.%]+) port (\d+)'
+    ),
+    'invalid': re.compile(
+        r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}).*sshd\[\d+\]: Invalid user (\w+) from ([\da-fA-F:.%]+) port (\d+)'
+    )
+}
+
+TEMPLATES = [
+    # (waga, szablon) - proporcje zbliżone do auth.log na serwerze pod atakiem
+    (30, "{ts} hoblera CRON[{pid}]: pam_unix(cron:session): session opened for user root(uid=0) by (uid=0)"),
+    (15, "{ts} hoblera systemd-logind[{pid}]: New session {pid} of user flat532."),
+    (10, "{ts} hoblera sudo: flat532 : TTY=pts/0 ; PWD=/www ; USER=root ; COMMAND=/usr/bin/systemctl status"),
+    (12, "{ts} hoblera sshd[{pid}]: Connection closed by authenticating user root {ip} port {port} [preauth]"),
+    (8, "{ts} hoblera sshd[{pid}]: Received disconnect from {ip} port {port}:11: Bye Bye [preauth]"),
+    (5, "{ts} hoblera sshd[{pid}]: pam_unix(sshd:auth): authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost={ip}"),
+    (10, "{ts} hoblera sshd[{pid}]: Failed password for root from {ip} port {port} ssh2"),
+    (5, "{ts} hoblera sshd[{pid}]: Failed password for invalid user {user} from {ip} port {port} ssh2"),
+    (4, "{ts} hoblera sshd[{pid}]: Invalid user {user} from {ip} port {port}"),
+    (1, "{ts} hoblera sshd[{pid}]: Accepted publickey for flat532 from 10.10.10.102 port {port} ssh2: ED25519 SHA256:abc"),
+]
+
+def generate_log(path, lines):
+    """Zapisz syntetyczny auth.log"""
+    rnd = random.Random(42)
+    weights = [w for w, _ in TEMPLATES]
+    templates = [t for _, t in TEMPLATES]
+    users = ['admin', 'test', 'oracle', 'ubuntu', 'git', 'postgres']
+    with open(path, 'w') as f:
+        for i, template in enumerate(rnd.choices(templates, weights, k=lines)):
+            f.write(template.format(
+                ts=f"2026-01-06T{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}.873105+01:00",
+                pid=1000 + i % 50000,
+                ip=f"{rnd.randint(1, 223)}.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}",
+                port=rnd.randint(1024, 65535),
+                user=rnd.choice(users),
+            ) + "\n")
+
+def old_matcher(line):
+    for status, pattern in OLD_PATTERNS.items():
+        match = pattern.search(line)
+        if match:
+            return status, match.group(2), match.group(3), match.group(4)
+    return None
+
+def bench(name, path, matcher):
+    matched = 0
+    lines = 0
+    start = time.perf_counter()
+    with open(path, 'r') as f:
+        for line in f:
+            lines += 1
+            if matcher(line):
+                matched += 1
+    elapsed = time.perf_counter() - start
+    print(f"{name:<8} {lines / elapsed:>12,.0f} lines/s  ({elapsed:.2f}s, {matched} matches)")
+    return matched, elapsed
+
+if __name__ == "__main__":
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+
+    with tempfile.NamedTemporaryFile(suffix='.log') as tmp:
+        print(f"Generating {lines:,} lines of synthetic auth.log...")
+        generate_log(tmp.name, lines)
+
+        old_matches, old_time = bench("before", tmp.name, old_matcher)
+        new_matches, new_time = bench("after", tmp.name, match_sshd_line)
+
+    if old_matches != new_matches:
+        print(f"MISMATCH: before={old_matches} after={new_matches}")
+        sys.exit(1)
+    print(f"Speedup: {old_time / new_time:.1f}x")
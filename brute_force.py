@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Wykrywanie brute-force SSH w oknach przesuwnych, w pamięci
+- parser przepuszcza przez detektor każdą wstawianą paczkę (log_parser.insert_events),
+  alert powstaje w tej samej transakcji co wpisy, w chwili przekroczenia progu
+- per IP i okno: deque kubełków czasu [początek, liczba] + suma, czyli O(1) na zdarzenie
+- okna z Config.BRUTE_FORCE_WINDOWS oraz findtime/maxretry z jail.local.strict
+- jeden alert na IP przy przekroczeniu: z reguł przekroczonych tym zdarzeniem
+  wybieramy najpoważniejszą (przy remisie najkrótsze okno), pozostałe tylko
+  oznaczamy; kolejny alert dla tego IP tylko przy eskalacji do wyższego severity
+- deduplikacja (IP, okno) w pamięci, zapisywana w detector_state; po restarcie
+  stan wraca z detector_state, a okna z ostatnich zdarzeń ssh_logs
+"""
+import configparser
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+from pathlib import Path
+from config import Config
+
+FAILED_STATUSES = ('failed', 'invalid')
+SEVERITY_RANK = {'info': 0, 'warning': 1, 'critical': 2}
+
+# limit: alert, gdy nieudanych prób w oknie jest więcej niż limit
+Rule = namedtuple('Rule', 'name seconds limit severity')
+
+QUERIES = {
+    'detector_state_active': '''
+        SELECT ip_address, rule, expires_at FROM detector_state WHERE expires_at > ?
+    ''',
+    'detector_replay': '''
+        SELECT timestamp, ip_address FROM ssh_logs
+        WHERE timestamp > ? AND status IN ('failed', 'invalid')
+    ''',
+}
+
+def _epoch(timestamp):
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return datetime.fromisoformat(str(timestamp)[:19]).timestamp()
+
+def _jail_seconds(value):
+    """Czas w składni fail2ban: 600, 10m, 3h, 1d"""
+    value = value.strip().lower()
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+def _jail_path():
+    if not Config.BRUTE_FORCE_JAIL_CONFIG:
+        return None
+    return Path(__file__).resolve().parent / Config.BRUTE_FORCE_JAIL_CONFIG
+
+def _jail_mtime():
+    path = _jail_path()
+    try:
+        return path.stat().st_mtime if path else None
+    except OSError:
+        return None
+
+def jail_rule():
+    """Okno fail2ban: maxretry nieudanych prób w findtime (None bez pliku)"""
+    path = _jail_path()
+    if path is None or not path.exists():
+        return None
+    config = configparser.ConfigParser(interpolation=None)
+    config.read(path)
+    section = 'sshd' if config.has_section('sshd') else 'DEFAULT'
+    try:
+        findtime = _jail_seconds(config.get(section, 'findtime', fallback='600'))
+        maxretry = int(config.get(section, 'maxretry', fallback='5'))
+    except ValueError as e:
+        print(f"Invalid findtime/maxretry in {path}: {e}")
+        return None
+    return Rule('jail', findtime, maxretry - 1, 'warning')
+
+def configured_rules():
+    rules = [Rule(*window) for window in Config.BRUTE_FORCE_WINDOWS]
+    jail = jail_rule()
+    if jail:
+        rules.append(jail)
+    return rules
+
+def _describe(seconds):
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600} h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60} min"
+    return f"{seconds} s"
+
+class SlidingWindow:
+    """Liczba zdarzeń w ostatnich `seconds` s, z dokładnością do kubełka"""
+
+    __slots__ = ('step', 'count', 'buckets', 'total')
+
+    def __init__(self, seconds, buckets):
+        self.step = max(1, seconds // buckets)
+        self.count = -(-seconds // self.step)
+        self.buckets = deque()
+        self.total = 0
+
+    def expire(self, now):
+        oldest = int(now) - int(now) % self.step - (self.count - 1) * self.step
+        while self.buckets and self.buckets[0][0] < oldest:
+            self.total -= self.buckets.popleft()[1]
+
+    def add(self, t):
+        """Dolicz zdarzenie z chwili t, zwraca liczbę zdarzeń w oknie"""
+        start = int(t) - int(t) % self.step
+        if not self.buckets or self.buckets[-1][0] < start:
+            self.buckets.append([start, 1])
+            self.expire(t)
+        elif self.buckets[-1][0] == start:
+            self.buckets[-1][1] += 1
+        else:
+            # Zdarzenie spóźnione - do swojego kubełka, o ile jeszcze jest w oknie
+            if start < self.buckets[-1][0] - (self.count - 1) * self.step:
+                return self.total
+            for i in range(len(self.buckets) - 1, -1, -1):
+                if self.buckets[i][0] == start:
+                    self.buckets[i][1] += 1
+                    break
+                if self.buckets[i][0] < start:
+                    self.buckets.insert(i + 1, [start, 1])
+                    break
+            else:
+                self.buckets.appendleft([start, 1])
+        self.total += 1
+        return self.total
+
+class BruteForceDetector:
+    """Okna przesuwne per IP; observe() wstawia alerty kursorem wywołującego"""
+
+    def __init__(self, rules=None):
+        self.rules = rules if rules is not None else configured_rules()
+        self.horizon = max((rule.seconds for rule in self.rules), default=0)
+        self._windows = {}
+        self._alerted = {}
+        self._latest = 0
+        self._swept_at = 0
+        self._jail_mtime = _jail_mtime()
+
+    def stale(self):
+        """Plik jail zmieniony (np. z dashboardu) - okna trzeba zbudować od nowa"""
+        return _jail_mtime() != self._jail_mtime
+
+    def load(self, cursor, now=None):
+        """Stan po restarcie: aktywna deduplikacja i zdarzenia z ostatniego najdłuższego okna"""
+        now = now or time.time()
+        cursor.execute(QUERIES['detector_state_active'], (now,))
+        for ip, rule, expires_at in cursor.fetchall():
+            self._alerted[(ip, rule)] = expires_at
+        since = datetime.fromtimestamp(now - self.horizon).strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute(QUERIES['detector_replay'], (since,))
+        replayed = 0
+        for timestamp, ip in cursor.fetchall():
+            self._add(cursor, _epoch(timestamp), ip, now)
+            replayed += 1
+        return replayed
+
+    def observe(self, cursor, events):
+        """Przepuść paczkę zdarzeń (krotki jak w db.insert_ssh_events), zwraca liczbę alertów"""
+        now = time.time()
+        alerts = 0
+        for timestamp, _username, ip, _dns_name, _port, status, _message in events:
+            if status in FAILED_STATUSES:
+                alerts += self._add(cursor, _epoch(timestamp), ip, now)
+        if self._latest - self._swept_at >= Config.BRUTE_FORCE_SWEEP_INTERVAL:
+            self.sweep(cursor)
+        return alerts
+
+    def _add(self, cursor, t, ip, now):
+        # Stare zdarzenia (zaległość z pierwszego uruchomienia) nie mieszczą się w żadnym oknie
+        if t <= now - self.horizon:
+            return 0
+        self._latest = max(self._latest, t)
+        windows = self._windows.get(ip)
+        if windows is None:
+            windows = self._windows[ip] = [SlidingWindow(rule.seconds, Config.BRUTE_FORCE_BUCKETS)
+                                           for rule in self.rules]
+        crossed = []
+        for rule, window in zip(self.rules, windows):
+            count = window.add(t)
+            if count > rule.limit and t > now - rule.seconds and self._alerted.get((ip, rule.name), 0) <= t:
+                crossed.append((rule, count))
+        if not crossed:
+            return 0
+        rule, count = max(crossed, key=lambda rc: (SEVERITY_RANK.get(rc[0].severity, 0), -rc[0].seconds))
+        # Aktywny alert tego IP z innej reguły - nowy tylko przy eskalacji severity
+        active = max((SEVERITY_RANK.get(r.severity, 0) for r in self.rules
+                      if self._alerted.get((ip, r.name), 0) > t), default=-1)
+        notify = SEVERITY_RANK.get(rule.severity, 0) > active
+        for crossed_rule, _count in crossed:
+            self._mark(cursor, crossed_rule, ip, t)
+        if notify:
+            self._alert(cursor, rule, ip, count)
+        return int(notify)
+
+    def _mark(self, cursor, rule, ip, t):
+        expires_at = t + rule.seconds
+        self._alerted[(ip, rule.name)] = expires_at
+        cursor.execute('''
+            INSERT OR REPLACE INTO detector_state (ip_address, rule, expires_at)
+            VALUES (?, ?, ?)
+        ''', (ip, rule.name, expires_at))
+
+    def _alert(self, cursor, rule, ip, count):
+        window = _describe(rule.seconds)
+        if rule.name == 'jail':
+            window += " (fail2ban findtime)"
+        message = f"Suspicious activity: {count} failed login attempts from {ip} in last {window}"
+        cursor.execute('''
+            INSERT INTO alerts (alert_type, severity, message, details)
+            VALUES (?, ?, ?, ?)
+        ''', ('failed_login', rule.severity, message, ip))
+        print(f"Alert created: {message}")
+
+    def sweep(self, cursor):
+        """Usuń puste okna i wygasłą deduplikację (pamięć i detector_state)"""
+        now = self._latest
+        for ip in list(self._windows):
+            windows = self._windows[ip]
+            for window in windows:
+                window.expire(now)
+            if not any(window.total for window in windows):
+                del self._windows[ip]
+        self._alerted = {key: expires for key, expires in self._alerted.items() if expires > now}
+        cursor.execute("DELETE FROM detector_state WHERE expires_at <= ?", (now,))
+        self._swept_at = now
+
+    def tracked_ips(self):
+        return len(self._windows)
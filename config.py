@@ -7,3 +7,134 @@ class Config:
     DEBUG = True
     AUTH_LOG = '/var/log/auth.log'
     MAX_FAILED_LOGINS_PER_HOUR = 5
+
+    # Detektor brute-force w oknach przesuwnych (brute_force.py)
+    # (nazwa, okno w s, alert gdy nieudanych prób więcej niż, severity)
+    BRUTE_FORCE_WINDOWS = (
+        ('1m', 60, 10, 'critical'),
+        ('10m', 600, 20, 'warning'),
+        ('1h', 3600, MAX_FAILED_LOGINS_PER_HOUR, 'warning'),
+    )
+    BRUTE_FORCE_BUCKETS = 60                    # kubełków czasu na okno
+    BRUTE_FORCE_JAIL_CONFIG = 'jail.local.strict'  # findtime/maxretry jako dodatkowe okno; None = bez
+    BRUTE_FORCE_SWEEP_INTERVAL = 60             # s, co ile sprzątać puste okna i wygasłe alerty
+
+    # Password spraying - szkice HLL/Count-Min o stałej pamięci (password_spray.py)
+    SPRAY_WINDOW = 3600               # s, progi liczone na 1-2 oknach
+    SPRAY_USER_SOURCES = 20           # różnych IP na jeden username
+    SPRAY_SUBNET_USERNAMES = 30       # różnych userów z jednej podsieci
+    SPRAY_USER_ATTEMPTS = 200         # prób na jeden username ze wszystkich źródeł
+    SPRAY_IPV4_PREFIX = 24
+    SPRAY_IPV6_PREFIX = 64
+    SPRAY_TRACK_MIN_ATTEMPTS = 5      # od ilu prób klucz dostaje własny HyperLogLog
+    SPRAY_MAX_TRACKED = 512           # HLL na rodzaj i okno (po 2^p bajtów)
+    SPRAY_HLL_PRECISION = 10          # 1024 rejestry, błąd ~3%
+    SPRAY_CMS_WIDTH = 2048
+    SPRAY_CMS_DEPTH = 4
+    SPRAY_CHECKPOINT_INTERVAL = 60    # s, co ile zapisywać szkice w sketch_state
+
+    # Top atakujących - Space-Saving per godzina/dzień (heavy_hitters.py, /api/top_attackers)
+    TOPK_CAPACITY = 200               # liczników na kubełek; błąd <= prób w kubełku / pojemność
+    TOPK_RETENTION_DAYS = 35          # najdłuższe okno ?window=
+    TOPK_DEFAULT_LIMIT = 20
+
+    # Kolejka maili z alertami (alert_manager.py)
+    EMAIL_SKIP_ALERT_TYPES = ('failed_login', 'security_unban')  # tylko oznaczane jako wysłane
+    EMAIL_COALESCE_SECONDS = 60       # najstarszy alert czeka tyle na kolejne do tego samego digestu
+    EMAIL_DIGEST_INTERVAL = 300       # s, najwyżej jeden digest na tyle sekund
+    EMAIL_DIGEST_MAX_ITEMS = 100      # alertów opisanych w treści maila
+    EMAIL_BATCH_SIZE = 20             # wiadomości na jedno połączenie SMTP
+    EMAIL_MAX_ATTEMPTS = 8
+    EMAIL_RETRY_BASE = 60             # s, backoff 60, 120, 240... s
+    EMAIL_RETRY_MAX = 6 * 3600
+    EMAIL_SMTP_TIMEOUT = 30
+    EMAIL_POLL_INTERVAL = 15          # s, tryb --loop
+    EMAIL_OUTBOX_RETENTION_DAYS = 30
+
+    # Odbiornik banów fail2ban (ban_listener.py, klient create_ban_alert.py)
+    BAN_SOCKET = '/run/hoblera/bans.sock'
+    BAN_SOCKET_MODE = 0o660
+    BAN_FLUSH_INTERVAL = 1            # s, co ile zapisywać zebrane zdarzenia
+    BAN_BATCH_SIZE = 200              # albo wcześniej, gdy tyle czeka
+    BAN_CLIENT_TIMEOUT = 2            # s, potem klient zapisuje bezpośrednio
+
+    # SQLite (db.py)
+    DB_BUSY_TIMEOUT_MS = 5000
+    DB_CACHE_SIZE_KB = 16384
+    DB_MMAP_SIZE = 64 * 1024 * 1024
+    DB_BATCH_SIZE = 500
+    IP_MAX_USERNAMES = 20
+
+    # Wybór źródła dla zakresów czasu (rollups.py)
+    ROLLUP_RAW_MAX_HOURS = 2      # krótsze zakresy liczone wprost z ssh_logs
+    ROLLUP_HOURLY_MAX_DAYS = 7    # do tylu dni agregaty godzinowe, powyżej dzienne
+    SSH_TIMELINE_MAX_DAYS = 90
+
+    # Miesięczne partycje ssh_logs (ssh_partitions.py)
+    SSH_PARTITION_DIR = 'ssh_logs'    # względem katalogu DB_FILE
+    SSH_MAX_ATTACHED = 4              # otwartych partycji w widoku ssh_logs (limit ATTACH to 10)
+    SSH_SEAL_AFTER_DAYS = 3           # dni po końcu miesiąca do zamknięcia (gzip)
+    SSH_SEAL_COMPRESSLEVEL = 6
+    SSH_RETENTION_MONTHS = 24         # starsze archiwa są usuwane
+    SSH_MAINTAIN_INTERVAL = 3600      # s, co ile parser --follow sprawdza zamykanie/retencję
+    SSH_ARCHIVE_CACHE_DIR = '/tmp/hoblera-ssh-archive'
+
+    # Próbkowanie systemu dla /api/stats (wątek w app.py), w sekundach
+    STATS_SAMPLE_INTERVAL = 2
+    STATS_DISK_INTERVAL = 30
+    STATS_FIRST_SAMPLE_DELAY = 0.5
+    PROCESS_SAMPLE_INTERVAL = 5
+
+    # Sondy /api/apps (równoległe), w sekundach
+    APPS_PROBE_WORKERS = 8
+    APPS_HTTP_TIMEOUT = 3
+    APPS_PROBE_DEADLINE = 4
+    APPS_CACHE_TTL = 15
+
+    # systemd_status.py
+    SYSTEMCTL_BIN = '/usr/bin/systemctl'
+    SYSTEMCTL_CACHE_TTL = 5
+
+    # /api/dashboard: co ile sekund wątek samplera odświeża sekcje na żywo
+    # (systemctl, sondy aplikacji, fail2ban) i ich wersje
+    DASHBOARD_LIVE_INTERVAL = 30
+
+    # /api/stream (live_events.py)
+    STREAM_POLL_INTERVAL = 1      # s, jeden obserwator bazy na proces
+    STREAM_BUFFER_SIZE = 1000     # zdarzeń w buforze pierścieniowym
+    STREAM_MAX_ROWS = 500         # większa zaległość = resync zamiast zdarzeń
+    STREAM_KEEPALIVE = 15         # s
+    STREAM_BANS_INTERVAL = 10     # s, co ile pytać fail2ban o listę banów
+    STREAM_RETRY_MS = 5000
+
+    # Pierścień metryk wysokiej rozdzielczości (metrics_ring.py, metrics_collector.py --daemon)
+    METRICS_RING_FILE = 'metrics.ring'
+    METRICS_RING_SLOTS = 3600     # ~1h przy próbce co sekundę
+    METRICS_RING_INTERVAL = 1     # s
+    METRICS_DB_INTERVAL = 300     # s, wiersz w system_metrics jak przy timerze
+
+    # Warstwy system_metrics (metrics_tiers.py): surowe -> 1 min -> 1 h
+    METRICS_RAW_RETENTION_DAYS = 7
+    METRICS_1M_RETENTION_DAYS = 90
+    METRICS_1H_RETENTION_DAYS = 730
+    METRICS_COMPACT_BATCH = 1440      # kubełków na paczkę (1 dzień minut / 60 dni godzin)
+    METRICS_COMPACT_MAX_STEPS = 20    # paczek na jedno wywołanie kolektora
+    METRICS_DELETE_BATCH = 5000       # wierszy na jeden DELETE retencji
+    METRICS_VACUUM_PAGES = 1000       # stron zwalnianych przez incremental_vacuum
+    HISTORY_SCAN_ROWS = 20000         # ile wierszy warstwy wolno przeczytać przed downsamplingiem
+    HISTORY_DEFAULT_POINTS = 500      # punktów w odpowiedzi (LTTB / sklejanie kubełków)
+    HISTORY_MAX_POINTS = 2000         # górny limit ?max_points=
+    HISTORY_MAX_HOURS = 24 * 730
+
+    # Prędkości sieci per interfejs (net_rates.py)
+    NET_IGNORE_NICS = ('lo',)         # prefiksy nazw interfejsów pomijanych
+    NET_MAX_BYTES_RATE = 1.25e9       # B/s (10 Gbit/s) - próg: przepełnienie 32-bit czy reset licznika
+    NET_RATES_RETENTION_DAYS = 90
+    NET_HISTORY_MIN_BUCKET = 60       # s, najmniejszy kubełek /api/network_history
+
+    # Reverse DNS (dns_resolver.py)
+    DNS_WORKERS = 8
+    DNS_TIMEOUT = 2
+    DNS_MAX_PENDING = 1024
+    DNS_POSITIVE_TTL = 7 * 24 * 3600
+    DNS_NEGATIVE_TTL = 6 * 3600
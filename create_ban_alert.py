@@ -1,30 +1,51 @@
 #!/usr/bin/env python3
 """
 Trigger Fail2Ban Alert
-Usage: python3 create_ban_alert.py <IP_ADDRESS>
+Usage: python3 create_ban_alert.py <IP_ADDRESS> [ban|unban]
+
+Wysyła zdarzenie do ban_listener.py przez gniazdko Config.BAN_SOCKET; gdy
+odbiornik nie działa, zapisuje alert bezpośrednio w bazie.
 """
+import socket
 import sys
-import sqlite3
 from config import Config
 
-def trigger_ban_alert(ip_address):
-    conn = sqlite3.connect(Config.DB_FILE)
-    cursor = conn.cursor()
-    
-    message = f"⛔ Fail2Ban: IP {ip_address} has been banned for repeated failed logins."
-    
-    cursor.execute('''
-        INSERT INTO alerts (alert_type, severity, message, details)
-        VALUES (?, ?, ?, ?)
-    ''', ('security_ban', 'critical', message, ip_address))
-    
-    conn.commit()
+def send_to_listener(action, ip_address):
+    """True, gdy odbiornik przyjął zdarzenie"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(Config.BAN_CLIENT_TIMEOUT)
+            sock.connect(Config.BAN_SOCKET)
+            sock.sendall(f"{action} {ip_address}\n".encode())
+            sock.shutdown(socket.SHUT_WR)
+            reply = sock.makefile('rb').readline().decode(errors='replace').strip()
+    except OSError:
+        return False
+    if reply != 'ok':
+        raise ValueError(reply or 'no reply from ban listener')
+    return True
+
+def trigger_ban_alert(ip_address, action='ban'):
+    try:
+        if send_to_listener(action, ip_address):
+            print(f"Alert queued for {action} of IP: {ip_address}")
+            return
+    except ValueError as e:
+        print(f"Ban listener rejected event: {e}")
+        sys.exit(1)
+
+    # Odbiornik nie działa - zapis bezpośredni jak dawniej
+    import db
+    import ban_listener
+    action, ip_address = ban_listener.parse_command(f"{action} {ip_address}")
+    conn = db.connect()
+    ban_listener.write_events(conn, [(action, ip_address)])
     conn.close()
-    print(f"Alert created for banned IP: {ip_address}")
+    print(f"Alert created for {action} of IP: {ip_address}")
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python3 create_ban_alert.py <IP>")
+        print("Usage: python3 create_ban_alert.py <IP> [ban|unban]")
         sys.exit(1)
         
-    trigger_ban_alert(sys.argv[1])
+    trigger_ban_alert(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else 'ban')
@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Wspólna warstwa bazy danych dla parsera, kolektora, alertów i aplikacji
+- WAL: odczyty dashboardu nie czekają na zapisy parsera
+- synchronous=NORMAL, busy timeout, cache i mmap z Config
+- wsadowe wstawianie zdarzeń SSH przez executemany
+- ssh_logs w miesięcznych plikach partycji (ssh_partitions.py), dołączanych przy połączeniu
+"""
+import sqlite3
+from config import Config
+import rollups
+import heavy_hitters
+import ssh_partitions
+
+# {table} = partycja miesiąca zdarzenia, np. ssh_2026_10.ssh_logs
+INSERT_SSH_LOG_SQL = '''
+    INSERT INTO {table} (timestamp, username, ip_address, dns_name, port, status, message)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+def connect(row_factory=None, writer=False):
+    """Otwórz połączenie z bazą z ustawieniami wspólnymi dla wszystkich procesów.
+
+    writer=True tylko dla parsera i migracji: mogą tworzyć i otwierać ponownie
+    partycje ssh_logs. Pozostali dołączają istniejące partycje tylko do odczytu.
+    """
+    # uri=True - partycje czytelnika dołączane jako file:...?mode=ro
+    conn = sqlite3.connect(Config.DB_FILE, timeout=Config.DB_BUSY_TIMEOUT_MS / 1000, uri=True)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+
+    # journal_mode jest zapisywany w pliku bazy - kolejne wywołania to no-op
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(Config.DB_BUSY_TIMEOUT_MS)}")
+    # Ujemna wartość cache_size oznacza KiB, nie liczbę stron
+    conn.execute(f"PRAGMA cache_size=-{int(Config.DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(Config.DB_MMAP_SIZE)}")
+    ssh_partitions.attach(conn, writable=writer)
+    return conn
+
+UPSERT_IP_SQL = '''
+    INSERT INTO ips (ip_address, dns_name, first_seen, last_seen,
+                     accepted_count, failed_count, invalid_count, usernames)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(ip_address) DO UPDATE SET
+        dns_name = COALESCE(ips.dns_name, excluded.dns_name),
+        first_seen = MIN(ips.first_seen, excluded.first_seen),
+        last_seen = MAX(ips.last_seen, excluded.last_seen),
+        accepted_count = ips.accepted_count + excluded.accepted_count,
+        failed_count = ips.failed_count + excluded.failed_count,
+        invalid_count = ips.invalid_count + excluded.invalid_count,
+        usernames = excluded.usernames
+'''
+
+def insert_ssh_events(cursor, events):
+    """Wstaw zdarzenia SSH paczkami po Config.DB_BATCH_SIZE.
+
+    events: lista krotek (timestamp, username, ip, dns_name, port, status, message)
+    Zdarzenia trafiają do partycji swojego miesiąca - partycje muszą być
+    dołączone przed transakcją (ssh_partitions.ensure). W tej samej transakcji
+    aktualizuje agregaty per IP w tabeli ips, agregaty godzinowe/dzienne
+    (rollups.py) i kubełki top-K atakujących (heavy_hitters.py).
+    """
+    by_month = {}
+    for event in events:
+        by_month.setdefault(ssh_partitions.month_of(event[0]), []).append(event)
+    ssh_partitions.ensure(cursor.connection, by_month)
+
+    for month, month_events in by_month.items():
+        ssh_partitions.seed_sequence(cursor.connection, month)
+        insert_sql = INSERT_SSH_LOG_SQL.format(table=ssh_partitions.insert_table(month))
+        for start in range(0, len(month_events), Config.DB_BATCH_SIZE):
+            chunk = month_events[start:start + Config.DB_BATCH_SIZE]
+            cursor.executemany(insert_sql, chunk)
+            update_ip_aggregates(cursor, chunk)
+            rollups.update_ssh_rollups(cursor, chunk)
+            heavy_hitters.update_topk(cursor, chunk)
+        ssh_partitions.update_catalog(cursor.connection, month, month_events)
+    return len(events)
+
+def merge_usernames(existing, new_usernames):
+    """Ogranicz listę userów IP do Config.IP_MAX_USERNAMES ostatnio widzianych"""
+    merged = [u for u in (existing.split(',') if existing else []) if u]
+    for username in new_usernames:
+        if username in merged:
+            merged.remove(username)
+        merged.append(username)
+    return ','.join(merged[-Config.IP_MAX_USERNAMES:])
+
+def update_ip_aggregates(cursor, events):
+    """Dolicz paczkę zdarzeń do liczników w tabeli ips (jeden UPSERT na IP)"""
+    per_ip = {}
+    for timestamp, username, ip, dns_name, _port, status, _message in events:
+        agg = per_ip.get(ip)
+        if agg is None:
+            agg = per_ip[ip] = {'dns_name': dns_name, 'first_seen': timestamp, 'last_seen': timestamp,
+                                'accepted': 0, 'failed': 0, 'invalid': 0, 'usernames': []}
+        agg['first_seen'] = min(agg['first_seen'], timestamp)
+        agg['last_seen'] = max(agg['last_seen'], timestamp)
+        agg['dns_name'] = agg['dns_name'] or dns_name
+        if status in ('accepted', 'failed', 'invalid'):
+            agg[status] += 1
+        agg['usernames'].append(username)
+
+    if not per_ip:
+        return
+
+    # Listy userów scalamy w Pythonie - SQLite nie ma ograniczonego zbioru
+    ips = list(per_ip)
+    placeholders = ','.join('?' for _ in ips)
+    cursor.execute(f"SELECT ip_address, usernames FROM ips WHERE ip_address IN ({placeholders})", ips)
+    existing = dict(cursor.fetchall())
+
+    cursor.executemany(UPSERT_IP_SQL, [
+        (ip, agg['dns_name'], agg['first_seen'], agg['last_seen'],
+         agg['accepted'], agg['failed'], agg['invalid'],
+         merge_usernames(existing.get(ip), agg['usernames']))
+        for ip, agg in per_ip.items()
+    ])
+
+def _add_column(cursor, table, column, definition):
+    """ALTER TABLE ADD COLUMN tylko gdy kolumny jeszcze nie ma"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _migration_1_baseline(cursor):
+    """Schemat bazowy - tabele i kolumny dodawane wcześniej przez ALTER w try/except"""
+    # Tabela SSH logów
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ssh_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME,
+            username TEXT,
+            ip_address TEXT,
+            port INTEGER,
+            status TEXT,
+            message TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    _add_column(cursor, 'ssh_logs', 'dns_name', 'TEXT')
+
+    # Tabela alertów
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            alert_type TEXT,
+            severity TEXT,
+            message TEXT,
+            details TEXT,
+            email_sent BOOLEAN DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Tabela system metrics
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS system_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cpu_percent REAL,
+            memory_percent REAL,
+            disk_percent REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    _add_column(cursor, 'system_metrics', 'net_sent_bytes', 'INTEGER')
+    _add_column(cursor, 'system_metrics', 'net_recv_bytes', 'INTEGER')
+
+    # Tabela checkpointów parsera (offset w pliku logu / kursor journald)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_checkpoints (
+            source TEXT PRIMARY KEY,
+            inode INTEGER,
+            offset INTEGER,
+            line_hash TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    _add_column(cursor, 'log_checkpoints', 'cursor', 'TEXT')
+
+def _migration_2_dashboard_indexes(cursor):
+    """Indeksy pod zapytania dashboardu, check_anomalies i alert_manager"""
+    # /api/stats, /api/ssh_timeline, check_anomalies: zakres czasu + status (+ IP)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ssh_logs_ts_status_ip
+        ON ssh_logs (timestamp, status, ip_address)
+    ''')
+    # Historia pojedynczego IP, backfill DNS
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ssh_logs_ip_ts
+        ON ssh_logs (ip_address, timestamp)
+    ''')
+    # /api/alerts i alert_manager: niewysłane alerty po dacie
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alerts_email_sent_created
+        ON alerts (email_sent, created_at)
+    ''')
+    # /api/stats: liczba alertów z ostatniej doby
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alerts_created
+        ON alerts (created_at)
+    ''')
+    # Deduplikacja alertów failed_login w check_anomalies
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alerts_type_details_created
+        ON alerts (alert_type, details, created_at)
+    ''')
+    # /api/system_history
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_system_metrics_ts
+        ON system_metrics (timestamp)
+    ''')
+
+def _migration_3_dns_cache(cursor):
+    """Trwały cache reverse DNS (dns_resolver.py), czasy jako unix epoch"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ip_dns_cache (
+            ip_address TEXT PRIMARY KEY,
+            dns_name TEXT,
+            resolved_at REAL,
+            expires_at REAL
+        )
+    ''')
+    # Rozwiązania już zapisane w ssh_logs nie muszą być odpytywane ponownie
+    cursor.execute('''
+        INSERT OR IGNORE INTO ip_dns_cache (ip_address, dns_name, resolved_at, expires_at)
+        SELECT ip_address, MAX(dns_name), strftime('%s', 'now'), strftime('%s', 'now') + ?
+        FROM ssh_logs
+        WHERE dns_name IS NOT NULL
+        GROUP BY ip_address
+    ''', (Config.DNS_POSITIVE_TTL,))
+
+def _migration_4_ips(cursor):
+    """Tabela wymiaru IP z bieżącymi agregatami, wypełniona z historii ssh_logs"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ips (
+            ip_address TEXT PRIMARY KEY,
+            dns_name TEXT,
+            first_seen DATETIME,
+            last_seen DATETIME,
+            accepted_count INTEGER NOT NULL DEFAULT 0,
+            failed_count INTEGER NOT NULL DEFAULT 0,
+            invalid_count INTEGER NOT NULL DEFAULT 0,
+            usernames TEXT
+        )
+    ''')
+    # /api/top_ips, /api/trusted_hosts, unikalne IP w /api/stats
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ips_last_seen
+        ON ips (last_seen)
+    ''')
+
+    cursor.execute('''
+        SELECT
+            l.ip_address,
+            COALESCE(MAX(c.dns_name), MAX(l.dns_name)),
+            MIN(l.timestamp),
+            MAX(l.timestamp),
+            SUM(l.status = 'accepted'),
+            SUM(l.status = 'failed'),
+            SUM(l.status = 'invalid'),
+            GROUP_CONCAT(DISTINCT l.username)
+        FROM ssh_logs l
+        LEFT JOIN ip_dns_cache c ON c.ip_address = l.ip_address
+        GROUP BY l.ip_address
+    ''')
+    rows = [row[:7] + (merge_usernames(None, (row[7] or '').split(',')),)
+            for row in cursor.fetchall()]
+    cursor.executemany('''
+        INSERT OR REPLACE INTO ips (ip_address, dns_name, first_seen, last_seen,
+                                    accepted_count, failed_count, invalid_count, usernames)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+def _migration_5_ssh_rollups(cursor):
+    """Agregaty godzinowe i dzienne ssh_logs, wypełnione z historii"""
+    for rollup in ('hourly', 'daily'):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS ssh_rollup_{rollup} (
+                bucket TEXT NOT NULL,
+                status TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                unique_ips INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket, status)
+            ) WITHOUT ROWID
+        ''')
+    # Które IP już policzono w kubełku - żeby unique_ips dało się aktualizować przyrostowo
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ssh_rollup_seen_ips (
+            rollup TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            status TEXT NOT NULL,
+            ip_address TEXT NOT NULL,
+            PRIMARY KEY (rollup, bucket, status, ip_address)
+        ) WITHOUT ROWID
+    ''')
+
+    for rollup, bucket_format in (('hourly', rollups.HOUR_FORMAT), ('daily', rollups.DAY_FORMAT)):
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO ssh_rollup_seen_ips (rollup, bucket, status, ip_address)
+            SELECT DISTINCT ?, strftime(?, timestamp), status, ip_address
+            FROM ssh_logs
+        ''', (rollup, bucket_format))
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO ssh_rollup_{rollup} (bucket, status, count, unique_ips)
+            SELECT strftime(?, timestamp), status, COUNT(*), COUNT(DISTINCT ip_address)
+            FROM ssh_logs
+            GROUP BY 1, 2
+        ''', (bucket_format,))
+
+def _migration_6_metrics_tiers(cursor):
+    """Agregaty system_metrics 1 min / 1 h i znaczniki kompaktowania (metrics_tiers.py)"""
+    for tier in ('1m', '1h'):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS system_metrics_{tier} (
+                bucket TEXT PRIMARY KEY,
+                samples INTEGER NOT NULL,
+                cpu_min REAL,
+                cpu_avg REAL,
+                cpu_max REAL,
+                memory_min REAL,
+                memory_avg REAL,
+                memory_max REAL,
+                disk_percent REAL,
+                net_sent_bytes INTEGER,
+                net_recv_bytes INTEGER
+            ) WITHOUT ROWID
+        ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metrics_compaction (
+            tier TEXT PRIMARY KEY,
+            watermark TEXT NOT NULL
+        )
+    ''')
+
+def _migration_7_ssh_partitions(cursor):
+    """Katalog zamkniętych miesięcznych partycji ssh_logs (ssh_partitions.py).
+
+    Same dane przenosi ssh_partitions.adopt_main_table() po migracjach -
+    ATTACH nie działa wewnątrz transakcji migracji.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ssh_partitions (
+            month TEXT PRIMARY KEY,
+            rows INTEGER,
+            first_id INTEGER,
+            last_id INTEGER,
+            first_ts DATETIME,
+            last_ts DATETIME,
+            sealed_at DATETIME
+        )
+    ''')
+
+def _migration_8_nic_rates(cursor):
+    """Prędkości sieci per interfejs i ostatnie liczniki (net_rates.py)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS nic_rates (
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            nic TEXT NOT NULL,
+            bytes_sent_rate REAL,
+            bytes_recv_rate REAL,
+            packets_sent_rate REAL,
+            packets_recv_rate REAL,
+            seconds REAL NOT NULL,
+            PRIMARY KEY (timestamp, nic)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS nic_counters (
+            nic TEXT PRIMARY KEY,
+            timestamp REAL NOT NULL,
+            boot_time REAL NOT NULL,
+            bytes_sent INTEGER,
+            bytes_recv INTEGER,
+            packets_sent INTEGER,
+            packets_recv INTEGER
+        )
+    ''')
+
+def _migration_9_detector_state(cursor):
+    """Deduplikacja alertów detektora brute-force (brute_force.py)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS detector_state (
+            ip_address TEXT NOT NULL,
+            rule TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (ip_address, rule)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_detector_state_expires
+        ON detector_state (expires_at)
+    ''')
+
+def _migration_10_sketch_state(cursor):
+    """Zapisane szkice HLL/Count-Min detektora password sprayingu (password_spray.py)"""
+    # Zwykła tabela z rowid - wiersze to bloby ~1-32 KB
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sketch_state (
+            generation INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            data BLOB,
+            PRIMARY KEY (kind, key, generation)
+        )
+    ''')
+
+def _migration_11_ssh_topk(cursor):
+    """Kubełki top-K atakujących (heavy_hitters.py), wypełnione z ostatnich TOPK_RETENTION_DAYS"""
+    for rollup in ('hourly', 'daily'):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS ssh_topk_{rollup} (
+                bucket TEXT PRIMARY KEY,
+                total INTEGER NOT NULL,
+                items TEXT NOT NULL
+            )
+        ''')
+    heavy_hitters.backfill(cursor)
+
+def _migration_12_email_outbox(cursor):
+    """Kolejka maili z ponawianiem (alert_manager.py); czasy jako epoch"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject TEXT,
+            recipients TEXT NOT NULL,
+            message TEXT NOT NULL,
+            alert_count INTEGER NOT NULL DEFAULT 0,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            sent_at REAL
+        )
+    ''')
+    # Paczka do wysłania: stan + termin kolejnej próby
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_email_outbox_state_next
+        ON email_outbox (state, next_attempt_at)
+    ''')
+
+# (wersja, opis, funkcja) - tylko dopisujemy na końcu, nigdy nie zmieniamy starych
+MIGRATIONS = [
+    (1, 'baseline schema', _migration_1_baseline),
+    (2, 'dashboard indexes', _migration_2_dashboard_indexes),
+    (3, 'reverse DNS cache', _migration_3_dns_cache),
+    (4, 'per-IP aggregates', _migration_4_ips),
+    (5, 'hourly/daily ssh rollups', _migration_5_ssh_rollups),
+    (6, 'system_metrics 1m/1h tiers', _migration_6_metrics_tiers),
+    (7, 'monthly ssh_logs partitions', _migration_7_ssh_partitions),
+    (8, 'per-NIC network rates', _migration_8_nic_rates),
+    (9, 'brute-force detector state', _migration_9_detector_state),
+    (10, 'password spraying sketches', _migration_10_sketch_state),
+    (11, 'top attackers heavy hitters', _migration_11_ssh_topk),
+    (12, 'email outbox', _migration_12_email_outbox),
+]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Zastosuj brakujące migracje; wersja schematu w PRAGMA user_version"""
+    current = schema_version(conn)
+    isolation_level = conn.isolation_level
+    # Sterujemy transakcją sami - każda migracja razem z user_version albo wcale
+    conn.isolation_level = None
+    try:
+        for version, description, apply in MIGRATIONS:
+            if version <= current:
+                continue
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                apply(cursor)
+                cursor.execute(f"PRAGMA user_version = {version}")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            print(f"Migrated database to version {version}: {description}")
+            current = version
+        _enable_incremental_vacuum(conn)
+    finally:
+        conn.isolation_level = isolation_level
+    ssh_partitions.adopt_main_table(conn)
+    ssh_partitions.attach(conn, writable=True)
+    return current
+
+def _enable_incremental_vacuum(conn):
+    """auto_vacuum=INCREMENTAL, żeby retencja mogła oddawać strony (metrics_tiers.py)
+
+    Zmiana trybu w istniejącej bazie wymaga jednorazowego VACUUM (poza transakcją).
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        print("Rebuilding database file for incremental vacuum...")
+        conn.execute("VACUUM")
+
+def init_db():
+    """Utwórz/zaktualizuj schemat bazy"""
+    conn = connect(writer=True)
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
+
+def explain(conn, sql, params=()):
+    """Szczegóły EXPLAIN QUERY PLAN (kolumna detail) dla zapytania"""
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+def full_scans(plan):
+    """Kroki planu czytające tabelę bez indeksu (skan już policzonego podzapytania się nie liczy)"""
+    derived = {step.split(' ', 1)[1] for step in plan if step.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+    return [step for step in plan
+            if step.startswith('SCAN ') and 'INDEX' not in step
+            and not step.startswith('SCAN CONSTANT ROW')
+            and step[len('SCAN '):] not in derived]
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Reverse DNS poza ścieżką ingestu
+- ograniczona pula wątków, limit czasu na pojedyncze zapytanie
+- trwały cache ip_dns_cache z osobnym TTL dla trafień i braków (negative cache)
+- wyniki zapisuje wątek wywołujący (apply_results), wątki puli nie dotykają bazy
+"""
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import Config
+
+def reverse_lookup(ip_address):
+    """Blokujący reverse DNS (wołany w wątku puli). None gdy brak PTR"""
+    try:
+        hostname, _, _ = socket.gethostbyaddr(ip_address)
+        return hostname
+    except (OSError, UnicodeError):
+        return None
+
+class DnsResolver:
+    """Asynchroniczny resolver z cache w pamięci i w tabeli ip_dns_cache"""
+
+    def __init__(self, workers=None, timeout=None):
+        self.timeout = timeout if timeout is not None else Config.DNS_TIMEOUT
+        self._executor = ThreadPoolExecutor(max_workers=workers or Config.DNS_WORKERS,
+                                            thread_name_prefix='dns')
+        # ip -> (dns_name, expires_at); trzymamy tylko to, co już widzieliśmy
+        self._cache = {}
+        # ip -> future; ip -> moment startu w wątku puli (limit liczymy od startu,
+        # nie od zlecenia, żeby kolejka nie zamieniała się w negative cache)
+        self._pending = {}
+        self._started = {}
+
+    def lookup(self, cursor, ip_address):
+        """Nazwa z cache albo None; przy braku/wygaśnięciu zleca zapytanie w tle"""
+        now = time.time()
+        cached = self._cache.get(ip_address)
+        if cached is None:
+            cursor.execute('''
+                SELECT dns_name, expires_at FROM ip_dns_cache WHERE ip_address = ?
+            ''', (ip_address,))
+            row = cursor.fetchone()
+            if row:
+                cached = self._cache[ip_address] = (row[0], row[1])
+
+        if cached is None or cached[1] <= now:
+            self._submit(ip_address)
+
+        # Wygasły wpis nadal jest lepszy niż nic, dopóki nie przyjdzie nowy wynik
+        return cached[0] if cached else None
+
+    def _submit(self, ip_address):
+        if ip_address in self._pending:
+            return
+        if len(self._pending) >= Config.DNS_MAX_PENDING:
+            # Kolejka pełna - IP wróci przy następnym wystąpieniu
+            return
+        self._pending[ip_address] = self._executor.submit(self._timed_lookup, ip_address)
+
+    def _timed_lookup(self, ip_address):
+        self._started[ip_address] = time.time()
+        return reverse_lookup(ip_address)
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def apply_results(self, cursor):
+        """Zapisz zakończone (lub przeterminowane) zapytania; zwraca liczbę zapisanych"""
+        now = time.time()
+        applied = 0
+        for ip_address, future in list(self._pending.items()):
+            started_at = self._started.get(ip_address)
+            if future.cancelled():
+                # Anulowane przed startem - spróbujemy przy następnym wystąpieniu IP
+                self._forget(ip_address)
+                continue
+            if future.done():
+                dns_name = future.result()
+            elif started_at is not None and now - started_at > self.timeout:
+                # Nie da się przerwać gethostbyaddr - traktujemy jak brak PTR
+                dns_name = None
+            else:
+                continue
+
+            self._forget(ip_address)
+            self._store(cursor, ip_address, dns_name, now)
+            applied += 1
+        return applied
+
+    def _forget(self, ip_address):
+        del self._pending[ip_address]
+        self._started.pop(ip_address, None)
+
+    def _store(self, cursor, ip_address, dns_name, now):
+        ttl = Config.DNS_POSITIVE_TTL if dns_name else Config.DNS_NEGATIVE_TTL
+        expires_at = now + ttl
+        self._cache[ip_address] = (dns_name, expires_at)
+        cursor.execute('''
+            INSERT INTO ip_dns_cache (ip_address, dns_name, resolved_at, expires_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(ip_address) DO UPDATE SET
+                dns_name = excluded.dns_name,
+                resolved_at = excluded.resolved_at,
+                expires_at = excluded.expires_at
+        ''', (ip_address, dns_name, now, expires_at))
+        if dns_name:
+            # Nazwa hosta żyje w wymiarze ips - jeden wiersz na IP, nie cała historia
+            cursor.execute('''
+                UPDATE ips SET dns_name = ? WHERE ip_address = ?
+            ''', (dns_name, ip_address))
+
+    def finish(self, cursor, wait_seconds=None):
+        """Poczekaj chwilę na zaległe zapytania, zapisz wyniki i zamknij pulę"""
+        if wait_seconds is None:
+            wait_seconds = self.timeout
+        if self._pending:
+            wait(list(self._pending.values()), timeout=wait_seconds)
+        applied = self.apply_results(cursor)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        return applied
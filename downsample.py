@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Downsampling szeregów czasowych po stronie serwera
+- gauge (CPU, pamięć, dysk): Largest-Triangle-Three-Buckets (LTTB) - zachowuje
+  kształt i piki przy stałej liczbie punktów
+- liczniki (bajty sieci): suma przyrostów w kubełku / czas kubełka = średnia
+  prędkość; spadek licznika (restart) traktujemy jak start od zera
+- wynik kolumnowy: {'timestamp': [...], 'cpu_percent': [...], ...}
+Wszystkie serie dzielą te same kubełki (zakresy indeksów), więc mają wspólną oś czasu.
+"""
+from datetime import datetime
+
+def bucket_ranges(n, threshold):
+    """Zakresy indeksów [start, end) kubełków LTTB: pierwszy i ostatni punkt osobno"""
+    if threshold >= n or threshold < 3:
+        return [(i, i + 1) for i in range(n)]
+    every = (n - 2) / (threshold - 2)
+    ranges = [(0, 1)]
+    for i in range(threshold - 2):
+        ranges.append((int(i * every) + 1, int((i + 1) * every) + 1))
+    ranges.append((n - 1, n))
+    return ranges
+
+def _span(ys):
+    values = [y for y in ys if y is not None]
+    span = max(values) - min(values) if values else 0
+    return span or 1
+
+def lttb(xs, series, ranges):
+    """Indeks wybrany przez LTTB w każdym kubełku, wspólny dla wszystkich serii.
+
+    Pole trójkąta liczymy dla każdej serii (znormalizowane jej zakresem, żeby
+    CPU w % nie zagłuszało innych jednostek) i sumujemy - wybrany wiersz
+    zachowuje piki każdej z serii, a wartości w kolumnach pochodzą z jednego
+    wiersza. None w y pomijamy.
+    """
+    scales = [_span(ys) for ys in series]
+    selected = [ranges[0][0]]
+    a = ranges[0][0]
+    for b in range(1, len(ranges) - 1):
+        start, end = ranges[b]
+        next_start, next_end = ranges[b + 1]
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        ax = xs[a]
+        anchors = []
+        for ys in series:
+            next_ys = [y for y in ys[next_start:next_end] if y is not None]
+            avg_y = sum(next_ys) / len(next_ys) if next_ys else 0
+            anchors.append((ys[a] if ys[a] is not None else avg_y, avg_y))
+
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = 0.0
+            present = False
+            for ys, scale, (ay, avg_y) in zip(series, scales, anchors):
+                if ys[j] is None:
+                    continue
+                present = True
+                area += abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay)) / scale
+            if present and area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    if len(ranges) > 1:
+        selected.append(ranges[-1][0])
+    return selected
+
+def counter_rates(xs, counters, ranges):
+    """Średnia prędkość licznika na sekundę w każdym kubełku (None bez przyrostów)"""
+    rates = []
+    for start, end in ranges:
+        total, seconds = 0, 0.0
+        for j in range(max(start, 1), end):
+            current, previous = counters[j], counters[j - 1]
+            if current is None or previous is None:
+                continue
+            dt = xs[j] - xs[j - 1]
+            if dt <= 0:
+                continue
+            total += current - previous if current >= previous else current
+            seconds += dt
+        rates.append(round(total / seconds, 1) if seconds else None)
+    return rates
+
+def _epoch(timestamp):
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    return datetime.fromisoformat(str(timestamp)[:19]).timestamp()
+
+def series_columns(rows, max_points, gauges, counters):
+    """Wiersze (słowniki z 'timestamp') -> kolumny z co najwyżej max_points punktami.
+
+    Wszystkie gauge dzielą jeden wybór wierszy LTTB, więc timestamp[i],
+    cpu[i], memory[i] pochodzą z tego samego wiersza. Liczniki zamieniane są
+    na prędkość `<nazwa>_rate` (jednostki/s) w tych samych kubełkach.
+    """
+    xs = [_epoch(row['timestamp']) for row in rows]
+    ranges = bucket_ranges(len(rows), max_points)
+    series = {name: [row.get(name) for row in rows] for name in gauges}
+    picked = lttb(xs, list(series.values()), ranges) if rows else []
+    columns = {'timestamp': [rows[i]['timestamp'] for i in picked]}
+    for name, ys in series.items():
+        columns[name] = [ys[i] for i in picked]
+    for name in counters:
+        columns[f"{name}_rate"] = counter_rates(xs, [row.get(name) for row in rows], ranges)
+    return columns
+
+def merge_buckets(labels, columns, max_points, reducers):
+    """Sklej po k sąsiednich kubełków, gdy jest ich więcej niż max_points.
+
+    reducers: {kolumna: funkcja(lista) -> wartość}, np. sum dla liczników.
+    Zwraca (etykiety pierwszych kubełków grup, kolumny, k).
+    """
+    k = max(1, -(-len(labels) // max_points))
+    if k == 1:
+        return labels, columns, k
+    merged = {name: [] for name in columns}
+    for start in range(0, len(labels), k):
+        for name, values in columns.items():
+            merged[name].append(reducers[name](values[start:start + k]))
+    return labels[::k], merged, k
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Najaktywniejsi atakujący (top-K IP po nieudanych próbach) dla dowolnego okna
+- Space-Saving (Metwally i in.) o pojemności TOPK_CAPACITY per kubełek godzinowy
+  i dzienny, aktualizowany w tej samej transakcji co wstawienie logów
+- zapytanie o okno scala gotowe kubełki (najwyżej ~24 godzinowe + dzienne + ~24 godzinowe),
+  niezależnie od liczby surowych wierszy
+- granice błędu: count jest górnym oszacowaniem, count - error dolnym;
+  IP spoza listy mogło mieć najwyżej max_error prób
+"""
+import json
+import re
+from datetime import datetime, timedelta
+from config import Config
+
+HOUR_FORMAT = '%Y-%m-%d %H:00:00'
+DAY_FORMAT = '%Y-%m-%d 00:00:00'
+FAILED_STATUSES = ('failed', 'invalid')
+WINDOW_RE = re.compile(r'^(\d+)([hd])$')
+
+QUERIES = {
+    'topk_hourly': '''
+        SELECT bucket, total, items FROM ssh_topk_hourly WHERE bucket >= ? AND bucket < ?
+    ''',
+    'topk_daily': '''
+        SELECT bucket, total, items FROM ssh_topk_daily WHERE bucket >= ? AND bucket < ?
+    ''',
+}
+
+class SpaceSaving:
+    """Top-K w stałej pamięci: {element: [count, error]}, count - error <= prawdziwa liczba <= count"""
+
+    def __init__(self, capacity, counters=None, total=0, floor=0):
+        self.capacity = capacity
+        self.counters = counters if counters is not None else {}
+        self.total = total
+        # Górna granica liczby dla elementu spoza counters
+        self.floor = floor
+
+    def update(self, item, count=1):
+        self.total += count
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            return
+        # Wypieramy najmniejszy licznik - nowy element dziedziczy jego wartość jako błąd
+        weakest = min(self.counters, key=lambda key: self.counters[key][0])
+        minimum = self.counters.pop(weakest)[0]
+        self.counters[item] = [minimum + count, minimum]
+        self.floor = minimum
+
+    def min_count(self):
+        """Ile mógł mieć element spoza listy (0 dopóki lista nie jest pełna)"""
+        if len(self.counters) < self.capacity:
+            return self.floor
+        return max(self.floor, min(counter[0] for counter in self.counters.values()))
+
+    @classmethod
+    def merge(cls, summaries, capacity):
+        """Scal streszczenia (np. kolejne godziny) w jedno o tej samej pojemności.
+
+        Element nieobecny w streszczeniu mógł tam mieć do min_count() - tyle
+        doliczamy do jego licznika i błędu, więc granice pozostają prawdziwe.
+        """
+        mins = [summary.min_count() for summary in summaries]
+        items = set()
+        for summary in summaries:
+            items.update(summary.counters)
+        counters = {}
+        for item in items:
+            count = error = 0
+            for summary, minimum in zip(summaries, mins):
+                counter = summary.counters.get(item)
+                if counter is None:
+                    count += minimum
+                    error += minimum
+                else:
+                    count += counter[0]
+                    error += counter[1]
+            counters[item] = [count, error]
+        floor = sum(mins)
+        if len(counters) > capacity:
+            ranked = sorted(counters.items(), key=lambda kv: kv[1][0], reverse=True)
+            floor = max(floor, ranked[capacity][1][0])
+            counters = dict(ranked[:capacity])
+        return cls(capacity, counters, sum(summary.total for summary in summaries), floor)
+
+    def top(self, limit, exclude=None):
+        """Najwięksi `limit`; exclude(element) -> True pomija element (np. zaufane IP)"""
+        ranked = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)
+        return [kv for kv in ranked if not (exclude and exclude(kv[0]))][:limit]
+
+    def to_json(self):
+        return json.dumps({'floor': self.floor, 'counters': self.counters}, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, capacity, total, data):
+        data = json.loads(data)
+        return cls(capacity, data['counters'], total, data['floor'])
+
+def update_topk(cursor, events):
+    """Dolicz paczkę zdarzeń do kubełków top-K (godzinowych i dziennych)"""
+    for rollup, bucket_format in (('hourly', HOUR_FORMAT), ('daily', DAY_FORMAT)):
+        per_bucket = {}
+        for timestamp, _username, ip, _dns_name, _port, status, _message in events:
+            if status not in FAILED_STATUSES:
+                continue
+            counts = per_bucket.setdefault(timestamp.strftime(bucket_format), {})
+            counts[ip] = counts.get(ip, 0) + 1
+        _apply(cursor, rollup, per_bucket)
+
+def _apply(cursor, rollup, per_bucket):
+    table = f'ssh_topk_{rollup}'
+    for bucket, counts in per_bucket.items():
+        cursor.execute(f"SELECT total, items FROM {table} WHERE bucket = ?", (bucket,))
+        row = cursor.fetchone()
+        summary = (SpaceSaving.from_json(Config.TOPK_CAPACITY, row[0], row[1]) if row
+                   else SpaceSaving(Config.TOPK_CAPACITY))
+        # Paczka liczona dokładnie (pojemność większa niż liczba IP, więc min_count() = 0);
+        # scalenie zamiast update() per IP - jedno sortowanie zamiast wypierania po kolei
+        exact = SpaceSaving(len(counts) + 1, {ip: [count, 0] for ip, count in counts.items()},
+                            sum(counts.values()))
+        summary = SpaceSaving.merge([summary, exact], Config.TOPK_CAPACITY)
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO {table} (bucket, total, items) VALUES (?, ?, ?)
+        ''', (bucket, summary.total, summary.to_json()))
+
+def backfill(cursor):
+    """Wypełnij kubełki z ssh_logs z okresu retencji (migracja)"""
+    since = (datetime.now() - timedelta(days=Config.TOPK_RETENTION_DAYS + 1)).strftime(DAY_FORMAT)
+    for rollup, bucket_format in (('hourly', HOUR_FORMAT), ('daily', DAY_FORMAT)):
+        cursor.execute('''
+            SELECT strftime(?, timestamp), ip_address, COUNT(*)
+            FROM ssh_logs
+            WHERE timestamp >= ? AND status IN ('failed', 'invalid')
+            GROUP BY 1, 2
+        ''', (bucket_format, since))
+        per_bucket = {}
+        for bucket, ip, count in cursor.fetchall():
+            per_bucket.setdefault(bucket, {})[ip] = count
+        _apply(cursor, rollup, per_bucket)
+
+def prune(conn):
+    """Retencja kubełków: starsze niż TOPK_RETENTION_DAYS (dłuższe okno i tak wymaga brzegu godzinowego)"""
+    deleted = 0
+    for rollup in ('hourly', 'daily'):
+        cursor = conn.execute(f'''
+            DELETE FROM ssh_topk_{rollup} WHERE bucket < datetime('now', 'localtime', ?)
+        ''', (f"-{int(Config.TOPK_RETENTION_DAYS) + 1} days",))
+        deleted += cursor.rowcount
+    conn.commit()
+    return deleted
+
+def parse_window(value):
+    """'1h', '24h', '30d' -> timedelta (ValueError dla złego formatu lub za długiego okna)"""
+    match = WINDOW_RE.match(value or '')
+    if not match:
+        raise ValueError("window must look like 1h, 24h or 30d")
+    amount, unit = int(match.group(1)), match.group(2)
+    window = timedelta(hours=amount) if unit == 'h' else timedelta(days=amount)
+    if not timedelta(hours=1) <= window <= timedelta(days=Config.TOPK_RETENTION_DAYS):
+        raise ValueError(f"window must be between 1h and {Config.TOPK_RETENTION_DAYS}d")
+    return window
+
+def _segments(start, end):
+    """Zakres [start, end) w kubełkach: godziny na brzegach, pełne dni w środku"""
+    start = start.replace(minute=0, second=0, microsecond=0)
+    first_day = start.replace(hour=0)
+    if first_day < start:
+        first_day += timedelta(days=1)
+    last_day = end.replace(hour=0, minute=0, second=0, microsecond=0)
+    if first_day >= last_day:
+        return [('hourly', start, end)]
+    segments = [('hourly', start, first_day), ('daily', first_day, last_day), ('hourly', last_day, end)]
+    return [segment for segment in segments if segment[1] < segment[2]]
+
+def top_attackers(conn, window, limit, exclude=None, now=None):
+    """Top `limit` IP z oknem wyrównanym do pełnych godzin (początek zaokrąglony w dół)"""
+    end = now or datetime.now()
+    summaries = []
+    segments = _segments(end - window, end)
+    cursor = conn.cursor()
+    for rollup, seg_start, seg_end in segments:
+        cursor.execute(QUERIES[f'topk_{rollup}'], (seg_start.strftime('%Y-%m-%d %H:%M:%S'),
+                                                    seg_end.strftime('%Y-%m-%d %H:%M:%S')))
+        summaries.extend(SpaceSaving.from_json(Config.TOPK_CAPACITY, total, items)
+                         for _bucket, total, items in cursor.fetchall())
+    merged = SpaceSaving.merge(summaries, Config.TOPK_CAPACITY)
+    return {
+        'from': segments[0][1].isoformat(' ', 'seconds'),
+        'to': end.isoformat(' ', 'seconds'),
+        'buckets': len(summaries),
+        'total': merged.total,
+        'max_error': merged.min_count(),
+        'items': [{'ip_address': ip, 'count': count, 'error': error, 'min_count': count - error}
+                  for ip, (count, error) in merged.top(limit, exclude)],
+    }
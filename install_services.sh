@@ -13,14 +13,34 @@ cp systemd/hoblera-metrics.service /etc/systemd/system/
 cp systemd/hoblera-metrics.timer /etc/systemd/system/
 cp systemd/hoblera-logs.service /etc/systemd/system/
 cp systemd/hoblera-logs.timer /etc/systemd/system/
+cp systemd/hoblera-logs-follow.service /etc/systemd/system/
+cp systemd/hoblera-metrics-daemon.service /etc/systemd/system/
+cp systemd/hoblera-alerts.service /etc/systemd/system/
+cp systemd/hoblera-bans.service /etc/systemd/system/
 
 # Reload daemon
 systemctl daemon-reload
 
-# Enable and start timers
-echo "Enabling timers..."
-systemctl enable --now hoblera-metrics.timer
-systemctl enable --now hoblera-logs.timer
+# Metrics collector runs continuously (per-second ring buffer + DB row every 5min)
+echo "Enabling metrics collector daemon..."
+systemctl disable --now hoblera-metrics.timer 2>/dev/null
+systemctl enable --now hoblera-metrics-daemon.service
 
-echo "Done! Metrics will collect every 5min, Logs every 1min."
-echo "Check status with: systemctl list-timers --all"
+# Log parser runs continuously (follow mode) instead of the 1-minute timer
+echo "Enabling log follower..."
+systemctl disable --now hoblera-logs.timer 2>/dev/null
+systemctl enable --now hoblera-logs-follow.service
+
+# Alert emails are queued and delivered continuously (digest + retry)
+echo "Enabling alert manager..."
+systemctl enable --now hoblera-alerts.service
+
+# fail2ban action talks to this socket instead of writing to the DB itself
+echo "Enabling fail2ban event listener..."
+systemctl enable --now hoblera-bans.service
+
+echo "Done! Metrics are sampled every second (saved every 5min), Logs are followed continuously."
+echo "Check status with: systemctl status hoblera-metrics-daemon"
+echo "                   systemctl status hoblera-logs-follow"
+echo "                   systemctl status hoblera-alerts"
+echo "                   systemctl status hoblera-bans"
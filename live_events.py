@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Zdarzenia na żywo dla /api/stream (Server-Sent Events)
+- jeden wątek obserwatora odpytuje bazę (PRAGMA data_version + znaczniki MAX(id))
+  niezależnie od liczby otwartych kart
+- zdarzenia trafiają do bufora pierścieniowego serializowane raz; klienci tylko
+  czekają na Condition i czytają z pamięci
+- klient, który wypadł poza bufor, dostaje `resync` i przeładowuje dashboard
+"""
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from config import Config
+import db
+import ssh_partitions
+
+# Nowe wiersze od znacznika - sprawdzane też przez migrate_db.py --check
+QUERIES = {
+    'stream_ssh': '''
+        SELECT id, timestamp, username, ip_address, dns_name, port, status
+        FROM ssh_logs
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''',
+    'stream_alerts': '''
+        SELECT id, alert_type, severity, message, details, created_at, email_sent
+        FROM alerts
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''',
+    'stream_metrics': '''
+        SELECT *
+        FROM system_metrics
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''',
+}
+
+# (zapytanie, źródło MAX(id), typ zdarzenia); ssh_logs_latest zamiast skanu widoku partycji
+STREAMS = [
+    ('stream_ssh', 'ssh_logs_latest', 'ssh'),
+    ('stream_alerts', 'alerts', 'alert'),
+    ('stream_metrics', 'system_metrics', 'metric'),
+]
+
+class EventHub:
+    """Bufor pierścieniowy zdarzeń SSE z numeracją; jeden zapis, wielu czytelników"""
+
+    def __init__(self, size=None):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=size or Config.STREAM_BUFFER_SIZE)
+        self._seq = 0
+
+    def publish(self, event_type, data):
+        payload = json.dumps(data, default=str)
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, f"id: {self._seq}\nevent: {event_type}\ndata: {payload}\n\n"))
+            self._cond.notify_all()
+
+    def last_seq(self):
+        with self._cond:
+            return self._seq
+
+    def wait_for(self, after, timeout):
+        """Zdarzenia o numerze > after; zwraca (teksty SSE, nowy after, czy coś przepadło)"""
+        with self._cond:
+            if self._seq <= after:
+                self._cond.wait(timeout)
+            if after > self._seq:
+                # Numer z poprzedniego życia procesu (restart aplikacji)
+                return [], self._seq, True
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            missed = after + 1 < oldest and after < self._seq
+            texts = [text for seq, text in self._events if seq > after]
+            return texts, self._seq, missed
+
+class StreamWatcher:
+    """Wątek publikujący nowe wiersze ssh_logs/alerts/system_metrics i zmiany banów"""
+
+    def __init__(self, hub, bans_loader=None):
+        self.hub = hub
+        self.bans_loader = bans_loader
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stream-watcher', daemon=True)
+                self._thread.start()
+
+    def _poll_table(self, conn, name, table, event_type, after):
+        """Opublikuj wiersze po znaczniku; przy zbyt dużej zaległości tylko `resync`"""
+        cursor = conn.cursor()
+        cursor.execute(QUERIES[name], (after, Config.STREAM_MAX_ROWS + 1))
+        rows = [dict(row) for row in cursor.fetchall()]
+        if len(rows) > Config.STREAM_MAX_ROWS:
+            # Duży import (np. pierwszy przebieg parsera) - klienci przeładują dane
+            cursor.execute(f"SELECT MAX(id) FROM {table}")
+            self.hub.publish('resync', {'reason': event_type})
+            return cursor.fetchone()[0]
+        if rows:
+            self.hub.publish(event_type, rows)
+            return rows[-1]['id']
+        return after
+
+    def _run(self):
+        conn = db.connect(row_factory=sqlite3.Row)
+        cursor = conn.cursor()
+        marks = {}
+        for name, table, _ in STREAMS:
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+            marks[name] = cursor.fetchone()[0]
+
+        data_version = None
+        bans = None
+        bans_at = 0
+        while True:
+            try:
+                # data_version zmienia się tylko po commitach innych połączeń
+                current = conn.execute("PRAGMA data_version").fetchone()[0]
+                if current != data_version:
+                    data_version = current
+                    # Nowa partycja miesiąca (albo zamknięta stara) - widok ssh_logs do odświeżenia
+                    ssh_partitions.attach(conn)
+                    for name, table, event_type in STREAMS:
+                        marks[name] = self._poll_table(conn, name, table, event_type, marks[name])
+
+                if self.bans_loader and time.monotonic() - bans_at >= Config.STREAM_BANS_INTERVAL:
+                    bans_at = time.monotonic()
+                    current_bans = self.bans_loader()
+                    if current_bans != bans:
+                        if bans is not None:
+                            self.hub.publish('bans', current_bans)
+                        bans = current_bans
+            except Exception as e:
+                print(f"[ERROR] Stream watcher: {e}", file=sys.stderr)
+            time.sleep(Config.STREAM_POLL_INTERVAL)
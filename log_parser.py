@@ -1,268 +1,564 @@
 import os
+import sys
+import time
+import select
+import struct
 import subprocess
 import json
 import re
+import hashlib
 import sqlite3
 from datetime import datetime, timedelta
 from pathlib import Path
 from config import Config
+from dns_resolver import DnsResolver
+import db
+import ssh_partitions
+import heavy_hitters
+from brute_force import BruteForceDetector
+from password_spray import SprayDetector
+
+# Ile bajtów przed offsetem czytamy, by odnaleźć ostatnią przetworzoną linię
+CHECKPOINT_LOOKBACK_BYTES = 8192
+
+# Checkpoint journald (kursor) trzymamy w tej samej tabeli co offsety plików
+JOURNAL_SOURCE = 'journalctl:sshd'
+JOURNAL_COMMIT_EVERY = 1000
+# Tryb follow: commit, gdy strumień ucichnie albo najpóźniej co tyle sekund
+JOURNAL_FOLLOW_FLUSH_INTERVAL = 1.0
+
+# Tryb --follow (demon): inotify na katalogu logu, polling gdy niedostępny
+FOLLOW_POLL_INTERVAL = 0.5
+FOLLOW_IDLE_TIMEOUT = 5
+FOLLOW_RESTART_DELAY = 5
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+INOTIFY_EVENT_SIZE = struct.calcsize('iIII')
+
+# Wzorce kompilujemy raz - w trybie --follow zostają w pamięci.
+# Jeden wzorzec dla wszystkich źródeł (auth.log, journald, macOS): status
+# wynika z nazwanej grupy, która się dopasowała.
+SSHD_EVENT_RE = re.compile(
+    r'(?:(?P<accepted>Accepted (?:password|publickey) for )'
+    r'|(?P<failed>Failed password for (?:invalid user )?)'
+    r'|(?P<invalid>Invalid user ))'
+    r'(?P<user>\w+) from (?P<ip>[\da-fA-F:.%]+) port (?P<port>\d+)'
+)
+
+# Każdy interesujący komunikat zawiera " port " - tani filtr przed regexem
+SSHD_EVENT_PREFILTER = ' port '
+
+# Timestamp BSD syslog (macOS): Jan 15 08:29:05 hostname process[pid]: message
+SYSLOG_TS_RE = re.compile(r'[A-Z][a-z]{2}\s+\d+\s\d{2}:\d{2}:\d{2}')
+
+# Resolver DNS na cały proces (w trybie --follow cache jest ciepły)
+_dns_resolver = None
+
+# Detektory na cały proces (stan w pamięci, tworzone przy pierwszej paczce)
+_detector = None
+_spray_detector = None
+
+# Ostatnie zamykanie/retencja partycji ssh_logs (time.monotonic)
+_partitions_maintained_at = None
 
 def init_db():
-    """Inicjalizuj bazę danych"""
-    conn = sqlite3.connect(Config.DB_FILE)
-    cursor = conn.cursor()
-    
-    # Tabela SSH logów
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ssh_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME,
-            username TEXT,
-            ip_address TEXT,
-            port INTEGER,
-            status TEXT,
-            message TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Tabela alertów
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS alerts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            alert_type TEXT,
-            severity TEXT,
-            message TEXT,
-            details TEXT,
-            email_sent BOOLEAN DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Tabela system metrics
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS system_metrics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cpu_percent REAL,
-            memory_percent REAL,
-            disk_percent REAL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Migration: Add dns_name column if not exists
-    try:
-        cursor.execute("ALTER TABLE ssh_logs ADD COLUMN dns_name TEXT")
-        print("Migrated database: added dns_name column to ssh_logs")
-    except sqlite3.OperationalError:
-        pass
+    """Inicjalizuj bazę danych (wersjonowane migracje w db.py)"""
+    db.init_db()
 
-    # Migration: Add network metrics columns if not exists
+def maintain_partitions(conn):
+    """Zamknij stare miesiące ssh_logs, usuń przeterminowane archiwa i kubełki top-K (co SSH_MAINTAIN_INTERVAL)"""
+    global _partitions_maintained_at
+    now = time.monotonic()
+    if _partitions_maintained_at is not None and now - _partitions_maintained_at < Config.SSH_MAINTAIN_INTERVAL:
+        return
+    _partitions_maintained_at = now
     try:
-        cursor.execute("ALTER TABLE system_metrics ADD COLUMN net_sent_bytes INTEGER")
-        cursor.execute("ALTER TABLE system_metrics ADD COLUMN net_recv_bytes INTEGER")
-        print("Migrated database: added network columns to system_metrics")
-    except sqlite3.OperationalError:
-        pass
-    
-    conn.commit()
-    conn.close()
-
-def resolve_ip_dns(ip_address):
-    """Resolve IP to DNS name with cache and timeout"""
-    import socket
+        sealed, dropped = ssh_partitions.maintain(conn)
+        if sealed or dropped:
+            print(f"SSH partitions: sealed {', '.join(sealed) or '-'}, dropped {', '.join(dropped) or '-'}")
+    except Exception as e:
+        print(f"Error maintaining SSH partitions: {e}")
     try:
-        # Set timeout for DNS resolution to avoid hanging
-        socket.setdefaulttimeout(1)
-        hostname, _, _ = socket.gethostbyaddr(ip_address)
-        return hostname
-    except Exception:
+        heavy_hitters.prune(conn)
+    except Exception as e:
+        print(f"Error pruning top attackers: {e}")
+
+def get_detector(cursor):
+    """Wspólny BruteForceDetector; przy tworzeniu odtwarza okna z ssh_logs"""
+    global _detector
+    if _detector is None or _detector.stale():
+        _detector = BruteForceDetector()
+        replayed = _detector.load(cursor)
+        print(f"Brute-force detector: {len(_detector.rules)} windows, replayed {replayed} failed logins")
+    return _detector
+
+def get_spray_detector(cursor):
+    """Wspólny SprayDetector; przy tworzeniu wczytuje szkice z ostatniego checkpointu"""
+    global _spray_detector
+    if _spray_detector is None:
+        _spray_detector = SprayDetector()
+        _spray_detector.load(cursor)
+    return _spray_detector
+
+def reset_detector():
+    """Po rollbacku stan detektorów może zawierać wycofane zdarzenia - zbuduj go od nowa"""
+    global _detector, _spray_detector
+    _detector = None
+    _spray_detector = None
+
+def finish_detectors(cursor):
+    """Na koniec jednorazowego przebiegu: zapisz szkice, nawet przed SPRAY_CHECKPOINT_INTERVAL"""
+    if _spray_detector is not None:
+        _spray_detector.checkpoint(cursor)
+
+def insert_events(cursor, events):
+    """Wstaw paczkę zdarzeń i przepuść ją przez detektory (alerty w tej samej transakcji)"""
+    if not events:
+        return 0
+    # ATTACH brakującej partycji (nowy miesiąc, spóźnione zdarzenia) jeszcze przed transakcją paczki
+    ssh_partitions.ensure(cursor.connection, {ssh_partitions.month_of(event[0]) for event in events})
+    # Detektor przed wstawieniem - odtwarza okna tylko z zatwierdzonych już wpisów
+    detector = get_detector(cursor)
+    spray_detector = get_spray_detector(cursor)
+    inserted = db.insert_ssh_events(cursor, events)
+    detector.observe(cursor, events)
+    spray_detector.observe(cursor, events)
+    return inserted
+
+def get_dns_resolver():
+    """Wspólny DnsResolver - zapytania lecą w tle, ingest nie czeka na DNS"""
+    global _dns_resolver
+    if _dns_resolver is None:
+        _dns_resolver = DnsResolver()
+    return _dns_resolver
+
+def finish_dns(cursor):
+    """Na koniec jednorazowego przebiegu: zapisz wyniki DNS, które zdążyły przyjść"""
+    global _dns_resolver
+    if _dns_resolver is not None:
+        _dns_resolver.finish(cursor)
+        _dns_resolver = None
+
+def _sshd_event(match):
+    """(status, user, ip, port) z dopasowania SSHD_EVENT_RE"""
+    if match.group('accepted'):
+        status = 'accepted'
+    elif match.group('failed'):
+        status = 'failed'
+    else:
+        status = 'invalid'
+    return status, match.group('user'), match.group('ip'), match.group('port')
+
+def match_sshd_message(message):
+    """Dopasuj samą treść komunikatu sshd (np. MESSAGE z journald)"""
+    if SSHD_EVENT_PREFILTER not in message:
         return None
+    match = SSHD_EVENT_RE.search(message)
+    return _sshd_event(match) if match else None
 
-def parse_journalctl_log():
-    """Parsuj logi bezpośrednio z journalctl (systemd)"""
-    print("Using journalctl for log parsing...")
-    
-    conn = sqlite3.connect(Config.DB_FILE)
-    cursor = conn.cursor()
-    
-    # Pobierz ostatni timestamp z bazy
-    cursor.execute("SELECT MAX(timestamp) FROM ssh_logs")
+def match_sshd_line(line):
+    """Dopasuj linię syslog "... sshd[PID]: <komunikat>" (auth.log, system.log)"""
+    if SSHD_EVENT_PREFILTER not in line:
+        return None
+    start = line.find('sshd[')
+    if start < 0:
+        return None
+    end = line.find(']: ', start)
+    if end < 0 or not line[start + 5:end].isdigit():
+        return None
+    # Komunikat zaczyna się zaraz za "sshd[PID]: " - bez .* i backtrackingu
+    match = SSHD_EVENT_RE.match(line, end + 3)
+    return _sshd_event(match) if match else None
+
+def load_journal_cursor(cursor):
+    """Pobierz zapisany __CURSOR journald (None przy pierwszym uruchomieniu)"""
+    cursor.execute('''
+        SELECT cursor FROM log_checkpoints WHERE source = ?
+    ''', (JOURNAL_SOURCE,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def save_journal_cursor(cursor, journal_cursor):
+    """Zapisz __CURSOR ostatniego przetworzonego wpisu journald"""
+    cursor.execute('''
+        INSERT OR REPLACE INTO log_checkpoints (source, cursor, updated_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+    ''', (JOURNAL_SOURCE, journal_cursor))
+
+def _journalctl_command(cursor, follow=False):
+    """Zbuduj komendę journalctl wznawiającą od zapisanego kursora"""
+    # Tylko potrzebne pola - __CURSOR i __REALTIME_TIMESTAMP journalctl dodaje zawsze
+    cmd = ["journalctl", "-u", "sshd", "-o", "json", "--output-fields=MESSAGE", "--no-pager"]
+    if follow:
+        cmd.append("--follow")
+
+    journal_cursor = load_journal_cursor(cursor)
+    if journal_cursor:
+        cmd.extend(["--after-cursor", journal_cursor])
+        return cmd
+
+    # Brak kursora (pierwsze uruchomienie po aktualizacji) - wznów po czasie
+    cursor.execute("SELECT timestamp FROM ssh_logs_latest")
     last_ts_str = cursor.fetchone()[0]
-    
-    cmd = ["journalctl", "-u", "sshd", "-o", "json", "--no-pager"]
-    
-    # Add time filter if we have history
     if last_ts_str:
         # Add 1 second to avoid duplicates (journalctl --since is inclusive)
         try:
-            last_ts = datetime.strptime(last_ts_str, "%Y-%m-%d %H:%M:%S")
+            last_ts = datetime.strptime(last_ts_str[:19], "%Y-%m-%d %H:%M:%S")
             since_ts = last_ts + timedelta(seconds=1)
             cmd.extend(["--since", since_ts.strftime("%Y-%m-%d %H:%M:%S")])
         except Exception as e:
             print(f"Error parsing last timestamp: {e}")
-            
+    return cmd
+
+def _commit_journal_batch(conn, batch, journal_cursor):
+    """Zapisz paczkę wpisów razem z kursorem journald w jednej transakcji.
+
+    Przy błędzie wycofujemy całą paczkę i zgłaszamy go dalej - kursor
+    przesuwa się tylko razem z danymi, a detektory, które widziały już
+    wycofane zdarzenia, budujemy od nowa.
+    """
+    cursor = conn.cursor()
+    try:
+        inserted = insert_events(cursor, batch)
+        if journal_cursor:
+            save_journal_cursor(cursor, journal_cursor)
+        get_dns_resolver().apply_results(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        reset_detector()
+        raise
+    finally:
+        batch.clear()
+    return inserted
+
+def _journal_lines(stream, idle_timeout=None):
+    """Linie (bytes) z wyjścia journalctl; None, gdy przez idle_timeout s nic nie przyszło.
+
+    Czytamy surowy deskryptor (select + os.read) zamiast iteracji po pliku -
+    bufor TextIOWrapper ukrywałby przed select() linie już przeczytane.
+    """
+    fd = stream.fileno()
+    pending = b''
+    while True:
+        if idle_timeout is not None:
+            ready, _, _ = select.select([fd], [], [], idle_timeout)
+            if not ready:
+                yield None
+                continue
+        chunk = os.read(fd, 64 * 1024)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+def tail_journal(conn, follow=False, on_commit=None):
+    """Strumieniowo przetwarzaj wyjście journalctl, linia po linii.
+
+    Pamięć nie zależy od wielkości zaległości - w RAM jest tylko bieżąca
+    paczka. Kursor zapisujemy razem z każdą paczką commitów, więc po
+    przerwaniu wznawiamy dokładnie od ostatniego zapisanego wpisu.
+    W trybie follow paczkę zatwierdzamy, gdy strumień ucichnie albo co
+    JOURNAL_FOLLOW_FLUSH_INTERVAL s - fala brute-force nie robi fsync na wpis.
+    on_commit(conn) jest wołane po commicie, który dodał nowe wpisy.
+    """
+    cursor = conn.cursor()
+    cmd = _journalctl_command(cursor, follow=follow)
     print(f"Executing: {' '.join(cmd)}")
-    
+
     try:
-        # Run command
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"Error running journalctl: {result.stderr}")
-            conn.close()
-            return 0
-            
-        logs = []
-        for line in result.stdout.splitlines():
+        # stderr dziedziczony (trafia do journala usługi) - nieczytana rura zablokowałaby journalctl
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=0)
+    except Exception as e:
+        print(f"Failed to execute journalctl: {e}")
+        return 0
+
+    new_entries = 0
+    pending = 0
+    pending_since = None
+    last_cursor = None
+    batch = []
+
+    def flush():
+        nonlocal new_entries, pending, pending_since
+        inserted = _commit_journal_batch(conn, batch, last_cursor)
+        new_entries += inserted
+        pending = 0
+        pending_since = None
+        if on_commit and inserted:
+            on_commit(conn)
+
+    try:
+        idle_timeout = JOURNAL_FOLLOW_FLUSH_INTERVAL if follow else None
+        for line in _journal_lines(proc.stdout, idle_timeout):
+            if line is None:
+                # Strumień ucichł - zatwierdź to, co czeka
+                if pending:
+                    flush()
+                continue
+            if not line.strip():
+                continue
             try:
-                if not line.strip(): continue
-                logs.append(json.loads(line))
+                entry = json.loads(line)
             except json.JSONDecodeError:
                 continue
-                
+
+            last_cursor = entry.get('__CURSOR', last_cursor)
+            pending += 1
+            if pending_since is None:
+                pending_since = time.monotonic()
+
+            message = entry.get('MESSAGE', '')
+            if isinstance(message, list):
+                # journald oddaje niepoprawne UTF-8 jako tablicę bajtów
+                message = bytes(message).decode('utf-8', errors='replace')
+
+            event = match_sshd_message(message)
+            if event:
+                final_status, username, ip, port = event
+
+                # Journalctl timestamp is in microseconds (integer string)
+                # e.g. "1641493908873105"
+                ts_us = int(entry.get('__REALTIME_TIMESTAMP', 0))
+                timestamp = datetime.fromtimestamp(ts_us / 1_000_000)
+
+                # DNS z cache; brakujące nazwy uzupełni resolver w tle
+                dns_name = get_dns_resolver().lookup(cursor, ip)
+
+                batch.append((timestamp, username, ip, dns_name, port, final_status, message))
+
+            if (pending >= JOURNAL_COMMIT_EVERY or len(batch) >= Config.DB_BATCH_SIZE
+                    or (follow and time.monotonic() - pending_since >= JOURNAL_FOLLOW_FLUSH_INTERVAL)):
+                flush()
+
+        if pending:
+            flush()
+    finally:
+        if proc.poll() is None:
+            proc.terminate()
+        proc.wait()
+        proc.stdout.close()
+
+    if proc.returncode not in (0, -15):
+        print(f"Error running journalctl: exit code {proc.returncode}")
+
+    return new_entries
+
+def parse_journalctl_log():
+    """Parsuj logi bezpośrednio z journalctl (systemd)"""
+    print("Using journalctl for log parsing...")
+
+    conn = db.connect(writer=True)
+    try:
+        new_entries = tail_journal(conn)
+        finish_dns(conn.cursor())
+        finish_detectors(conn.cursor())
+        conn.commit()
     except Exception as e:
-        print(f"Failed to execute journalctl: {e}")
-        conn.close()
-        return 0
+        # Niezatwierdzona paczka i jej kursor przepadają razem - następny przebieg ją powtórzy
+        print(f"Error reading journalctl: {e}")
+        conn.rollback()
+        new_entries = 0
+    conn.close()
+
+    print(f"Parsed {new_entries} new SSH log entries from journalctl")
+    return new_entries
+
+def _line_hash(raw_line):
+    """Hash linii logu (do wykrywania podmiany/obcięcia pliku)"""
+    return hashlib.sha1(raw_line).hexdigest()
 
-    # Patterns for MESSAGE content only (no timestamp/host prefix)
-    patterns = {
-        'accepted_password': re.compile(
-            r'Accepted password for (\w+) from ([\da-fA-F:.%]+) port (\d+)'
-        ),
-        'accepted_publickey': re.compile(
-            r'Accepted publickey for (\w+) from ([\da-fA-F:.%]+) port (\d+)'
-        ),
-        'failed': re.compile(
-            r'Failed password for (?:invalid user )?(\w+) from ([\da-fA-F:.%]+) port (\d+)'
-        ),
-        'invalid': re.compile(
-            r'Invalid user (\w+) from ([\da-fA-F:.%]+) port (\d+)'
-        )
-    }
+def load_checkpoint(cursor, source):
+    """Pobierz zapisany checkpoint (inode, offset, hash ostatniej linii)"""
+    cursor.execute('''
+        SELECT inode, offset, line_hash FROM log_checkpoints WHERE source = ?
+    ''', (source,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {'inode': row[0], 'offset': row[1], 'line_hash': row[2]}
+
+def save_checkpoint(cursor, source, inode, offset, line_hash):
+    """Zapisz checkpoint - w tej samej transakcji co nowe wpisy"""
+    cursor.execute('''
+        INSERT OR REPLACE INTO log_checkpoints (source, inode, offset, line_hash, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ''', (source, inode, offset, line_hash))
+
+def _checkpoint_matches(path, checkpoint):
+    """Sprawdź czy linia kończąca się na offsecie checkpointu ma zapisany hash"""
+    offset = checkpoint['offset']
+    if offset == 0:
+        return True
+    if not checkpoint['line_hash']:
+        return False
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < offset:
+                return False
+            start = max(0, offset - CHECKPOINT_LOOKBACK_BYTES)
+            f.seek(start)
+            chunk = f.read(offset - start)
+    except OSError:
+        return False
+    if not chunk.endswith(b'\n'):
+        return False
+    last_line = chunk[:-1].rsplit(b'\n', 1)[-1] + b'\n'
+    return _line_hash(last_line) == checkpoint['line_hash']
+
+def _plan_auth_log_segments(path, checkpoint):
+    """Ustal które pliki i od jakiego offsetu trzeba doczytać.
+
+    Zwraca listę (ścieżka, offset, inode). Po rotacji najpierw dokańczamy
+    ogon auth.log.1 (jeśli to wciąż nasz plik), potem nowy auth.log od zera.
+    """
+    inode = os.stat(path).st_ino
+
+    if checkpoint is None:
+        return [(path, 0, inode)]
+
+    if checkpoint['inode'] == inode:
+        if _checkpoint_matches(path, checkpoint):
+            return [(path, checkpoint['offset'], inode)]
+        print(f"{path} was truncated or replaced, re-reading from start")
+        return [(path, 0, inode)]
+
+    segments = []
+    rotated = f"{path}.1"
+    try:
+        rotated_inode = os.stat(rotated).st_ino
+    except OSError:
+        rotated_inode = None
+
+    if rotated_inode == checkpoint['inode'] and _checkpoint_matches(rotated, checkpoint):
+        print(f"{path} was rotated, finishing {rotated} from offset {checkpoint['offset']}")
+        segments.append((rotated, checkpoint['offset'], rotated_inode))
+    else:
+        print(f"{path} was rotated and the previous file is gone, starting fresh")
+
+    segments.append((path, 0, inode))
+    return segments
+
+def _read_complete_lines(path, offset):
+    """Generator (linia, offset za linią) - tylko pełne linie zakończone \\n"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for raw_line in f:
+            if not raw_line.endswith(b'\n'):
+                # Linia jeszcze dopisywana - wrócimy do niej następnym razem
+                break
+            offset += len(raw_line)
+            yield raw_line, offset
+
+def tail_auth_log(conn):
+    """Doczytaj auth.log od ostatniego checkpointu, zwraca liczbę nowych wpisów.
+
+    Pełne paczki (Config.DB_BATCH_SIZE) są commitowane razem z checkpointem,
+    więc duża zaległość nie trzyma jednej wielkiej transakcji. Ostatnia
+    paczka pliku jest commitowana z jego checkpointem, zanim zaczniemy
+    następny plik (kolejna paczka zaczyna się poza transakcją - ATTACH partycji).
+    """
+    cursor = conn.cursor()
+    source = Config.AUTH_LOG
+    checkpoint = load_checkpoint(cursor, source)
+
+    # Bez checkpointu (pierwsze uruchomienie) deduplikujemy po timestampie
+    last_ts = None
+    if checkpoint is None:
+        cursor.execute("SELECT timestamp FROM ssh_logs_latest")
+        res = cursor.fetchone()
+        last_ts = res[0] if res else None
 
     new_entries = 0
-    dns_cache = {}
-    
-    for entry in logs:
-        message = entry.get('MESSAGE', '')
-        # Journalctl timestamp is in microseconds (integer string)
-        # e.g. "1641493908873105"
-        ts_us = int(entry.get('__REALTIME_TIMESTAMP', 0))
-        timestamp = datetime.fromtimestamp(ts_us / 1_000_000)
-        
-        for status_key, pattern in patterns.items():
-            match = pattern.search(message)
-            if match:
-                username = match.group(1)
-                ip = match.group(2)
-                port = match.group(3)
-                
-                # Determine status
-                final_status = 'accepted' if 'accepted' in status_key else status_key
-                
-                # Resolve DNS
-                if ip not in dns_cache:
-                    dns_cache[ip] = resolve_ip_dns(ip)
-                dns_name = dns_cache[ip]
-                
+    batch = []
+
+    for path, offset, inode in _plan_auth_log_segments(source, checkpoint):
+        end_offset = offset
+        last_line = None
+
+        for last_line, end_offset in _read_complete_lines(path, offset):
+            # Tani filtr na bajtach - dekodujemy tylko potencjalne trafienia
+            if b' port ' not in last_line:
+                continue
+            line = last_line.decode('utf-8', errors='replace')
+
+            event = match_sshd_line(line)
+            if event:
+                final_status, username, ip, port = event
+
+                # Parse ISO timestamp (tylko do sekund)
+                # Format: 2026-01-06T18:31:48.873105+01:00
                 try:
-                    cursor.execute('''
-                        INSERT INTO ssh_logs (timestamp, username, ip_address, dns_name, port, status, message)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (timestamp, username, ip, dns_name, port, final_status, message))
-                    
-                    new_entries += 1
-                except sqlite3.Error as e:
-                    print(f"DB Error: {e}")
-                
-                break # Matched one pattern, move to next log
-    
-    conn.commit()
-    conn.close()
-    
-    print(f"Parsed {new_entries} new SSH log entries from journalctl")
+                    timestamp = datetime.strptime(line[:19], "%Y-%m-%dT%H:%M:%S")
+                except ValueError as e:
+                    print(f"Error parsing line: {e}")
+                    print(f"Line: {line.strip()}")
+                    continue
+
+                # Skip if already in DB
+                if last_ts and timestamp.strftime("%Y-%m-%d %H:%M:%S") <= last_ts:
+                    continue
+
+                # DNS z cache; brakujące nazwy uzupełni resolver w tle
+                dns_name = get_dns_resolver().lookup(cursor, ip)
+
+                batch.append((timestamp, username, ip, dns_name, port, final_status, line.strip()))
+
+                if len(batch) >= Config.DB_BATCH_SIZE:
+                    # Paczka i checkpoint za jej ostatnią linią w jednej transakcji
+                    new_entries += insert_events(cursor, batch)
+                    save_checkpoint(cursor, source, inode, end_offset, _line_hash(last_line))
+                    get_dns_resolver().apply_results(cursor)
+                    conn.commit()
+                    batch = []
+
+        new_entries += insert_events(cursor, batch)
+        batch = []
+
+        # Hash liczymy tylko dla ostatniej linii, a nie dla każdej
+        if last_line is not None:
+            line_hash = _line_hash(last_line)
+        else:
+            line_hash = checkpoint['line_hash'] if checkpoint and offset else None
+
+        # Checkpoint wskazuje zawsze na ostatni przetworzony plik
+        save_checkpoint(cursor, source, inode, end_offset, line_hash)
+        conn.commit()
+
+    get_dns_resolver().apply_results(cursor)
     return new_entries
 
 def parse_ssh_log():
     """Parsuj auth.log LUB journalctl i wyciągnij SSH logowania"""
-    
+
     # Fallback to journalctl if file not found
     if not Path(Config.AUTH_LOG).exists():
         print(f"Log file not found: {Config.AUTH_LOG}. Switching to journalctl.")
         return parse_journalctl_log()
-    
-    conn = sqlite3.connect(Config.DB_FILE)
-    cursor = conn.cursor()
-    
-    # Pobierz ostatni timestamp z bazy
-    cursor.execute("SELECT MAX(timestamp) FROM ssh_logs")
-    res = cursor.fetchone()
-    last_ts = res[0] if res else None
-    
-    # Patterns dla ISO 8601 format: 2026-01-06T18:31:48.873105+01:00
-    patterns = {
-        'accepted_password': re.compile(
-            r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}).*sshd\[\d+\]: Accepted password for (\w+) from ([\da-fA-F:.%]+) port (\d+)'
-        ),
-        'accepted_publickey': re.compile(
-            r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}).*sshd\[\d+\]: Accepted publickey for (\w+) from ([\da-fA-F:.%]+) port (\d+)'
-        ),
-        'failed': re.compile(
-            r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}).*sshd\[\d+\]: Failed password for (?:invalid user )?(\w+) from ([\da-fA-F:.%]+) port (\d+)'
-        ),
-        'invalid': re.compile(
-            r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}).*sshd\[\d+\]: Invalid user (\w+) from ([\da-fA-F:.%]+) port (\d+)'
-        )
-    }
-    
+
+    conn = db.connect(writer=True)
+
     new_entries = 0
-    dns_cache = {}
-    
     try:
-        with open(Config.AUTH_LOG, 'r') as f:
-            for line in f:
-                for status, pattern in patterns.items():
-                    match = pattern.search(line)
-                    if match:
-                        timestamp_str = match.group(1)
-                        username = match.group(2)
-                        ip = match.group(3)
-                        port = match.group(4)
-                        
-                        # Parse ISO timestamp (tylko do sekund)
-                        try:
-                            timestamp = datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%S")
-                            
-                            # Skip if already in DB
-                            if last_ts and timestamp.strftime("%Y-%m-%d %H:%M:%S") <= last_ts:
-                                continue
-                            
-                            # Determine status (accepted vs failed/invalid)
-                            final_status = 'accepted' if 'accepted' in status else status
-                            
-                            # Resolve DNS (with local cache for this run)
-                            if ip not in dns_cache:
-                                dns_cache[ip] = resolve_ip_dns(ip)
-                            dns_name = dns_cache[ip]
-                            
-                            cursor.execute('''
-                                INSERT INTO ssh_logs (timestamp, username, ip_address, dns_name, port, status, message)
-                                VALUES (?, ?, ?, ?, ?, ?, ?)
-                            ''', (timestamp, username, ip, dns_name, port, final_status, line.strip()))
-                            
-                            new_entries += 1
-                            
-                        except Exception as e:
-                            print(f"Error parsing line: {e}")
-                            print(f"Line: {line.strip()}")
-                            continue
+        new_entries = tail_auth_log(conn)
+        finish_dns(conn.cursor())
+        finish_detectors(conn.cursor())
+        conn.commit()
     except Exception as e:
+        # Wpisy i checkpoint są w jednej transakcji - nic nie zapisujemy połowicznie
         print(f"Error reading auth.log: {e}")
-    
-    conn.commit()
+        conn.rollback()
+        reset_detector()
+        new_entries = 0
+
     conn.close()
-    
+
     print(f"Parsed {new_entries} new SSH log entries from auth.log")
     return new_entries
 
@@ -273,31 +569,15 @@ def parse_macos_log():
         return 0
         
     print(f"Parsing macOS log: {log_file}")
-    conn = sqlite3.connect(Config.DB_FILE)
+    conn = db.connect(writer=True)
     cursor = conn.cursor()
     
-    cursor.execute("SELECT MAX(timestamp) FROM ssh_logs")
+    cursor.execute("SELECT timestamp FROM ssh_logs_latest")
     res = cursor.fetchone()
     last_ts = res[0] if res else None
     
-    # Regex for BSD syslog format: Jan 15 08:29:05 hostname process[pid]: message
-    # We look for 'sshd' pattern
-    patterns = {
-        'accepted_password': re.compile(
-            r'^([A-Z][a-z]{2}\s+\d+\s\d{2}:\d{2}:\d{2}).*sshd\[\d+\]: Accepted password for (\w+) from ([\da-fA-F:.%]+) port (\d+)'
-        ),
-        'accepted_publickey': re.compile(
-            r'^([A-Z][a-z]{2}\s+\d+\s\d{2}:\d{2}:\d{2}).*sshd\[\d+\]: Accepted publickey for (\w+) from ([\da-fA-F:.%]+) port (\d+)'
-        ),
-        'failed': re.compile(
-            r'^([A-Z][a-z]{2}\s+\d+\s\d{2}:\d{2}:\d{2}).*sshd\[\d+\]: Failed password for (?:invalid user )?(\w+) from ([\da-fA-F:.%]+) port (\d+)'
-        ),
-        'invalid': re.compile(
-            r'^([A-Z][a-z]{2}\s+\d+\s\d{2}:\d{2}:\d{2}).*sshd\[\d+\]: Invalid user (\w+) from ([\da-fA-F:.%]+) port (\d+)'
-        )
-    }
-    
     new_entries = 0
+    batch = []
     current_year = datetime.now().year
     
     try:
@@ -308,90 +588,168 @@ def parse_macos_log():
 
         with open(log_file, 'r') as f:
             for line in f:
-                if 'sshd' not in line: continue
+                event = match_sshd_line(line)
+                if not event:
+                    continue
+                final_status, username, ip, port = event
+
+                ts_match = SYSLOG_TS_RE.match(line)
+                if not ts_match:
+                    continue
+                ts_str = ts_match.group(0)
                 
-                for status, pattern in patterns.items():
-                    match = pattern.search(line)
-                    if match:
-                        ts_str = match.group(1)
-                        username = match.group(2)
-                        ip = match.group(3)
-                        port = match.group(4)
+                try:
+                    # Parse "Jan  1 00:01:22" -> needs year
+                    # Try to be smart about year boundary? For now assume current year.
+                    # Adjust for cases where log is Dec and now is Jan?
+                    dt = datetime.strptime(f"{current_year} {ts_str}", "%Y %b %d %H:%M:%S")
+                    
+                    # If dt is in future (e.g. log is Jan, current is Dec?), subtract year
+                    if dt > datetime.now() + timedelta(days=1):
+                        dt = dt.replace(year=current_year - 1)
                         
-                        try:
-                            # Parse "Jan  1 00:01:22" -> needs year
-                            # Try to be smart about year boundary? For now assume current year.
-                            # Adjust for cases where log is Dec and now is Jan?
-                            dt = datetime.strptime(f"{current_year} {ts_str}", "%Y %b %d %H:%M:%S")
-                            
-                            # If dt is in future (e.g. log is Jan, current is Dec?), subtract year
-                            if dt > datetime.now() + timedelta(days=1):
-                                dt = dt.replace(year=current_year - 1)
-                                
-                            if last_ts and dt.strftime("%Y-%m-%d %H:%M:%S") <= last_ts:
-                                continue
-                                
-                            final_status = 'accepted' if 'accepted' in status else status
-                            
-                            cursor.execute('''
-                                INSERT INTO ssh_logs (timestamp, username, ip_address, dns_name, port, status, message)
-                                VALUES (?, ?, ?, ?, ?, ?, ?)
-                            ''', (dt, username, ip, None, port, final_status, line.strip()))
-                            new_entries += 1
-                        except Exception as e:
-                            pass
+                    if last_ts and dt.strftime("%Y-%m-%d %H:%M:%S") <= last_ts:
+                        continue
+                    
+                    batch.append((dt, username, ip, None, port, final_status, line.strip()))
+                except Exception as e:
+                    continue
+
+                if len(batch) >= Config.DB_BATCH_SIZE:
+                    new_entries += insert_events(cursor, batch)
+                    conn.commit()
+                    batch = []
+
+        new_entries += insert_events(cursor, batch)
     except Exception as e:
         print(f"Error parsing system.log: {e}")
         
+    finish_detectors(cursor)
     conn.commit()
     conn.close()
     print(f"Parsed {new_entries} new entries from system.log")
     return new_entries
 
-def check_anomalies():
-    """Sprawdź anomalie i generuj alerty"""
-    conn = sqlite3.connect(Config.DB_FILE)
-    cursor = conn.cursor()
-    
-    # Sprawdź failed logins w ostatniej godzinie
-    cursor.execute('''
-        SELECT COUNT(*), ip_address 
-        FROM ssh_logs 
-        WHERE status IN ('failed', 'invalid') 
-        AND timestamp > datetime('now', 'localtime', '-1 hour')
-        GROUP BY ip_address
-        HAVING COUNT(*) > ?
-    ''', (Config.MAX_FAILED_LOGINS_PER_HOUR,))
-    
-    for count, ip in cursor.fetchall():
-        message = f"Suspicious activity: {count} failed login attempts from {ip} in last hour"
-        
-        # Check if alert already exists (last 1 hour)
-        cursor.execute('''
-            SELECT id FROM alerts 
-            WHERE alert_type = 'failed_login' 
-            AND details = ?
-            AND created_at > datetime('now', 'localtime', '-1 hour')
-        ''', (ip,))
-        
-        if not cursor.fetchone():
-            cursor.execute('''
-                INSERT INTO alerts (alert_type, severity, message, details)
-                VALUES (?, ?, ?, ?)
-            ''', ('failed_login', 'warning', message, ip))
-            print(f"Alert created: {message}")
-    
-    conn.commit()
-    conn.close()
+def _inotify_open(directory):
+    """Otwórz inotify na katalogu z logiem (None = brak inotify, wtedy polling)"""
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        # Katalog, nie plik - dzięki temu widzimy też rotację (nowy auth.log)
+        mask = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+def _wait_for_log_change(fd, names, timeout):
+    """Czekaj aż któryś z plików `names` się zmieni (lub minie timeout)"""
+    if fd is None:
+        time.sleep(FOLLOW_POLL_INTERVAL)
+        return True
+
+    ready, _, _ = select.select([fd], [], [], timeout)
+    if not ready:
+        return False
+    try:
+        data = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return False
+
+    # struct inotify_event: int wd; uint32 mask, cookie, len; char name[len]
+    changed = False
+    pos = 0
+    while pos + INOTIFY_EVENT_SIZE <= len(data):
+        _, _, _, length = struct.unpack_from('iIII', data, pos)
+        name = data[pos + INOTIFY_EVENT_SIZE:pos + INOTIFY_EVENT_SIZE + length].rstrip(b'\0')
+        pos += INOTIFY_EVENT_SIZE + length
+        if name in names:
+            changed = True
+    return changed
+
+def follow_auth_log(conn):
+    """Śledź auth.log w pętli - doczytuj od checkpointu przy każdej zmianie"""
+    log_path = Path(Config.AUTH_LOG)
+    names = {os.fsencode(log_path.name), os.fsencode(f"{log_path.name}.1")}
+    fd = _inotify_open(str(log_path.parent))
+    if fd is None:
+        print(f"inotify unavailable, polling {log_path} every {FOLLOW_POLL_INTERVAL}s")
+    else:
+        print(f"Following {log_path} (inotify)")
+
+    while True:
+        try:
+            new_entries = tail_auth_log(conn)
+            conn.commit()
+            if new_entries:
+                print(f"Parsed {new_entries} new SSH log entries from auth.log")
+            maintain_partitions(conn)
+        except FileNotFoundError:
+            # Okno między przeniesieniem auth.log a utworzeniem nowego pliku
+            conn.rollback()
+            reset_detector()
+        except Exception as e:
+            print(f"Error following auth.log: {e}")
+            conn.rollback()
+            reset_detector()
+            time.sleep(FOLLOW_POLL_INTERVAL)
+
+        # Timeout i tak wymusza sprawdzenie, gdyby jakieś zdarzenie umknęło;
+        # krótszy, gdy czekamy na odpowiedzi DNS do zapisania
+        timeout = FOLLOW_POLL_INTERVAL if get_dns_resolver().pending_count() else FOLLOW_IDLE_TIMEOUT
+        _wait_for_log_change(fd, names, timeout)
+
+def _after_journal_commit(conn):
+    maintain_partitions(conn)
+
+def follow_journal(conn):
+    """Śledź journalctl --follow; restartuj gdy journalctl się zakończy"""
+    while True:
+        maintain_partitions(conn)
+        try:
+            tail_journal(conn, follow=True, on_commit=_after_journal_commit)
+            print(f"journalctl exited, restarting in {FOLLOW_RESTART_DELAY}s")
+        except Exception as e:
+            # Wznowienie od ostatniego zatwierdzonego kursora
+            print(f"Error following journalctl: {e}, restarting in {FOLLOW_RESTART_DELAY}s")
+        time.sleep(FOLLOW_RESTART_DELAY)
+
+def follow():
+    """Tryb demona: trzyma wzorce, cache DNS i połączenie z bazą w pamięci"""
+    init_db()
+    conn = db.connect(writer=True)
+    try:
+        if Path(Config.AUTH_LOG).exists():
+            follow_auth_log(conn)
+        else:
+            print(f"Log file not found: {Config.AUTH_LOG}. Following journalctl.")
+            follow_journal(conn)
+    except KeyboardInterrupt:
+        print("Stopping log follower")
+    finally:
+        conn.close()
 
 def main():
+    if '--follow' in sys.argv[1:]:
+        follow()
+        return
+
     init_db()
     import platform
     if platform.system() == 'Darwin':
         parse_macos_log()
     else:
         parse_ssh_log()
-    check_anomalies()
+    
+    conn = db.connect(writer=True)
+    maintain_partitions(conn)
+    conn.close()
 
 if __name__ == "__main__":
     main()
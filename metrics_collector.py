@@ -1,34 +1,95 @@
 #!/usr/bin/env python3
 """
 System Metrics Collector - zapisuje metryki co 5 minut
+Usage: python3 metrics_collector.py [--daemon]
+
+--daemon: próbka co METRICS_RING_INTERVAL s do pierścienia mmap (metrics_ring.py),
+wiersz w system_metrics co METRICS_DB_INTERVAL s (CPU uśrednione z próbek)
+
+Po każdym zapisie: przyrostowe kompaktowanie warstw 1m/1h i retencja (metrics_tiers.py)
+oraz prędkości sieci per interfejs od poprzedniego zapisu (net_rates.py)
 """
 
-import sqlite3
+import sys
+import time
 import psutil
 from config import Config
+import db
+import metrics_tiers
+import net_rates
+from metrics_ring import RingWriter
 
-def collect_metrics():
-    conn = sqlite3.connect(Config.DB_FILE)
+def save_metrics(cpu, memory, disk, net_sent, net_recv):
+    conn = db.connect()
     cursor = conn.cursor()
     
-    # Pobierz metryki
-    cpu = psutil.cpu_percent(interval=1)
-    memory = psutil.virtual_memory().percent
-    disk = psutil.disk_usage('/').percent
-    
-    net = psutil.net_io_counters()
-    net_sent = net.bytes_sent
-    net_recv = net.bytes_recv
-    
     cursor.execute('''
         INSERT INTO system_metrics (cpu_percent, memory_percent, disk_percent, net_sent_bytes, net_recv_bytes)
         VALUES (?, ?, ?, ?, ?)
     ''', (cpu, memory, disk, net_sent, net_recv))
     
     conn.commit()
-    conn.close()
     
     print(f"Metrics: CPU={cpu}%, MEM={memory}%, DISK={disk}%, NET_TX={net_sent}, NET_RX={net_recv}")
+    
+    try:
+        for nic, rates in net_rates.record(conn).items():
+            print(f"Network {nic}: TX={rates['bytes_sent_rate']} B/s, RX={rates['bytes_recv_rate']} B/s")
+    except Exception as e:
+        print(f"Error recording network rates: {e}")
+    
+    try:
+        steps, deleted = metrics_tiers.compact(conn)
+        if steps or deleted:
+            print(f"Compaction: {steps} batches, retention removed {deleted} rows")
+    except Exception as e:
+        print(f"Error compacting metrics: {e}")
+    conn.close()
+
+def collect_metrics():
+    # Pobierz metryki
+    cpu = psutil.cpu_percent(interval=1)
+    memory = psutil.virtual_memory().percent
+    disk = psutil.disk_usage('/').percent
+    
+    net = psutil.net_io_counters()
+    save_metrics(cpu, memory, disk, net.bytes_sent, net.bytes_recv)
+
+def run_daemon():
+    """Próbki wysokiej rozdzielczości do pierścienia + okresowy zapis do bazy"""
+    ring = RingWriter()
+    print(f"Writing {Config.METRICS_RING_SLOTS} x {Config.METRICS_RING_INTERVAL}s samples to {ring.path}")
+    
+    psutil.cpu_percent(interval=None)
+    cpu_samples = []
+    next_tick = time.monotonic()
+    next_db_write = next_tick + Config.METRICS_DB_INTERVAL
+    while True:
+        next_tick += Config.METRICS_RING_INTERVAL
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            # Opóźnienie (np. wstrzymany proces) - nie nadrabiamy zaległych próbek
+            next_tick = time.monotonic()
+        
+        cpu = psutil.cpu_percent(interval=None)
+        memory = psutil.virtual_memory().percent
+        net = psutil.net_io_counters()
+        ring.write(time.time(), cpu, memory, net.bytes_sent, net.bytes_recv)
+        cpu_samples.append(cpu)
+        
+        if time.monotonic() >= next_db_write:
+            next_db_write += Config.METRICS_DB_INTERVAL
+            try:
+                save_metrics(round(sum(cpu_samples) / len(cpu_samples), 1), memory,
+                             psutil.disk_usage('/').percent, net.bytes_sent, net.bytes_recv)
+            except Exception as e:
+                print(f"Error saving metrics: {e}")
+            cpu_samples = []
 
 if __name__ == "__main__":
-    collect_metrics()
+    if '--daemon' in sys.argv[1:]:
+        run_daemon()
+    else:
+        collect_metrics()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Pierścień próbek metryk w pliku mapowanym do pamięci (mmap)
+- stały rozmiar: nagłówek + Config.METRICS_RING_SLOTS slotów po SLOT_SIZE bajtów
+- jeden pisarz (metrics_collector.py --daemon), dowolnie wielu czytelników (app.py)
+- bez blokad: każdy slot ma licznik sekwencji (seqlock) - nieparzysty w trakcie
+  zapisu; czytelnik ponawia odczyt, gdy licznik się zmienił albo jest nieparzysty
+"""
+import mmap
+import os
+import struct
+import threading
+from config import Config
+
+MAGIC = b'HMR1'
+# magic, slot_count, slot_size, reserved, write_count (ile próbek zapisano od początku)
+HEADER = struct.Struct('<4sIIIQ')
+HEADER_SIZE = 32
+# Slot: seq, potem dane: timestamp (epoch), cpu %, memory %, net sent bytes, net recv bytes
+SEQ = struct.Struct('<Q')
+DATA = struct.Struct('<dffQQ')
+SLOT_SIZE = SEQ.size + DATA.size
+FIELDS = ('timestamp', 'cpu_percent', 'memory_percent', 'net_sent_bytes', 'net_recv_bytes')
+WRITE_COUNT_OFFSET = 16
+READ_RETRIES = 3
+
+def _file_size(slots):
+    return HEADER_SIZE + slots * SLOT_SIZE
+
+class RingWriter:
+    """Zapis próbek do pierścienia; tworzy (albo odtwarza) plik o właściwym rozmiarze"""
+
+    def __init__(self, path=None, slots=None):
+        self.path = path or Config.METRICS_RING_FILE
+        self.slots = slots or Config.METRICS_RING_SLOTS
+        size = _file_size(self.slots)
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            existing = os.fstat(fd).st_size
+            header = os.pread(fd, HEADER.size, 0) if existing >= HEADER_SIZE else b''
+            valid = (existing == size and len(header) == HEADER.size
+                     and HEADER.unpack(header)[:3] == (MAGIC, self.slots, SLOT_SIZE))
+            if not valid:
+                # Inny układ/rozmiar - zaczynamy pusty pierścień
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+                os.pwrite(fd, HEADER.pack(MAGIC, self.slots, SLOT_SIZE, 0, 0), 0)
+            self._map = mmap.mmap(fd, size, access=mmap.ACCESS_WRITE)
+        finally:
+            os.close(fd)
+        self.write_count = HEADER.unpack_from(self._map, 0)[4]
+
+    def write(self, timestamp, cpu_percent, memory_percent, net_sent_bytes, net_recv_bytes):
+        offset = HEADER_SIZE + (self.write_count % self.slots) * SLOT_SIZE
+        seq = SEQ.unpack_from(self._map, offset)[0]
+        # Nieparzysty seq = zapis w toku; czytelnik ten slot pominie albo ponowi
+        SEQ.pack_into(self._map, offset, seq + 1)
+        DATA.pack_into(self._map, offset + SEQ.size, timestamp, cpu_percent, memory_percent,
+                       net_sent_bytes, net_recv_bytes)
+        SEQ.pack_into(self._map, offset, seq + 2)
+        self.write_count += 1
+        SEQ.pack_into(self._map, WRITE_COUNT_OFFSET, self.write_count)
+
+    def close(self):
+        self._map.close()
+
+class RingReader:
+    """Odczyt pierścienia bez kopiowania pliku - unpack_from prosto z mmap"""
+
+    def __init__(self, path=None):
+        self.path = path or Config.METRICS_RING_FILE
+        self._map = None
+        self._inode = None
+        # Wątki Flaska współdzielą jedno mapowanie - nie wolno go zamknąć w trakcie odczytu
+        self._lock = threading.Lock()
+
+    def _open(self):
+        """(Re)mapuj plik, gdy go jeszcze nie ma w pamięci albo kolektor go odtworzył"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self.close()
+            return False
+        if self._map is not None and st.st_ino == self._inode and st.st_size == len(self._map):
+            return True
+        self.close()
+        if st.st_size < HEADER_SIZE:
+            return False
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._inode = st.st_ino
+        magic, slots, slot_size, _, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or slot_size != SLOT_SIZE or len(self._map) != _file_size(slots):
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._map = None
+        self._inode = None
+
+    def _read_slot(self, view, offset):
+        for _ in range(READ_RETRIES):
+            seq_before = SEQ.unpack_from(view, offset)[0]
+            if seq_before & 1:
+                continue
+            values = DATA.unpack_from(view, offset + SEQ.size)
+            if SEQ.unpack_from(view, offset)[0] == seq_before:
+                return values
+        return None
+
+    def read(self, since=None):
+        """Próbki od najstarszej do najnowszej jako słowniki; since = epoch (opcjonalnie)"""
+        with self._lock:
+            if not self._open():
+                return []
+            return self._read_samples(since)
+
+    def _read_samples(self, since):
+        view = memoryview(self._map)
+        try:
+            _, slots, _, _, write_count = HEADER.unpack_from(view, 0)
+            samples = []
+            for n in range(max(0, write_count - slots), write_count):
+                values = self._read_slot(view, HEADER_SIZE + (n % slots) * SLOT_SIZE)
+                # None = slot nadpisywany właśnie teraz (pisarz nas dogonił)
+                if values is None or (since is not None and values[0] < since):
+                    continue
+                samples.append(dict(zip(FIELDS, values)))
+            return samples
+        finally:
+            view.release()
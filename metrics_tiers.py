@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Warstwy system_metrics: surowe próbki -> agregaty 1 min -> agregaty 1 h
+- kompaktowanie przyrostowe od znacznika (metrics_compaction), paczkami
+- retencja per warstwa; surowe/1m kasowane dopiero po skompaktowaniu
+- zwolnione strony oddaje PRAGMA incremental_vacuum (auto_vacuum=INCREMENTAL)
+- historia z najdrobniejszej warstwy, która mieści się w budżecie punktów
+Usage: python3 metrics_tiers.py  (kompaktowanie całej zaległości + retencja)
+"""
+from datetime import datetime, timedelta
+from config import Config
+import db
+
+TS_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Wspólny kształt wierszy źródła kompaktowania:
+# (ts, samples, cpu_min, cpu_avg, cpu_max, mem_min, mem_avg, mem_max, disk, sent, recv)
+SOURCE_SQL = {
+    'raw': '''
+        SELECT timestamp, 1, cpu_percent, cpu_percent, cpu_percent,
+               memory_percent, memory_percent, memory_percent,
+               disk_percent, net_sent_bytes, net_recv_bytes
+        FROM system_metrics
+        WHERE timestamp >= ? AND timestamp < ?
+        ORDER BY timestamp
+    ''',
+    '1m': '''
+        SELECT bucket, samples, cpu_min, cpu_avg, cpu_max,
+               memory_min, memory_avg, memory_max,
+               disk_percent, net_sent_bytes, net_recv_bytes
+        FROM system_metrics_1m
+        WHERE bucket >= ? AND bucket < ?
+        ORDER BY bucket
+    ''',
+}
+
+# Zapytania historii - sprawdzane też przez migrate_db.py --check
+QUERIES = {
+    'metrics_raw': '''
+        SELECT timestamp, cpu_percent, memory_percent, disk_percent, net_sent_bytes, net_recv_bytes
+        FROM system_metrics
+        WHERE timestamp >= ? AND timestamp <= ?
+        ORDER BY timestamp
+    ''',
+    'metrics_1m': '''
+        SELECT bucket as timestamp, cpu_avg as cpu_percent, cpu_min, cpu_max,
+               memory_avg as memory_percent, memory_min, memory_max,
+               disk_percent, net_sent_bytes, net_recv_bytes
+        FROM system_metrics_1m
+        WHERE bucket >= ? AND bucket < ?
+        ORDER BY bucket
+    ''',
+    'metrics_1h': '''
+        SELECT bucket as timestamp, cpu_avg as cpu_percent, cpu_min, cpu_max,
+               memory_avg as memory_percent, memory_min, memory_max,
+               disk_percent, net_sent_bytes, net_recv_bytes
+        FROM system_metrics_1h
+        WHERE bucket >= ? AND bucket < ?
+        ORDER BY bucket
+    ''',
+    'metrics_raw_count': '''
+        SELECT COUNT(*) FROM system_metrics WHERE timestamp >= ? AND timestamp <= ?
+    ''',
+    'metrics_1m_count': '''
+        SELECT COUNT(*) FROM system_metrics_1m WHERE bucket >= ? AND bucket < ?
+    ''',
+    'metrics_1h_count': '''
+        SELECT COUNT(*) FROM system_metrics_1h WHERE bucket >= ? AND bucket < ?
+    ''',
+}
+
+# warstwa -> (tabela, kolumna czasu)
+TABLES = {
+    'raw': ('system_metrics', 'timestamp'),
+    '1m': ('system_metrics_1m', 'bucket'),
+    '1h': ('system_metrics_1h', 'bucket'),
+}
+
+# (docelowa warstwa, źródło, długość kubełka)
+COMPACTIONS = [
+    ('1m', 'raw', timedelta(minutes=1)),
+    ('1h', '1m', timedelta(hours=1)),
+]
+
+def _parse(ts):
+    return datetime.fromisoformat(ts[:19])
+
+def _format(dt):
+    return dt.strftime(TS_FORMAT)
+
+def _floor(dt, delta):
+    if delta >= timedelta(hours=1):
+        return dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(second=0, microsecond=0)
+
+def _scalar(cursor, sql, params=()):
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def get_watermark(cursor, tier):
+    """Koniec ostatniego skompaktowanego kubełka warstwy (None = jeszcze nic)"""
+    return _scalar(cursor, "SELECT watermark FROM metrics_compaction WHERE tier = ?", (tier,))
+
+def _aggregate(rows, delta):
+    """Agregaty min/avg/max per kubełek; liczniki sieci z ostatniej próbki kubełka"""
+    buckets = {}
+    for ts, samples, cpu_min, cpu_avg, cpu_max, mem_min, mem_avg, mem_max, disk, sent, recv in rows:
+        if cpu_avg is None:
+            continue
+        key = _format(_floor(_parse(ts), delta))
+        b = buckets.get(key)
+        if b is None:
+            b = buckets[key] = {'samples': 0, 'cpu_min': cpu_min, 'cpu_sum': 0.0, 'cpu_max': cpu_max,
+                                'mem_min': mem_min, 'mem_sum': 0.0, 'mem_max': mem_max,
+                                'disk_sum': 0.0, 'disk_samples': 0, 'sent': sent, 'recv': recv}
+        b['samples'] += samples
+        b['cpu_min'] = min(b['cpu_min'], cpu_min)
+        b['cpu_max'] = max(b['cpu_max'], cpu_max)
+        b['cpu_sum'] += cpu_avg * samples
+        if mem_avg is not None:
+            b['mem_min'] = mem_min if b['mem_min'] is None else min(b['mem_min'], mem_min)
+            b['mem_max'] = mem_max if b['mem_max'] is None else max(b['mem_max'], mem_max)
+            b['mem_sum'] += mem_avg * samples
+        if disk is not None:
+            b['disk_sum'] += disk * samples
+            b['disk_samples'] += samples
+        # Wiersze są posortowane po czasie - ostatnia wartość licznika wygrywa
+        if sent is not None:
+            b['sent'], b['recv'] = sent, recv
+
+    return [
+        (key, b['samples'], b['cpu_min'], round(b['cpu_sum'] / b['samples'], 2), b['cpu_max'],
+         b['mem_min'], round(b['mem_sum'] / b['samples'], 2), b['mem_max'],
+         round(b['disk_sum'] / b['disk_samples'], 2) if b['disk_samples'] else None,
+         b['sent'], b['recv'])
+        for key, b in buckets.items()
+    ]
+
+def compact_step(conn, tier, source, delta):
+    """Skompaktuj jedną paczkę kubełków; zwraca liczbę zapisanych kubełków albo None gdy nic do zrobienia"""
+    cursor = conn.cursor()
+    table, column = TABLES[source]
+    watermark = get_watermark(cursor, tier)
+
+    # Górna granica: kubełki przed kubełkiem najnowszego wiersza źródła są już kompletne
+    # (niezależne od zegara - znaczniki czasu w bazie są w UTC, a nie lokalnie)
+    if source == 'raw':
+        newest = _scalar(cursor, f"SELECT MAX({column}) FROM {table}")
+        if newest is None:
+            return None
+        upper = _floor(_parse(newest), delta)
+    else:
+        source_watermark = get_watermark(cursor, source)
+        if source_watermark is None:
+            return None
+        upper = _floor(_parse(source_watermark), delta)
+
+    first = _scalar(cursor, f"SELECT MIN({column}) FROM {table} WHERE {column} >= ?", (watermark or '',))
+    if first is None:
+        return None
+    start = _floor(_parse(first), delta)
+    if start >= upper:
+        return None
+    end = min(upper, start + delta * Config.METRICS_COMPACT_BATCH)
+
+    cursor.execute(SOURCE_SQL[source], (_format(start), _format(end)))
+    buckets = _aggregate(cursor.fetchall(), delta)
+
+    cursor.executemany(f'''
+        INSERT OR REPLACE INTO system_metrics_{tier}
+            (bucket, samples, cpu_min, cpu_avg, cpu_max, memory_min, memory_avg, memory_max,
+             disk_percent, net_sent_bytes, net_recv_bytes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', buckets)
+    cursor.execute('''
+        INSERT OR REPLACE INTO metrics_compaction (tier, watermark) VALUES (?, ?)
+    ''', (tier, _format(end)))
+    conn.commit()
+    return len(buckets)
+
+def _delete_before(conn, tier, cutoff):
+    """Usuń wiersze warstwy starsze niż cutoff, paczkami; zwraca liczbę usuniętych"""
+    table, column = TABLES[tier]
+    key = 'id' if tier == 'raw' else 'bucket'
+    cursor = conn.cursor()
+    deleted = 0
+    while True:
+        cursor.execute(f'''
+            DELETE FROM {table} WHERE {key} IN (
+                SELECT {key} FROM {table} WHERE {column} < ? ORDER BY {column} LIMIT ?
+            )
+        ''', (_format(cutoff), Config.METRICS_DELETE_BATCH))
+        conn.commit()
+        deleted += cursor.rowcount
+        if cursor.rowcount < Config.METRICS_DELETE_BATCH:
+            return deleted
+
+def apply_retention(conn):
+    """Retencja warstw; niczego nie kasujemy przed skompaktowaniem do wyższej warstwy"""
+    cursor = conn.cursor()
+    retention = {
+        'raw': (timedelta(days=Config.METRICS_RAW_RETENTION_DAYS), '1m'),
+        '1m': (timedelta(days=Config.METRICS_1M_RETENTION_DAYS), '1h'),
+        '1h': (timedelta(days=Config.METRICS_1H_RETENTION_DAYS), None),
+    }
+    deleted = 0
+    for tier, (keep, compacted_into) in retention.items():
+        table, column = TABLES[tier]
+        newest = _scalar(cursor, f"SELECT MAX({column}) FROM {table}")
+        if newest is None:
+            continue
+        cutoff = _parse(newest) - keep
+        if compacted_into:
+            watermark = get_watermark(cursor, compacted_into)
+            if watermark is None:
+                continue
+            cutoff = min(cutoff, _parse(watermark))
+        deleted += _delete_before(conn, tier, cutoff)
+
+    if deleted and _scalar(cursor, "PRAGMA auto_vacuum") == 2:
+        cursor.execute(f"PRAGMA incremental_vacuum({int(Config.METRICS_VACUUM_PAGES)})")
+        cursor.fetchall()
+    return deleted
+
+def compact(conn, max_steps=None):
+    """Kompaktowanie (ograniczona liczba paczek na wywołanie) + retencja"""
+    max_steps = max_steps or Config.METRICS_COMPACT_MAX_STEPS
+    steps = 0
+    for tier, source, delta in COMPACTIONS:
+        while steps < max_steps and compact_step(conn, tier, source, delta) is not None:
+            steps += 1
+    return steps, apply_retention(conn)
+
+# Od najgrubszej: warstwa sięga swojego znacznika, dalej kolejna drobniejsza
+CHAINS = {
+    'raw': ['raw'],
+    '1m': ['1m', 'raw'],
+    '1h': ['1h', '1m', 'raw'],
+}
+
+def _segments(cursor, tier, start, end):
+    """[(warstwa, (od, do))] - agregaty do znacznika, świeższe punkty z drobniejszych warstw"""
+    segments = []
+    segment_start = start
+    for part in CHAINS[tier]:
+        if part == 'raw':
+            segments.append((part, (_format(segment_start), _format(end))))
+            break
+        watermark = get_watermark(cursor, part)
+        segment_end = min(end, _parse(watermark)) if watermark else segment_start
+        if segment_end > segment_start:
+            segments.append((part, (_format(segment_start), _format(segment_end))))
+            segment_start = segment_end
+    return segments
+
+def history(conn, start, end=None, max_points=None):
+    """Historia metryk z najdrobniejszej warstwy mieszczącej się w max_points.
+
+    Warstwa musi sięgać początku zakresu (retencja). Agregaty kończą się na
+    znaczniku kompaktowania, świeższe punkty dopełniamy drobniejszą warstwą.
+    Zwraca (warstwa, wiersze).
+    """
+    end = end or datetime.now()
+    max_points = max_points or Config.HISTORY_SCAN_ROWS
+    cursor = conn.cursor()
+
+    oldest = {tier: _scalar(cursor, f"SELECT MIN({column}) FROM {table}")
+              for tier, (table, column) in TABLES.items()}
+    known = [_parse(ts) for ts in oldest.values() if ts]
+    data_start = max(start, min(known)) if known else start
+
+    for tier in ('raw', '1m', '1h'):
+        covers = oldest[tier] is not None and _parse(oldest[tier]) <= data_start + timedelta(minutes=1)
+        segments = _segments(cursor, tier, start, end)
+        count = sum(_scalar(cursor, QUERIES[f'metrics_{part}_count'], params) for part, params in segments)
+        if covers and count <= max_points:
+            break
+
+    rows = []
+    for part, params in segments:
+        cursor.execute(QUERIES[f'metrics_{part}'], params)
+        rows += [dict(row) for row in cursor.fetchall()]
+    return tier, rows
+
+if __name__ == "__main__":
+    conn = db.connect()
+    total_steps = total_deleted = 0
+    while True:
+        steps, deleted = compact(conn)
+        total_steps += steps
+        total_deleted += deleted
+        if steps == 0:
+            break
+    print(f"Compacted {total_steps} batches, retention removed {total_deleted} rows")
+    conn.close()
@@ -1,22 +1,58 @@
+#!/usr/bin/env python3
+"""
+Migracje schematu bazy (PRAGMA user_version)
+Usage: python3 migrate_db.py [--check]
 
-import sqlite3
+--check: po migracji sprawdza EXPLAIN QUERY PLAN każdego zapytania API
+i kończy się kodem 1, jeśli któreś czyta tabelę bez indeksu.
+"""
+import sys
 from config import Config
+import db
 
 def migrate():
     print(f"Connecting to database: {Config.DB_FILE}")
-    conn = sqlite3.connect(Config.DB_FILE)
-    cursor = conn.cursor()
-    
-    # Enable autocommit for migration or commit explicitly
-    try:
-        cursor.execute("ALTER TABLE system_metrics ADD COLUMN net_sent_bytes INTEGER")
-        cursor.execute("ALTER TABLE system_metrics ADD COLUMN net_recv_bytes INTEGER")
-        conn.commit()
-        print("Success: Added net_sent_bytes and net_recv_bytes columns.")
-    except sqlite3.OperationalError as e:
-        print(f"Migration info: {e} (Column might already exist)")
-        
+    conn = db.connect(writer=True)
+    before = db.schema_version(conn)
+    after = db.migrate(conn)
     conn.close()
+    if after == before:
+        print(f"Schema is up to date (version {after}).")
+    else:
+        print(f"Success: schema migrated from version {before} to {after}.")
+
+def check_query_plans():
+    """Sprawdź, że każde zapytanie API (app, rollups, live_events, metrics_tiers, net_rates, brute_force, heavy_hitters, alert_manager) jest obsłużone z indeksu"""
+    from app import API_QUERIES
+    import rollups
+    import live_events
+    import metrics_tiers
+    import net_rates
+    import brute_force
+    import heavy_hitters
+    import alert_manager
+
+    conn = db.connect()
+    failures = 0
+    for name, sql in {**API_QUERIES, **rollups.QUERIES, **live_events.QUERIES,
+                      **metrics_tiers.QUERIES, **net_rates.QUERIES,
+                      **brute_force.QUERIES, **heavy_hitters.QUERIES,
+                      **alert_manager.QUERIES}.items():
+        plan = db.explain(conn, sql, (None,) * sql.count('?'))
+        scans = db.full_scans(plan)
+        status = "FULL SCAN" if scans else "ok"
+        print(f"[{status}] {name}")
+        for step in plan:
+            print(f"    {step}")
+        if scans:
+            failures += 1
+    conn.close()
+
+    if failures:
+        print(f"{failures} API queries are not served from an index")
+    return failures == 0
 
 if __name__ == "__main__":
     migrate()
+    if '--check' in sys.argv[1:]:
+        sys.exit(0 if check_query_plans() else 1)
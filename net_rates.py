@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Prędkości sieci per interfejs (bajty/s, pakiety/s) z liczników psutil
+- liczone raz, przy zbieraniu: kolektor zapisuje nic_rates przy każdym
+  wierszu system_metrics, stan liczników między uruchomieniami w nic_counters
+- spadek licznika to domyślnie reset interfejsu (licznik od zera, np. ip link
+  down/up); przepełnienie 32-bit tylko gdy oba odczyty mieszczą się w 32 bitach,
+  a przyrost jest realny w czasie między odczytami i krótszy niż pół zakresu;
+  zmiana boot_time = restart systemu, liczniki od startu
+- znaczniki czasu w czasie lokalnym, jak ssh_logs i zakresy z app.py
+- historia z SQL: średnia ważona czasem w kubełkach, max_points punktów
+"""
+import time
+from datetime import datetime
+import psutil
+from config import Config
+
+COUNTERS = ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv')
+RATES = tuple(f"{name}_rate" for name in COUNTERS)
+WRAP_32 = 2 ** 32
+# Najmniejsza ramka Ethernet - górna granica pakietów/s przy danej przepustowości
+MIN_FRAME_BYTES = 64
+# Różnica boot_time poniżej tej wartości to szum zegara, nie restart
+BOOT_TIME_TOLERANCE = 5
+
+QUERIES = {
+    'nic_history': '''
+        SELECT CAST(strftime('%s', timestamp, 'utc') AS INTEGER) / ? as bucket, nic,
+               SUM(bytes_sent_rate * seconds) / SUM(seconds) as bytes_sent_rate,
+               SUM(bytes_recv_rate * seconds) / SUM(seconds) as bytes_recv_rate,
+               SUM(packets_sent_rate * seconds) / SUM(seconds) as packets_sent_rate,
+               SUM(packets_recv_rate * seconds) / SUM(seconds) as packets_recv_rate
+        FROM nic_rates
+        WHERE timestamp >= ? AND timestamp < ?
+        GROUP BY bucket, nic
+    ''',
+}
+
+def _ignored(nic):
+    return any(nic.startswith(prefix) for prefix in Config.NET_IGNORE_NICS)
+
+def read_counters():
+    """{nic: {bytes_sent, bytes_recv, packets_sent, packets_recv}} - surowe liczniki jądra"""
+    # nowrap=False: przepełnienia wykrywamy sami, tak samo w każdym procesie
+    counters = psutil.net_io_counters(pernic=True, nowrap=False)
+    return {nic: {name: getattr(c, name) for name in COUNTERS}
+            for nic, c in counters.items() if not _ignored(nic)}
+
+def counter_delta(previous, current, seconds, max_rate):
+    """Przyrost licznika; spadek = reset, chyba że to wiarygodne przepełnienie 32-bit.
+
+    Przy próbkach co kilka minut max_rate * seconds przekracza 2^32, więc sam
+    limit prędkości niczego nie rozstrzyga - reset przy liczniku poniżej 4 GiB
+    wyglądałby jak skok o ~4 GiB. Przepełnienie przyjmujemy tylko, gdy
+    przyrost jest mniejszy niż pół zakresu (licznik był blisko 2^32).
+    """
+    if current >= previous:
+        return current - previous
+    wrapped = WRAP_32 - previous + current
+    if previous < WRAP_32 and current < WRAP_32 and wrapped <= min(max_rate * seconds, WRAP_32 // 2):
+        return wrapped
+    return current
+
+def compute_rates(previous, current, now, boot_time):
+    """Prędkości per NIC między dwoma odczytami.
+
+    previous: {nic: {'timestamp', 'boot_time', <liczniki>}} - NIC bez poprzedniego
+    odczytu pomijamy (pierwsza próbka tylko ustawia punkt odniesienia).
+    Zwraca {nic: {'seconds', 'bytes_sent_rate', ...}}.
+    """
+    max_rates = {
+        'bytes_sent': Config.NET_MAX_BYTES_RATE,
+        'bytes_recv': Config.NET_MAX_BYTES_RATE,
+        'packets_sent': Config.NET_MAX_BYTES_RATE / MIN_FRAME_BYTES,
+        'packets_recv': Config.NET_MAX_BYTES_RATE / MIN_FRAME_BYTES,
+    }
+    rates = {}
+    for nic, counters in current.items():
+        prev = previous.get(nic)
+        if prev is None:
+            continue
+        if abs(prev['boot_time'] - boot_time) > BOOT_TIME_TOLERANCE:
+            # Restart systemu - liczniki liczą od startu
+            seconds = now - boot_time
+            deltas = counters
+        else:
+            seconds = now - prev['timestamp']
+            if seconds <= 0:
+                continue
+            deltas = {name: counter_delta(prev[name], counters[name], seconds, max_rates[name])
+                      for name in COUNTERS}
+        if seconds <= 0:
+            continue
+        rates[nic] = {'seconds': round(seconds, 3),
+                      **{f"{name}_rate": round(deltas[name] / seconds, 1) for name in COUNTERS}}
+    return rates
+
+def _snapshot(current, now, boot_time):
+    return {nic: {'timestamp': now, 'boot_time': boot_time, **counters} for nic, counters in current.items()}
+
+def totals(rates):
+    """Suma prędkości po interfejsach"""
+    return {name: round(sum(r[name] for r in rates.values()), 1) for name in RATES}
+
+class RateTracker:
+    """Prędkości z kolejnych odczytów trzymanych w pamięci (wątek samplera app.py)"""
+
+    def __init__(self):
+        self._previous = {}
+
+    def update(self, now=None):
+        now = now or time.time()
+        boot_time = psutil.boot_time()
+        current = read_counters()
+        rates = compute_rates(self._previous, current, now, boot_time)
+        self._previous = _snapshot(current, now, boot_time)
+        return rates
+
+def _load_state(cursor):
+    cursor.execute(f"SELECT nic, timestamp, boot_time, {', '.join(COUNTERS)} FROM nic_counters")
+    return {row[0]: dict(zip(('timestamp', 'boot_time') + COUNTERS, row[1:])) for row in cursor.fetchall()}
+
+def record(conn, now=None):
+    """Kolektor: prędkości od poprzedniego zapisu (stan w nic_counters) do nic_rates"""
+    now = now or time.time()
+    boot_time = psutil.boot_time()
+    current = read_counters()
+    cursor = conn.cursor()
+    rates = compute_rates(_load_state(cursor), current, now, boot_time)
+
+    timestamp = datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S')
+    cursor.executemany(f'''
+        INSERT OR REPLACE INTO nic_rates (timestamp, nic, seconds, {', '.join(RATES)})
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(timestamp, nic, r['seconds']) + tuple(r[name] for name in RATES) for nic, r in rates.items()])
+    cursor.executemany(f'''
+        INSERT OR REPLACE INTO nic_counters (nic, timestamp, boot_time, {', '.join(COUNTERS)})
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(nic, now, boot_time) + tuple(c[name] for name in COUNTERS) for nic, c in current.items()])
+
+    # Retencja - klucz główny zaczyna się od timestamp, więc to zakres po indeksie
+    cursor.execute('''
+        DELETE FROM nic_rates WHERE timestamp < datetime('now', 'localtime', ?)
+    ''', (f"-{int(Config.NET_RATES_RETENTION_DAYS)} days",))
+    conn.commit()
+    return rates
+
+def _label(epoch):
+    return datetime.fromtimestamp(epoch).strftime('%Y-%m-%d %H:%M:%S')
+
+def history(conn, start, end, max_points):
+    """Prędkości per NIC w kolumnach na gęstej siatce kubełków (None = brak danych).
+
+    {'timestamp': [...], 'bucket_seconds': N, 'nics': {nic: {'bytes_sent_rate': [...], ...}},
+     'total': {'bytes_sent_rate': [...], ...}}
+    """
+    span = (end - start).total_seconds()
+    width = max(Config.NET_HISTORY_MIN_BUCKET, int(-(-span // max_points)))
+    # Epoka z czasu lokalnego - ta sama siatka co strftime('%s', timestamp, 'utc') w zapytaniu
+    first = int(start.timestamp()) // width
+    last = int(end.timestamp()) // width
+    count = last - first + 1
+
+    cursor = conn.cursor()
+    cursor.execute(QUERIES['nic_history'], (width, start.strftime('%Y-%m-%d %H:%M:%S'),
+                                            end.strftime('%Y-%m-%d %H:%M:%S')))
+    nics = {}
+    for bucket, nic, *values in cursor.fetchall():
+        i = bucket - first
+        if not 0 <= i < count:
+            continue
+        columns = nics.setdefault(nic, {name: [None] * count for name in RATES})
+        for name, value in zip(RATES, values):
+            columns[name][i] = round(value, 1) if value is not None else None
+
+    total = {name: [None] * count for name in RATES}
+    for columns in nics.values():
+        for name in RATES:
+            for i, value in enumerate(columns[name]):
+                if value is not None:
+                    total[name][i] = round((total[name][i] or 0) + value, 1)
+
+    return {
+        'timestamp': [_label((first + i) * width) for i in range(count)],
+        'bucket_seconds': width,
+        'nics': nics,
+        'total': total,
+    }
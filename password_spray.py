@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Wykrywanie rozproszonego password sprayingu w stałej pamięci (sketches.py)
+- wiele IP próbuje tego samego konta: HyperLogLog różnych źródeł per username
+- jedna podsieć (/24, /64) próbuje wielu kont: HyperLogLog różnych userów per prefiks
+- jedno konto atakowane masowo: Count-Min prób per username
+Tylko nieudane próby. Okno tumbling SPRAY_WINDOW s; progi sprawdzamy na sumie
+bieżącego i poprzedniego okna, więc atak na granicy okien nie znika.
+HLL dostają tylko klucze, które w Count-Min przekroczyły SPRAY_TRACK_MIN_ATTEMPTS
+(najwyżej SPRAY_MAX_TRACKED na rodzaj) - pamięć nie rośnie z liczbą zdarzeń;
+liczność jest przez to zaniżona o co najwyżej SPRAY_TRACK_MIN_ATTEMPTS - 1.
+Stan zapisywany w sketch_state co SPRAY_CHECKPOINT_INTERVAL s i po restarcie wczytywany;
+zapisujemy tylko szkice zmienione od poprzedniego checkpointu.
+"""
+import ipaddress
+import time
+from datetime import datetime
+from config import Config
+from sketches import HyperLogLog, CountMinSketch
+
+FAILED_STATUSES = ('failed', 'invalid')
+
+# rodzaj HLL -> (typ alertu, próg z Config, opis)
+TRACKED = {
+    'user_sources': ('password_spray_user', 'SPRAY_USER_SOURCES', "distinct IPs tried username {key}"),
+    'subnet_users': ('password_spray_subnet', 'SPRAY_SUBNET_USERNAMES', "distinct usernames tried from {key}"),
+}
+
+def _epoch(timestamp):
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return datetime.fromisoformat(str(timestamp)[:19]).timestamp()
+
+def subnet_of(ip):
+    """Prefiks sieci źródła: /SPRAY_IPV4_PREFIX albo /SPRAY_IPV6_PREFIX (None dla śmieci)"""
+    try:
+        address = ipaddress.ip_address(ip.split('%', 1)[0])
+    except ValueError:
+        return None
+    prefix = Config.SPRAY_IPV4_PREFIX if address.version == 4 else Config.SPRAY_IPV6_PREFIX
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+class WindowSketches:
+    """Szkice jednego okna SPRAY_WINDOW"""
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.user_attempts = CountMinSketch(Config.SPRAY_CMS_WIDTH, Config.SPRAY_CMS_DEPTH)
+        self.subnet_attempts = CountMinSketch(Config.SPRAY_CMS_WIDTH, Config.SPRAY_CMS_DEPTH)
+        self.tracked = {kind: {} for kind in TRACKED}
+        # Ostatnio widziana liczba prób śledzonych kluczy - wybór klucza do wyparcia bez Count-Min
+        self.weights = {kind: {} for kind in TRACKED}
+        # (rodzaj, klucz) zmienione / wyparte od ostatniego checkpointu
+        self.dirty = set()
+        self.removed = set()
+
+    def track(self, kind, key, attempts):
+        """HLL klucza; nowy tylko gdy klucz jest dość aktywny, a przy pełnej puli wypiera najsłabszy"""
+        sketches = self.tracked[kind]
+        weights = self.weights[kind]
+        hll = sketches.get(key)
+        if hll is not None:
+            weights[key] = attempts
+            return hll
+        if attempts < Config.SPRAY_TRACK_MIN_ATTEMPTS:
+            return None
+        if len(sketches) >= Config.SPRAY_MAX_TRACKED:
+            weakest = min(weights, key=weights.get)
+            if weights[weakest] >= attempts:
+                return None
+            del sketches[weakest], weights[weakest]
+            self.dirty.discard((kind, weakest))
+            self.removed.add((kind, weakest))
+        hll = sketches[key] = HyperLogLog(Config.SPRAY_HLL_PRECISION)
+        weights[key] = attempts
+        self.dirty.add((kind, key))
+        self.removed.discard((kind, key))
+        return hll
+
+class SprayDetector:
+    """Szkice dwóch ostatnich okien; observe() wstawia alerty kursorem wywołującego"""
+
+    def __init__(self):
+        self.current = None
+        self.previous = None
+        self._alerted = {}
+        self._alerted_dirty = set()
+        self._checkpointed_at = time.monotonic()
+
+    def _window(self, t):
+        generation = int(t // Config.SPRAY_WINDOW)
+        if self.current is None or generation > self.current.generation:
+            if self.current is not None and generation == self.current.generation + 1:
+                self.previous = self.current
+            else:
+                self.previous = None
+            self.current = WindowSketches(generation)
+            self._alerted = {key: until for key, until in self._alerted.items() if until >= generation}
+        if generation == self.current.generation:
+            return self.current, self.previous
+        if self.previous is not None and generation == self.previous.generation:
+            # Spóźnione zdarzenie z poprzedniego okna - liczy się tylko tam
+            return self.previous, None
+        return None, None
+
+    def observe(self, cursor, events):
+        """Przepuść paczkę zdarzeń (krotki jak w db.insert_ssh_events), zwraca liczbę alertów"""
+        now = time.time()
+        alerts = 0
+        for timestamp, username, ip, _dns_name, _port, status, _message in events:
+            if status not in FAILED_STATUSES:
+                continue
+            t = _epoch(timestamp)
+            # Zaległość starsza niż dwa okna nie ma już znaczenia dla progów
+            if t <= now - 2 * Config.SPRAY_WINDOW:
+                continue
+            window, other = self._window(t)
+            if window is None:
+                continue
+            alerts += self._add(cursor, window, other, username, ip)
+        if time.monotonic() - self._checkpointed_at >= Config.SPRAY_CHECKPOINT_INTERVAL:
+            self.checkpoint(cursor)
+        return alerts
+
+    def _add(self, cursor, window, other, username, ip):
+        alerts = 0
+        attempts = window.user_attempts.add(username)
+        window.dirty.add(('user_attempts', ''))
+        if other is not None:
+            attempts += other.user_attempts.estimate(username)
+        if attempts >= Config.SPRAY_USER_ATTEMPTS:
+            alerts += self._alert(cursor, 'username_attempts', username, attempts,
+                                  f"{attempts} failed login attempts for username {username}")
+
+        subnet = subnet_of(ip)
+        subnet_attempts = 0
+        if subnet:
+            subnet_attempts = window.subnet_attempts.add(subnet)
+            window.dirty.add(('subnet_attempts', ''))
+        for kind, key, value, key_attempts in (('user_sources', username, ip, attempts),
+                                               ('subnet_users', subnet, username, subnet_attempts)):
+            if key is None:
+                continue
+            hll = window.track(kind, key, key_attempts)
+            # Liczność zmienia się tylko, gdy zmienił się któryś rejestr
+            if hll is None or not hll.add(value):
+                continue
+            window.dirty.add((kind, key))
+            previous = other.tracked[kind].get(key) if other is not None else None
+            distinct = hll.count(previous)
+            alert_type, threshold, description = TRACKED[kind]
+            if distinct >= getattr(Config, threshold):
+                alerts += self._alert(cursor, alert_type, key, distinct,
+                                      f"~{distinct} {description.format(key=key)}")
+        return alerts
+
+    def _alert(self, cursor, alert_type, key, value, text):
+        if (alert_type, key) in self._alerted:
+            return 0
+        # Raz na parę okien (bieżące + następne), tak jak sięga suma progów
+        self._alerted[(alert_type, key)] = self.current.generation + 1
+        self._alerted_dirty.add((alert_type, key))
+        message = f"Password spraying: {text} in last {Config.SPRAY_WINDOW // 60}-{2 * Config.SPRAY_WINDOW // 60} min"
+        cursor.execute('''
+            INSERT INTO alerts (alert_type, severity, message, details)
+            VALUES (?, ?, ?, ?)
+        ''', (alert_type, 'warning', message, key))
+        print(f"Alert created: {message}")
+        return 1
+
+    def checkpoint(self, cursor):
+        """Zapisz zmienione szkice i deduplikację (ta sama transakcja co bieżąca paczka).
+
+        Upsert tylko wierszy zmienionych od poprzedniego checkpointu - zwykle
+        Count-Min i kilka HLL, a nie wszystkie szkice obu okien.
+        """
+        rows = []
+        deleted = []
+        for window in (self.previous, self.current):
+            if window is None:
+                continue
+            for kind, key in window.dirty:
+                if kind in TRACKED:
+                    data = window.tracked[kind][key].to_bytes()
+                else:
+                    data = getattr(window, kind).to_bytes()
+                rows.append((window.generation, kind, key, data))
+            deleted.extend((kind, key, window.generation) for kind, key in window.removed)
+            window.dirty.clear()
+            window.removed.clear()
+        rows.extend((self._alerted[alerted], f"alerted:{alerted[0]}", alerted[1], None)
+                    for alerted in self._alerted_dirty if alerted in self._alerted)
+        self._alerted_dirty.clear()
+
+        cursor.executemany("DELETE FROM sketch_state WHERE kind = ? AND key = ? AND generation = ?", deleted)
+        cursor.executemany('''
+            INSERT OR REPLACE INTO sketch_state (generation, kind, key, data) VALUES (?, ?, ?, ?)
+        ''', rows)
+        if self.current is not None:
+            # Okna starsze niż poprzednie i wygasła deduplikacja
+            oldest = self.previous.generation if self.previous is not None else self.current.generation
+            cursor.execute("DELETE FROM sketch_state WHERE generation < ? AND kind NOT LIKE 'alerted:%'",
+                           (oldest,))
+            cursor.execute("DELETE FROM sketch_state WHERE generation < ? AND kind LIKE 'alerted:%'",
+                           (self.current.generation,))
+        self._checkpointed_at = time.monotonic()
+        return len(rows)
+
+    def load(self, cursor):
+        """Odtwórz szkice z ostatniego checkpointu; zwraca liczbę wczytanych wierszy"""
+        cursor.execute("SELECT generation, kind, key, data FROM sketch_state ORDER BY generation")
+        rows = cursor.fetchall()
+        windows = {}
+        for generation, kind, key, data in rows:
+            if kind.startswith('alerted:'):
+                self._alerted[(kind.split(':', 1)[1], key)] = generation
+                continue
+            window = windows.get(generation)
+            if window is None:
+                window = windows[generation] = WindowSketches(generation)
+            if kind in ('user_attempts', 'subnet_attempts'):
+                setattr(window, kind, CountMinSketch.from_bytes(data))
+            else:
+                window.tracked[kind][key] = HyperLogLog.from_bytes(data)
+        # Wagi dopiero po wczytaniu wszystkich wierszy - Count-Min okna może
+        # przyjść po jego HLL-ach
+        for window in windows.values():
+            for kind, counter in (('user_sources', window.user_attempts),
+                                  ('subnet_users', window.subnet_attempts)):
+                for key in window.tracked[kind]:
+                    window.weights[kind][key] = counter.estimate(key)
+        for generation in sorted(windows):
+            self.previous, self.current = self.current, windows[generation]
+        if self.previous is not None and self.previous.generation != self.current.generation - 1:
+            self.previous = None
+        return len(rows)
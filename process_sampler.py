@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Długo żyjący sampler procesów dla /api/top_processes i /api/apps
+- obiekty psutil.Process trzymane między tickami, więc cpu_percent to
+  prawdziwa różnica od poprzedniego ticku, a nie zawsze 0.0
+- cmdline czytany raz na PID, wpisy usuwane gdy proces znika
+- top-K przez heapq.nlargest zamiast sortowania całej listy
+"""
+import heapq
+import threading
+from datetime import datetime
+import psutil
+
+class ProcessSampler:
+    """Próbkuje procesy na żądanie ticku; wyniki czyta dowolny wątek"""
+
+    def __init__(self, top_k=10):
+        self.top_k = top_k
+        # pid -> psutil.Process; pid -> cmdline (ten sam proces = ta sama linia poleceń)
+        self._procs = {}
+        self._cmdlines = {}
+        self._lock = threading.Lock()
+        self._latest = None
+        self._rows = []
+
+    def _track(self, pid):
+        proc = self._procs.get(pid)
+        if proc is not None and not proc.is_running():
+            # PID użyty ponownie przez inny proces - zaczynamy od nowa
+            proc = None
+            self._cmdlines.pop(pid, None)
+        if proc is None:
+            proc = self._procs[pid] = psutil.Process(pid)
+            # Pierwsze wywołanie tylko ustawia punkt odniesienia (zwraca 0.0)
+            proc.cpu_percent(interval=None)
+        return proc
+
+    def _cmdline(self, pid, proc):
+        cmdline = self._cmdlines.get(pid)
+        if cmdline is None:
+            try:
+                cmdline = ' '.join(proc.cmdline())
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                cmdline = ''
+            self._cmdlines[pid] = cmdline
+        return cmdline
+
+    def tick(self):
+        """Jedno przejście po procesach; publikuje nowy top-K i listę do dopasowań"""
+        pids = set(psutil.pids())
+        for pid in list(self._procs):
+            if pid not in pids:
+                del self._procs[pid]
+                self._cmdlines.pop(pid, None)
+
+        rows = []
+        for pid in sorted(pids):
+            try:
+                proc = self._track(pid)
+                with proc.oneshot():
+                    rows.append({
+                        'pid': pid,
+                        'name': proc.name(),
+                        'username': proc.username(),
+                        'cpu_percent': proc.cpu_percent(interval=None),
+                        'memory_percent': round(proc.memory_percent(), 2),
+                        'cmdline': self._cmdline(pid, proc),
+                    })
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                self._procs.pop(pid, None)
+                self._cmdlines.pop(pid, None)
+                continue
+
+        def public(row):
+            return {k: v for k, v in row.items() if k != 'cmdline'}
+
+        latest = {
+            'by_cpu': [public(r) for r in heapq.nlargest(self.top_k, rows, key=lambda r: r['cpu_percent'])],
+            'by_memory': [public(r) for r in heapq.nlargest(self.top_k, rows, key=lambda r: r['memory_percent'])],
+            'sampled_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        with self._lock:
+            self._latest = latest
+            self._rows = rows
+
+    def latest(self):
+        """Top procesy z ostatniego ticku (None przed pierwszym)"""
+        with self._lock:
+            return self._latest
+
+    def find(self, matches):
+        """Pierwszy proces, którego cmdline zawiera wzorzec - {wzorzec: info}"""
+        with self._lock:
+            rows = self._rows
+        found = {}
+        for row in rows:
+            for match in matches:
+                if match not in found and match in row['cmdline']:
+                    found[match] = {
+                        'pid': row['pid'],
+                        'memory_percent': row['memory_percent'],
+                        'cpu_percent': round(row['cpu_percent'], 2)
+                    }
+            if len(found) == len(matches):
+                break
+        return found
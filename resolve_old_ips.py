@@ -1,42 +1,51 @@
 #!/usr/bin/env python3
 """
-Backfill DNS names for existing SSH logs
+Backfill DNS names for known IPs
+(równolegle przez pulę z dns_resolver.py, wyniki trafiają do ips i ip_dns_cache)
 """
 import sqlite3
-import socket
+import time
 from config import Config
-
-def resolve_ip(ip):
-    try:
-        socket.setdefaulttimeout(1)
-        hostname, _, _ = socket.gethostbyaddr(ip)
-        return hostname
-    except:
-        return None
+import db
+from dns_resolver import DnsResolver
 
 def main():
     print("Starting DNS backfill...")
-    conn = sqlite3.connect(Config.DB_FILE)
-    conn.row_factory = sqlite3.Row
+    conn = db.connect(row_factory=sqlite3.Row)
     cursor = conn.cursor()
-    
-    # Get distinct IPs with null dns_name
-    cursor.execute("SELECT DISTINCT ip_address FROM ssh_logs WHERE dns_name IS NULL")
+
+    # IPs with null dns_name (pomijamy świeże negatywne wpisy w cache)
+    cursor.execute('''
+        SELECT i.ip_address
+        FROM ips i
+        LEFT JOIN ip_dns_cache c ON c.ip_address = i.ip_address
+        WHERE i.dns_name IS NULL
+        AND (c.ip_address IS NULL OR c.expires_at <= ?)
+    ''', (time.time(),))
     ips = [row['ip_address'] for row in cursor.fetchall()]
-    
+
     print(f"Found {len(ips)} unique IPs to resolve.")
-    
-    resolved_count = 0
-    for ip in ips:
-        hostname = resolve_ip(ip)
-        if hostname:
-            print(f"Resolved {ip} -> {hostname}")
-            cursor.execute("UPDATE ssh_logs SET dns_name = ? WHERE ip_address = ?", (hostname, ip))
-            resolved_count += 1
-        else:
-            print(f"Could not resolve {ip}")
-            
+
+    cursor.execute("SELECT COUNT(*) FROM ips WHERE dns_name IS NULL")
+    unresolved_before = cursor.fetchone()[0]
+
+    resolver = DnsResolver()
+    # Paczkami po DNS_MAX_PENDING - pula nie przyjmie więcej naraz
+    for start in range(0, len(ips), Config.DNS_MAX_PENDING):
+        for ip in ips[start:start + Config.DNS_MAX_PENDING]:
+            resolver.lookup(cursor, ip)
+        while resolver.pending_count():
+            resolver.apply_results(cursor)
+            time.sleep(0.1)
+        conn.commit()
+
+    resolver.finish(cursor)
     conn.commit()
+
+    # Ile z nich ma teraz nazwę w ips
+    cursor.execute("SELECT COUNT(*) FROM ips WHERE dns_name IS NULL")
+    resolved_count = unresolved_before - cursor.fetchone()[0]
+
     conn.close()
     print(f"Done. Resolved {resolved_count} IPs.")
 
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Agregaty godzinowe/dzienne ssh_logs (ssh_rollup_hourly, ssh_rollup_daily)
+- aktualizowane w tej samej transakcji co wstawienie surowych logów
+- unikalne IP liczone przez tabelę ssh_rollup_seen_ips (rollup, bucket, status, ip)
+- warstwa zapytań wybiera źródło wg zakresu: surowe logi na brzegach,
+  pełne godziny/dni z agregatów w środku
+"""
+from datetime import datetime, timedelta
+from config import Config
+import downsample
+import ssh_partitions
+
+HOUR_FORMAT = '%Y-%m-%d %H:00:00'
+DAY_FORMAT = '%Y-%m-%d 00:00:00'
+TS_FORMAT = '%Y-%m-%d %H:%M:%S'
+STATUSES = ('accepted', 'failed', 'invalid')
+
+# Zapytania per źródło (segment [start, end) zakresu) - sprawdzane też przez migrate_db.py --check
+QUERIES = {
+    'raw_counts': '''
+        SELECT status, COUNT(*) as count
+        FROM ssh_logs
+        WHERE timestamp >= ? AND timestamp < ?
+        GROUP BY status
+    ''',
+    'raw_timeline_hourly': '''
+        SELECT
+            strftime('%Y-%m-%d %H:00:00', timestamp) as bucket,
+            status,
+            COUNT(*) as count,
+            COUNT(DISTINCT ip_address) as unique_ips
+        FROM ssh_logs
+        WHERE timestamp >= ? AND timestamp < ?
+        GROUP BY bucket, status
+    ''',
+    'raw_timeline_daily': '''
+        SELECT
+            strftime('%Y-%m-%d 00:00:00', timestamp) as bucket,
+            status,
+            COUNT(*) as count,
+            COUNT(DISTINCT ip_address) as unique_ips
+        FROM ssh_logs
+        WHERE timestamp >= ? AND timestamp < ?
+        GROUP BY bucket, status
+    ''',
+    'hourly': '''
+        SELECT bucket, status, count, unique_ips
+        FROM ssh_rollup_hourly
+        WHERE bucket >= ? AND bucket < ?
+    ''',
+    'daily': '''
+        SELECT bucket, status, count, unique_ips
+        FROM ssh_rollup_daily
+        WHERE bucket >= ? AND bucket < ?
+    ''',
+}
+
+UPSERT_ROLLUP_SQL = '''
+    INSERT INTO {table} (bucket, status, count, unique_ips)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(bucket, status) DO UPDATE SET
+        count = count + excluded.count,
+        unique_ips = unique_ips + excluded.unique_ips
+'''
+
+def update_ssh_rollups(cursor, events):
+    """Dolicz paczkę zdarzeń do agregatów godzinowych i dziennych"""
+    for rollup, bucket_format in (('hourly', HOUR_FORMAT), ('daily', DAY_FORMAT)):
+        counts = {}
+        seen = set()
+        for timestamp, _username, ip, _dns_name, _port, status, _message in events:
+            key = (timestamp.strftime(bucket_format), status)
+            counts[key] = counts.get(key, 0) + 1
+            seen.add(key + (ip,))
+
+        # Nowe IP w kubełku = wiersze, które faktycznie weszły do seen_ips
+        new_ips = {}
+        for bucket, status, ip in seen:
+            cursor.execute('''
+                INSERT OR IGNORE INTO ssh_rollup_seen_ips (rollup, bucket, status, ip_address)
+                VALUES (?, ?, ?, ?)
+            ''', (rollup, bucket, status, ip))
+            if cursor.rowcount > 0:
+                new_ips[(bucket, status)] = new_ips.get((bucket, status), 0) + 1
+
+        cursor.executemany(UPSERT_ROLLUP_SQL.format(table=f'ssh_rollup_{rollup}'), [
+            (bucket, status, count, new_ips.get((bucket, status), 0))
+            for (bucket, status), count in counts.items()
+        ])
+
+def _floor_hour(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def _ceil_hour(ts):
+    floored = _floor_hour(ts)
+    return floored if floored == ts else floored + timedelta(hours=1)
+
+def _floor_day(ts):
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _ceil_day(ts):
+    floored = _floor_day(ts)
+    return floored if floored == ts else floored + timedelta(days=1)
+
+def pick_tier(start, end):
+    """Źródło dla zakresu: 'raw', 'hourly' albo 'daily'"""
+    span = end - start
+    if span <= timedelta(hours=Config.ROLLUP_RAW_MAX_HOURS):
+        return 'raw'
+    if span <= timedelta(days=Config.ROLLUP_HOURLY_MAX_DAYS):
+        return 'hourly'
+    return 'daily'
+
+def plan_segments(start, end, tier=None, raw_since=None):
+    """Podziel [start, end) na segmenty (źródło, od, do).
+
+    Niepełne godziny/dni na brzegach idą z surowych logów, więc liczby
+    w kubełkach są dokładne - nie mieszamy dwóch poziomów agregatów.
+    Surowych logów sprzed raw_since (zamknięte partycje) nie czytamy -
+    taki zakres idzie z agregatu (co najmniej godzinowego), a brzegi
+    przed raw_since rozszerzamy do pełnych kubełków.
+    """
+    tier = tier or pick_tier(start, end)
+    before_raw = raw_since is not None and start < raw_since
+    if tier == 'raw':
+        if not before_raw:
+            return [('raw', start, end)]
+        tier = 'hourly'
+
+    floor, ceil = (_floor_hour, _ceil_hour) if tier == 'hourly' else (_floor_day, _ceil_day)
+    first, last = ceil(start), floor(end)
+    if before_raw:
+        start = first = floor(start)
+        if end <= raw_since:
+            end = last = ceil(end)
+    if first >= last:
+        return [('raw', start, end)]
+
+    segments = []
+    if start < first:
+        segments.append(('raw', start, first))
+    segments.append((tier, first, last))
+    if last < end:
+        segments.append(('raw', last, end))
+    return segments
+
+def _fetch(cursor, query, seg_start, seg_end):
+    cursor.execute(QUERIES[query], (seg_start.strftime(TS_FORMAT), seg_end.strftime(TS_FORMAT)))
+    return cursor.fetchall()
+
+def ssh_counts(conn, start, end=None):
+    """Liczba prób logowania wg statusu w [start, end) (jak stats_ssh)"""
+    end = end or datetime.now()
+    cursor = conn.cursor()
+    by_status = {}
+    for source, seg_start, seg_end in plan_segments(start, end, raw_since=ssh_partitions.raw_since(conn)):
+        if source == 'raw':
+            rows = [(row[0], row[1]) for row in _fetch(cursor, 'raw_counts', seg_start, seg_end)]
+        else:
+            rows = [(row[1], row[2]) for row in _fetch(cursor, source, seg_start, seg_end)]
+        for status, count in rows:
+            by_status[status] = by_status.get(status, 0) + count
+
+    return {
+        'total': sum(by_status.values()),
+        'successful': by_status.get('accepted', 0),
+        'failed': by_status.get('failed', 0) + by_status.get('invalid', 0),
+    }
+
+def ssh_timeline(conn, start, end=None):
+    """Oś czasu [{'hour', 'status', 'count', 'unique_ips'}] w kubełkach godzinowych
+    (do ROLLUP_HOURLY_MAX_DAYS) albo dziennych; klucz 'hour' to początek kubełka"""
+    end = end or datetime.now()
+    tier = 'hourly' if pick_tier(start, end) != 'daily' else 'daily'
+    raw_query = 'raw_timeline_hourly' if tier == 'hourly' else 'raw_timeline_daily'
+    cursor = conn.cursor()
+
+    buckets = {}
+    for source, seg_start, seg_end in plan_segments(start, end, tier, ssh_partitions.raw_since(conn)):
+        for bucket, status, count, unique_ips in _fetch(cursor, raw_query if source == 'raw' else source,
+                                                         seg_start, seg_end):
+            # Brzegowy kubełek jest w całości z surowych logów, środkowe w całości z agregatu
+            buckets[(bucket, status)] = (count, unique_ips)
+
+    return [
+        {'hour': bucket, 'status': status, 'count': count, 'unique_ips': unique_ips}
+        for (bucket, status), (count, unique_ips) in sorted(buckets.items())
+    ]
+
+def ssh_timeline_columns(conn, start, end=None, max_points=None):
+    """Oś czasu jako kolumny na gęstej siatce kubełków (zera tam, gdzie nie było prób).
+
+    Przy więcej niż max_points kubełkach sklejamy po k sąsiednich: liczby
+    się sumują, unique_ips to maksimum (dolne oszacowanie - zbiory IP są
+    tylko w obrębie kubełka agregatu).
+    """
+    end = end or datetime.now()
+    max_points = max_points or Config.HISTORY_DEFAULT_POINTS
+    tier = 'hourly' if pick_tier(start, end) != 'daily' else 'daily'
+    floor, step = (_floor_hour, timedelta(hours=1)) if tier == 'hourly' else (_floor_day, timedelta(days=1))
+
+    labels = []
+    bucket = floor(start)
+    while bucket < end:
+        labels.append(bucket.strftime(TS_FORMAT))
+        bucket += step
+    index = {label: i for i, label in enumerate(labels)}
+
+    columns = {}
+    for status in STATUSES:
+        columns[status] = [0] * len(labels)
+        columns[f"{status}_unique_ips"] = [0] * len(labels)
+    for row in ssh_timeline(conn, start, end):
+        i = index.get(row['hour'])
+        if i is None or row['status'] not in columns:
+            continue
+        columns[row['status']][i] = row['count']
+        columns[f"{row['status']}_unique_ips"][i] = row['unique_ips']
+
+    reducers = {name: max if name.endswith('_unique_ips') else sum for name in columns}
+    labels, columns, k = downsample.merge_buckets(labels, columns, max_points, reducers)
+    return {'tier': tier, 'bucket_seconds': int(step.total_seconds()) * k, 'hour': labels, **columns}
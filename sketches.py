@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Szkice probabilistyczne o stałej pamięci
+- HyperLogLog: liczba różnych wartości (błąd ~1.04/sqrt(2^p))
+- Count-Min: liczniki per klucz, zawyżone o co najwyżej e/width * suma z prawd. 1 - e^-depth
+Oba da się scalać (okna czasu) i zapisać jako bytes (to_bytes/from_bytes).
+Hash: blake2b - stabilny między procesami, w przeciwieństwie do hash().
+"""
+import hashlib
+import math
+import struct
+from array import array
+
+MASK64 = (1 << 64) - 1
+# 2^-r dla każdej możliwej wartości rejestru - count() bez potęgowania w pętli
+INVERSE_POWERS = [2.0 ** -r for r in range(65)]
+
+def _hash128(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8', errors='replace'), digest_size=16).digest(), 'little')
+
+class HyperLogLog:
+    """Licznik różnych wartości w 2^p bajtach"""
+
+    __slots__ = ('p', 'm', 'registers')
+
+    def __init__(self, p=10, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+    def add(self, value):
+        """Dodaj wartość; True gdy zmienił się rejestr (czyli mogła zmienić się liczność)"""
+        x = _hash128(value) & MASK64
+        index = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def count(self, other=None):
+        """Szacowana liczność (razem z other: suma zbiorów, bez zmiany self)"""
+        registers = self.registers if other is None else bytes(map(max, self.registers, other.registers))
+        total = sum(map(INVERSE_POWERS.__getitem__, registers))
+        zeros = registers.count(0)
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / total
+        if estimate <= 2.5 * self.m and zeros:
+            # Mało wartości - liniowe zliczanie pustych rejestrów jest dokładniejsze
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def to_bytes(self):
+        return bytes([self.p]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(data[0], data[1:])
+
+class CountMinSketch:
+    """Liczniki per klucz w tablicy depth x width (uint32)"""
+
+    __slots__ = ('width', 'depth', 'table')
+
+    def __init__(self, width=2048, depth=4, table=None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else array('I', bytes(4 * width * depth))
+
+    def _cells(self, value):
+        # Kirsch-Mitzenmacher: depth funkcji haszujących z dwóch połówek jednego hasha
+        h = _hash128(value)
+        h1, h2 = h & MASK64, h >> 64
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, value, count=1):
+        """Dolicz i zwróć nowe oszacowanie"""
+        cells = self._cells(value)
+        table = self.table
+        for cell in cells:
+            table[cell] = min(table[cell] + count, 0xFFFFFFFF)
+        return min(table[cell] for cell in cells)
+
+    def estimate(self, value):
+        return min(self.table[cell] for cell in self._cells(value))
+
+    def merge(self, other):
+        for i, value in enumerate(other.table):
+            self.table[i] = min(self.table[i] + value, 0xFFFFFFFF)
+
+    def to_bytes(self):
+        return struct.pack('<II', self.width, self.depth) + self.table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        width, depth = struct.unpack_from('<II', data)
+        table = array('I')
+        table.frombytes(data[8:])
+        return cls(width, depth, table)
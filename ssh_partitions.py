@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Miesięczne partycje ssh_logs - osobny plik SQLite na każdy miesiąc
+- <SSH_PARTITION_DIR>/ssh_logs_YYYY-MM.db: partycje otwarte, dołączane (ATTACH)
+  przez db.connect(); TEMP VIEW ssh_logs = UNION ALL po nich, więc zapytania
+  o ostatnie godziny/dni czytają tylko bieżący miesiąc (i poprzedni do zamknięcia)
+- tylko parser i migracje (db.connect(writer=True)) tworzą i otwierają ponownie
+  partycje; pozostałe procesy dołączają istniejące pliki .db tylko do odczytu
+- id rosną globalnie: przed wstawieniem sqlite_sequence partycji dostaje
+  największe id ze wszystkich partycji (live_events, recent_logs sortują po id)
+- zamknięty miesiąc (SSH_SEAL_AFTER_DAYS po końcu) -> VACUUM INTO + gzip
+  (ssh_logs_YYYY-MM.db.gz, tylko do odczytu); retencja = usunięcie pliku,
+  bez DELETE i VACUUM w monitor.db
+- spójność: commit obejmuje wszystkie dołączone pliki, ale przy WAL nie jest
+  atomowy między plikami przy awarii zasilania
+Usage: python3 ssh_partitions.py [--maintain] [--open YYYY-MM]
+"""
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import urllib.parse
+from datetime import datetime, timedelta
+from config import Config
+
+# Wersja schematu monitor.db z katalogiem ssh_partitions (db.MIGRATIONS)
+SCHEMA_VERSION = 7
+PARTITION_RE = re.compile(r'^ssh_logs_(\d{4}-\d{2})\.db(\.gz)?$')
+SCHEMA_PREFIX = 'ssh_'
+# Kubełki ssh_rollup_seen_ips - te same formaty co rollups.HOUR_FORMAT/DAY_FORMAT
+ROLLUP_BUCKETS = (('hourly', '%Y-%m-%d %H:00:00'), ('daily', '%Y-%m-%d 00:00:00'))
+
+# Kolejność kolumn jak w dawnej tabeli ssh_logs (migracja 1 + dns_name), bo widok to SELECT *
+PARTITION_SCHEMA = [
+    '''
+        CREATE TABLE IF NOT EXISTS {schema}.ssh_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME,
+            username TEXT,
+            ip_address TEXT,
+            port INTEGER,
+            status TEXT,
+            message TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            dns_name TEXT
+        )
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS {schema}.idx_ssh_logs_ts_status_ip
+        ON ssh_logs (timestamp, status, ip_address)
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS {schema}.idx_ssh_logs_ip_ts
+        ON ssh_logs (ip_address, timestamp)
+    ''',
+]
+
+def partition_dir():
+    """Katalog partycji; ścieżka względna liczona od katalogu bazy"""
+    path = Config.SSH_PARTITION_DIR
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(Config.DB_FILE)), path)
+    return path
+
+def partition_path(month, sealed=False):
+    return os.path.join(partition_dir(), f"ssh_logs_{month}.db" + ('.gz' if sealed else ''))
+
+def schema_name(month):
+    return SCHEMA_PREFIX + month.replace('-', '_')
+
+def month_of(timestamp):
+    """'YYYY-MM' dla datetime albo tekstu 'YYYY-MM-DD ...'"""
+    if timestamp is None:
+        return current_month()
+    if isinstance(timestamp, datetime):
+        return timestamp.strftime('%Y-%m')
+    return str(timestamp)[:7]
+
+def month_start(month):
+    return datetime.strptime(month, '%Y-%m')
+
+def next_month(month):
+    start = month_start(month)
+    return (start.replace(day=28) + timedelta(days=4)).strftime('%Y-%m')
+
+def current_month():
+    return datetime.now().strftime('%Y-%m')
+
+def list_partitions():
+    """{miesiąc: czy zamknięta}; plik .db wygrywa z .db.gz (otwarta ponownie)"""
+    try:
+        names = os.listdir(partition_dir())
+    except FileNotFoundError:
+        return {}
+    partitions = {}
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            month, sealed = match.group(1), bool(match.group(2))
+            partitions[month] = partitions.get(month, True) and sealed
+    return partitions
+
+def _scalar(conn, sql, params=()):
+    row = conn.execute(sql, params).fetchone()
+    return row[0] if row else None
+
+def has_legacy_table(conn):
+    """ssh_logs wciąż jako tabela w monitor.db (przed adopt_main_table)"""
+    return _scalar(conn, "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'ssh_logs'") is not None
+
+def _ready(conn):
+    """Partycje obowiązują dopiero po migracjach i przeniesieniu starej tabeli"""
+    return _scalar(conn, "PRAGMA user_version") >= SCHEMA_VERSION and not has_legacy_table(conn)
+
+def attached_months(conn):
+    """Miesiące dołączone do połączenia, od najnowszego"""
+    months = [row[1][len(SCHEMA_PREFIX):].replace('_', '-')
+              for row in conn.execute("PRAGMA database_list")
+              if row[1].startswith(SCHEMA_PREFIX)]
+    return sorted(months, reverse=True)
+
+def _attach(conn, month, writable=True):
+    schema = schema_name(month)
+    path = partition_path(month)
+    if not writable:
+        # mode=ro: czytelnik nie utworzy pliku ani nie zapisze do partycji
+        path = 'file:' + urllib.parse.quote(os.path.abspath(path)) + '?mode=ro'
+    conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+    conn.execute(f"PRAGMA {schema}.synchronous=NORMAL")
+    conn.execute(f"PRAGMA {schema}.cache_size=-{int(Config.DB_CACHE_SIZE_KB)}")
+    return schema
+
+def _global_max_id(conn):
+    """Największe id we wszystkich partycjach (dołączonych i zamkniętych)"""
+    ids = [_scalar(conn, f"SELECT seq FROM {schema_name(m)}.sqlite_sequence WHERE name = 'ssh_logs'")
+           for m in attached_months(conn)]
+    if _scalar(conn, "SELECT 1 FROM main.sqlite_master WHERE name = 'ssh_partitions'"):
+        ids.append(_scalar(conn, "SELECT MAX(last_id) FROM ssh_partitions"))
+    return max([i for i in ids if i is not None], default=0)
+
+def _create(conn, month):
+    """Nowy plik partycji ze schematem; sekwencja id od największego id"""
+    os.makedirs(partition_dir(), exist_ok=True)
+    schema = _attach(conn, month)
+    conn.execute(f"PRAGMA {schema}.journal_mode=WAL")
+    for sql in PARTITION_SCHEMA:
+        conn.execute(sql.format(schema=schema))
+    conn.execute(f"INSERT INTO {schema}.sqlite_sequence (name, seq) SELECT 'ssh_logs', 0 "
+                 f"WHERE NOT EXISTS (SELECT 1 FROM {schema}.sqlite_sequence WHERE name = 'ssh_logs')")
+    seed_sequence(conn, month)
+    conn.commit()
+
+def _unseal(month):
+    """Rozpakuj zamknięty miesiąc z powrotem do pliku .db (spóźnione zdarzenia)"""
+    sealed = partition_path(month, sealed=True)
+    tmp = partition_path(month) + '.tmp'
+    with gzip.open(sealed, 'rb') as src, open(tmp, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp, partition_path(month))
+    os.unlink(sealed)
+    print(f"Reopened sealed SSH partition {month}")
+
+def _reopen(conn, month):
+    """Po rozpakowaniu: zbiory IP kubełków z partycji (usunięte przy zamykaniu)
+    i katalog oznaczony jako otwarty - inaczej spóźnione zdarzenia liczyłyby
+    znane IP jako nowe w unique_ips."""
+    schema = schema_name(month)
+    for rollup, bucket_format in ROLLUP_BUCKETS:
+        conn.execute(f'''
+            INSERT OR IGNORE INTO ssh_rollup_seen_ips (rollup, bucket, status, ip_address)
+            SELECT DISTINCT ?, strftime(?, timestamp), status, ip_address
+            FROM {schema}.ssh_logs
+            WHERE timestamp IS NOT NULL
+        ''', (rollup, bucket_format))
+    conn.execute("UPDATE ssh_partitions SET sealed_at = NULL WHERE month = ?", (month,))
+    conn.commit()
+
+def _rebuild_views(conn, months):
+    conn.execute("DROP VIEW IF EXISTS temp.ssh_logs")
+    conn.execute("DROP VIEW IF EXISTS temp.ssh_logs_latest")
+    arms = [f"SELECT * FROM {schema_name(m)}.ssh_logs" for m in months]
+    conn.execute("CREATE TEMP VIEW ssh_logs AS " + " UNION ALL ".join(arms))
+    # MAX() osobno per partycja - min/max z indeksu zamiast skanu widoku
+    latest = [f"SELECT (SELECT MAX(id) FROM {schema_name(m)}.ssh_logs) as id, "
+              f"(SELECT MAX(timestamp) FROM {schema_name(m)}.ssh_logs) as timestamp" for m in months]
+    conn.execute(f'''
+        CREATE TEMP VIEW ssh_logs_latest AS
+        SELECT MAX(id) as id, MAX(timestamp) as timestamp FROM ({" UNION ALL ".join(latest)})
+    ''')
+
+def _detach(conn, month):
+    """DETACH partycji; widoki odwołujące się do niej budujemy od nowa"""
+    conn.execute("DETACH DATABASE " + schema_name(month))
+    remaining = attached_months(conn)
+    if remaining:
+        _rebuild_views(conn, remaining)
+    else:
+        conn.execute("DROP VIEW IF EXISTS temp.ssh_logs")
+        conn.execute("DROP VIEW IF EXISTS temp.ssh_logs_latest")
+
+def _empty_views(conn):
+    """Czytelnik bez żadnej partycji (np. przed pierwszym zdarzeniem miesiąca) - puste widoki"""
+    conn.execute("DROP VIEW IF EXISTS temp.ssh_logs")
+    conn.execute("DROP VIEW IF EXISTS temp.ssh_logs_latest")
+    conn.execute('''
+        CREATE TEMP VIEW ssh_logs AS
+        SELECT NULL as id, NULL as timestamp, NULL as username, NULL as ip_address, NULL as port,
+               NULL as status, NULL as message, NULL as created_at, NULL as dns_name
+        WHERE 0
+    ''')
+    conn.execute("CREATE TEMP VIEW ssh_logs_latest AS SELECT NULL as id, NULL as timestamp")
+
+def attach(conn, extra_months=(), writable=False):
+    """Dołącz otwarte partycje (najnowsze SSH_MAX_ATTACHED) i odbuduj widoki.
+
+    Wołane przez db.connect() i okresowo przez długo żyjące połączenia; bez
+    zmian to tylko listowanie katalogu. Czytelnik (writable=False) dołącza
+    tylko istniejące pliki .db, tylko do odczytu. Zapisujący (parser, migracje)
+    tworzy partycję bieżącego miesiąca i rozpakowuje zamknięte extra_months.
+    W trakcie transakcji nie zmienia niczego (ATTACH/DETACH są wtedy
+    niedozwolone) i zwraca False.
+    """
+    if not _ready(conn):
+        return False
+    partitions = list_partitions()
+    months = {m for m, sealed in partitions.items() if not sealed}
+    if writable:
+        months.add(current_month())
+        months |= set(extra_months)
+    else:
+        extra_months = ()
+    # Spóźnione zdarzenia (extra_months) dołączamy ponad limit
+    wanted = sorted(set(sorted(months, reverse=True)[:Config.SSH_MAX_ATTACHED]) | set(extra_months),
+                    reverse=True)
+
+    current = attached_months(conn)
+    if current == wanted and _scalar(conn, "SELECT 1 FROM temp.sqlite_master WHERE name = 'ssh_logs'"):
+        return True
+    if conn.in_transaction:
+        return False
+
+    for month in current:
+        if month not in wanted:
+            conn.execute("DETACH DATABASE " + schema_name(month))
+    for month in wanted:
+        if month in current:
+            continue
+        if partitions.get(month) is True:
+            _unseal(month)
+            _attach(conn, month)
+            _reopen(conn, month)
+        elif month in partitions:
+            _attach(conn, month, writable)
+        else:
+            _create(conn, month)
+    if wanted:
+        _rebuild_views(conn, wanted)
+    else:
+        _empty_views(conn)
+    return True
+
+def ensure(conn, months):
+    """Partycje dla miesięcy wstawianych zdarzeń muszą być dołączone.
+
+    Brakująca partycja (przełom miesiąca w trybie --follow, spóźnione zdarzenia
+    z zamkniętego miesiąca) wymaga ATTACH poza transakcją - parser woła
+    ensure() przed rozpoczęciem paczki. W trakcie transakcji nie zatwierdzamy
+    cudzych zapisów, tylko zgłaszamy błąd.
+    """
+    missing = set(months) - set(attached_months(conn))
+    if not missing:
+        return
+    if conn.in_transaction:
+        raise RuntimeError(f"SSH partitions {', '.join(sorted(missing))} must be attached "
+                           "before the insert transaction starts")
+    attach(conn, extra_months=sorted(missing), writable=True)
+
+def seed_sequence(conn, month):
+    """Następne id partycji większe niż największe id w pozostałych partycjach"""
+    schema = schema_name(month)
+    conn.execute(f"UPDATE {schema}.sqlite_sequence SET seq = ? WHERE name = 'ssh_logs' AND seq < ?",
+                 (_global_max_id(conn),) * 2)
+
+def insert_table(month):
+    return f"{schema_name(month)}.ssh_logs"
+
+def update_catalog(conn, month, events):
+    """Spóźnione zdarzenia w ponownie otwartym miesiącu - statystyki katalogu
+    (last_id dla _global_max_id) nadążają za partycją; dla pozostałych no-op"""
+    timestamps = [event[0] for event in events if event[0] is not None]
+    conn.execute(f'''
+        UPDATE ssh_partitions SET
+            rows = rows + ?,
+            last_id = MAX(last_id, (SELECT seq FROM {schema_name(month)}.sqlite_sequence WHERE name = 'ssh_logs')),
+            first_ts = MIN(first_ts, COALESCE(?, first_ts)),
+            last_ts = MAX(last_ts, COALESCE(?, last_ts))
+        WHERE month = ?
+    ''', (len(events), min(timestamps, default=None), max(timestamps, default=None), month))
+
+def raw_since(conn):
+    """Początek najstarszej dołączonej partycji - starsze surowe logi są w archiwum"""
+    months = attached_months(conn)
+    return month_start(months[-1]) if months else None
+
+def _catalog(conn, month, schema):
+    """Statystyki zamykanej partycji do tabeli ssh_partitions w monitor.db"""
+    row = conn.execute(f'''
+        SELECT COUNT(*), MIN(id), MAX(id), MIN(timestamp), MAX(timestamp) FROM {schema}.ssh_logs
+    ''').fetchone()
+    conn.execute('''
+        INSERT OR REPLACE INTO ssh_partitions (month, rows, first_id, last_id, first_ts, last_ts, sealed_at)
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now', 'localtime'))
+    ''', (month,) + tuple(row))
+    # Kubełki zamkniętego miesiąca się nie zmieniają - zbiory IP do unique_ips są zbędne
+    conn.execute('''
+        DELETE FROM ssh_rollup_seen_ips WHERE bucket >= ? AND bucket < ?
+    ''', (month_start(month).strftime('%Y-%m-%d'), month_start(next_month(month)).strftime('%Y-%m-%d')))
+    conn.commit()
+
+def seal(conn, month):
+    """Zamknij miesiąc: statystyki, VACUUM INTO, gzip, usunięcie pliku .db"""
+    schema = schema_name(month)
+    if month not in attached_months(conn):
+        _attach(conn, month)
+    _catalog(conn, month, schema)
+    _detach(conn, month)
+
+    path = partition_path(month)
+    compact = path + '.compact'
+    if os.path.exists(compact):
+        os.unlink(compact)
+    part = sqlite3.connect(path)
+    try:
+        part.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        part.execute("VACUUM INTO ?", (compact,))
+    finally:
+        part.close()
+
+    sealed = partition_path(month, sealed=True)
+    with open(compact, 'rb') as src, gzip.open(sealed + '.tmp', 'wb', compresslevel=Config.SSH_SEAL_COMPRESSLEVEL) as dst:
+        shutil.copyfileobj(src, dst)
+    os.chmod(sealed + '.tmp', 0o444)
+    os.replace(sealed + '.tmp', sealed)
+    for leftover in (compact, path, path + '-wal', path + '-shm'):
+        if os.path.exists(leftover):
+            os.unlink(leftover)
+    print(f"Sealed SSH partition {month} -> {sealed}")
+
+def maintain(conn, now=None):
+    """Zamknij miesiące po SSH_SEAL_AFTER_DAYS, usuń archiwa starsze niż retencja"""
+    now = now or datetime.now()
+    sealed, dropped = [], []
+    if not _ready(conn):
+        return sealed, dropped
+    if conn.in_transaction:
+        conn.commit()
+
+    this_month = now.strftime('%Y-%m')
+    oldest_kept = month_start(this_month)
+    for _ in range(Config.SSH_RETENTION_MONTHS):
+        oldest_kept = (oldest_kept - timedelta(days=1)).replace(day=1)
+
+    for month, is_sealed in sorted(list_partitions().items()):
+        if month_start(month) < oldest_kept:
+            for path in (partition_path(month, sealed=True), partition_path(month)):
+                if os.path.exists(path):
+                    if month in attached_months(conn):
+                        _detach(conn, month)
+                    os.unlink(path)
+            conn.execute("DELETE FROM ssh_partitions WHERE month = ?", (month,))
+            conn.execute('''
+                DELETE FROM ssh_rollup_seen_ips WHERE bucket >= ? AND bucket < ?
+            ''', (month_start(month).strftime('%Y-%m-%d'), month_start(next_month(month)).strftime('%Y-%m-%d')))
+            conn.commit()
+            dropped.append(month)
+        elif (not is_sealed and month < this_month
+              and now >= month_start(next_month(month)) + timedelta(days=Config.SSH_SEAL_AFTER_DAYS)):
+            seal(conn, month)
+            sealed.append(month)
+
+    attach(conn, writable=True)
+    return sealed, dropped
+
+def adopt_main_table(conn):
+    """Przenieś ssh_logs z monitor.db do partycji miesięcznych (jednorazowo, po migracjach).
+
+    Kopiowanie per miesiąc z zachowaniem id (INSERT OR IGNORE - przerwane
+    przenoszenie można powtórzyć), potem DROP TABLE i incremental_vacuum.
+    """
+    if not has_legacy_table(conn):
+        return False
+    if conn.in_transaction:
+        conn.commit()
+    print("Moving ssh_logs into monthly partitions...")
+    months = [row[0] for row in conn.execute('''
+        SELECT DISTINCT substr(timestamp, 1, 7) FROM main.ssh_logs WHERE timestamp IS NOT NULL
+    ''')]
+    this_month = current_month()
+    if this_month not in months:
+        months.append(this_month)
+
+    for month in sorted(months):
+        schema = schema_name(month)
+        if os.path.exists(partition_path(month)):
+            _attach(conn, month)
+        else:
+            os.makedirs(partition_dir(), exist_ok=True)
+            _attach(conn, month)
+            conn.execute(f"PRAGMA {schema}.journal_mode=WAL")
+            for sql in PARTITION_SCHEMA:
+                conn.execute(sql.format(schema=schema))
+        if month == this_month:
+            # Zdarzenia bez znacznika czasu trafiają do bieżącego miesiąca
+            where, params = "timestamp IS NULL OR (timestamp >= ? AND timestamp < ?)", (month, next_month(month))
+        else:
+            where, params = "timestamp >= ? AND timestamp < ?", (month, next_month(month))
+        cursor = conn.execute(f"INSERT OR IGNORE INTO {schema}.ssh_logs SELECT * FROM main.ssh_logs WHERE {where}", params)
+        if month == this_month:
+            # Sekwencja nie może cofnąć się poniżej id usuniętych wcześniej wierszy
+            conn.execute(f'''
+                INSERT OR REPLACE INTO {schema}.sqlite_sequence (name, seq)
+                SELECT 'ssh_logs', MAX(COALESCE((SELECT seq FROM main.sqlite_sequence WHERE name = 'ssh_logs'), 0),
+                                       COALESCE((SELECT MAX(id) FROM {schema}.ssh_logs), 0))
+            ''')
+        conn.commit()
+        conn.execute("DETACH DATABASE " + schema)
+        print(f"  {month}: {cursor.rowcount} rows")
+
+    conn.execute("DROP TABLE main.ssh_logs")
+    conn.commit()
+    if _scalar(conn, "PRAGMA auto_vacuum") == 2:
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+    return True
+
+def open_archive(conn, month):
+    """Dołącz zamknięty miesiąc do odczytu (kopia rozpakowana w SSH_ARCHIVE_CACHE_DIR).
+
+    Zwraca nazwę schematu, np. zapytanie: SELECT ... FROM ssh_archive_2026_01.ssh_logs
+    """
+    os.makedirs(Config.SSH_ARCHIVE_CACHE_DIR, exist_ok=True)
+    sealed = partition_path(month, sealed=True)
+    cached = os.path.join(Config.SSH_ARCHIVE_CACHE_DIR, os.path.basename(sealed)[:-len('.gz')])
+    if not os.path.exists(cached) or os.path.getmtime(cached) < os.path.getmtime(sealed):
+        with gzip.open(sealed, 'rb') as src, open(cached + '.tmp', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(cached + '.tmp', cached)
+    os.chmod(cached, 0o444)
+    schema = 'ssh_archive_' + month.replace('-', '_')
+    conn.execute("ATTACH DATABASE ? AS " + schema, (cached,))
+    return schema
+
+if __name__ == "__main__":
+    import db
+    args = sys.argv[1:]
+    conn = db.connect(writer='--maintain' in args)
+    if '--maintain' in args:
+        sealed, dropped = maintain(conn)
+        print(f"Sealed: {', '.join(sealed) or '-'}; dropped: {', '.join(dropped) or '-'}")
+    if '--open' in args:
+        month = args[args.index('--open') + 1]
+        schema = open_archive(conn, month)
+        print(conn.execute(f"SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM {schema}.ssh_logs").fetchone())
+    for month, is_sealed in sorted(list_partitions().items()):
+        state = 'sealed' if is_sealed else ('attached' if month in attached_months(conn) else 'open')
+        print(f"{month}  {state}")
+    conn.close()
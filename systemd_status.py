@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Status jednostek systemd jednym wywołaniem `systemctl show` dla wielu unitów
+- bez powłoki, jeden fork/exec na odświeżenie zamiast jednego na serwis
+- przy okazji pamięć (MemoryCurrent) i czas CPU (CPUUsageNSec) z cgroup
+- krótki cache per unit (Config.SYSTEMCTL_CACHE_TTL)
+"""
+import subprocess
+import sys
+import threading
+import time
+from config import Config
+
+SHOW_PROPERTIES = 'Id,LoadState,ActiveState,SubState,MainPID,MemoryCurrent,CPUUsageNSec'
+
+# systemd wypisuje UINT64_MAX albo "[not set]" gdy accounting jest wyłączony
+_UNSET = ('', '[not set]', '18446744073709551615')
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _int_or_none(value):
+    if value in _UNSET:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+def _unknown(unit):
+    return {'unit': unit, 'id': None, 'load_state': None, 'active_state': 'unknown',
+            'sub_state': None, 'main_pid': None, 'memory_bytes': None, 'cpu_nsec': None}
+
+def _parse_block(unit, block):
+    props = {}
+    for line in block.splitlines():
+        key, sep, value = line.partition('=')
+        if sep:
+            props[key] = value.strip()
+    main_pid = _int_or_none(props.get('MainPID', ''))
+    return {
+        'unit': unit,
+        'id': props.get('Id'),
+        'load_state': props.get('LoadState'),
+        'active_state': props.get('ActiveState') or 'unknown',
+        'sub_state': props.get('SubState'),
+        'main_pid': main_pid or None,
+        'memory_bytes': _int_or_none(props.get('MemoryCurrent', '')),
+        'cpu_nsec': _int_or_none(props.get('CPUUsageNSec', '')),
+    }
+
+def query_units(units):
+    """Jedno `systemctl show` dla wszystkich unitów - {unit: status}"""
+    units = list(units)
+    if not units:
+        return {}
+    cmd = [Config.SYSTEMCTL_BIN, 'show', '-p', SHOW_PROPERTIES, '--'] + units
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"[ERROR] systemctl show failed: {e}", file=sys.stderr)
+        return {unit: _unknown(unit) for unit in units}
+
+    # Bloki są w kolejności argumentów; Id może się różnić od nazwy (alias, np. sshd -> ssh.service)
+    blocks = [b for b in result.stdout.split('\n\n') if b.strip()]
+    if len(blocks) != len(units):
+        print(f"[ERROR] systemctl show returned {len(blocks)} blocks for {len(units)} units "
+              f"(rc={result.returncode}): {result.stderr.strip()}", file=sys.stderr)
+        return {unit: _unknown(unit) for unit in units}
+
+    return {unit: _parse_block(unit, block) for unit, block in zip(units, blocks)}
+
+def get_unit_statuses(units):
+    """Statusy z cache; przeterminowane unity odświeża jednym wywołaniem.
+
+    systemctl (do 5 s) leci poza blokadą - blokada chroni tylko słownik,
+    więc wątki z aktualnym cache nie czekają na cudze wywołanie.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        cached = {u: _cache[u][1] for u in units if u in _cache and _cache[u][0] > now}
+    stale = [u for u in units if u not in cached]
+    if stale:
+        fresh = query_units(stale)
+        expires_at = time.monotonic() + Config.SYSTEMCTL_CACHE_TTL
+        with _cache_lock:
+            for unit, status in fresh.items():
+                _cache[unit] = (expires_at, status)
+        cached.update(fresh)
+    return {unit: cached[unit] for unit in units}
+
+def summarize(status):
+    """Pola dla JSON API: aktywność, pamięć w MB i CPU w sekundach"""
+    return {
+        'active': status['active_state'] == 'active',
+        'status': status['active_state'],
+        'sub_state': status['sub_state'],
+        'main_pid': status['main_pid'],
+        'memory_mb': round(status['memory_bytes'] / (1024**2), 1) if status['memory_bytes'] is not None else None,
+        'cpu_seconds': round(status['cpu_nsec'] / 1e9, 1) if status['cpu_nsec'] is not None else None,
+    }
@@ -1,24 +1,20 @@
 #!/usr/bin/env python3
-import subprocess
-
-def run_command(cmd):
-    try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=5)
-        print(f"Command: {cmd}")
-        print(f"Return code: {result.returncode}")
-        print(f"Stdout: '{result.stdout.strip()}'")
-        print(f"Stderr: '{result.stderr.strip()}'")
-        return result.stdout.strip(), result.returncode
-    except Exception as e:
-        print(f"Exception: {e}")
-        return None, -1
+"""
+Ręczny test statusu serwisów przez systemd_status (jedno `systemctl show`)
+Usage: python3 test_systemctl.py [unit ...]
+"""
+import sys
+import systemd_status
 
 # Test
-services = ['instagram-gallery', 'sshd', 'docker', 'cron']
+services = sys.argv[1:] or ['instagram-gallery', 'sshd', 'docker', 'cron']
 
+statuses = systemd_status.query_units(services)
 for service in services:
     print("=" * 50)
-    output, returncode = run_command(f"systemctl is-active {service}")
-    active = (returncode == 0 and output == 'active')
-    print(f"Active: {active}")
+    status = statuses[service]
+    print(f"Unit: {service} (Id: {status['id']}, LoadState: {status['load_state']})")
+    print(f"ActiveState: {status['active_state']}, SubState: {status['sub_state']}")
+    print(f"MainPID: {status['main_pid']}, Memory: {status['memory_bytes']}, CPU ns: {status['cpu_nsec']}")
+    print(f"Active: {systemd_status.summarize(status)['active']}")
     print()
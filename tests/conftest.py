@@ -0,0 +1,22 @@
+"""
+Wspólne fixtury testów: katalog repozytorium w sys.path i baza w katalogu tymczasowym
+Uruchamianie: python3 -m pytest tests
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    """Config.DB_FILE i partycje ssh_logs w tmp_path, schema po migracjach"""
+    import db
+    monkeypatch.setattr(Config, 'DB_FILE', str(tmp_path / 'monitor.db'))
+    monkeypatch.setattr(Config, 'SSH_PARTITION_DIR', str(tmp_path / 'ssh_logs'))
+    monkeypatch.setattr(Config, 'SSH_ARCHIVE_CACHE_DIR', str(tmp_path / 'archive'))
+    monkeypatch.setattr(Config, 'BRUTE_FORCE_JAIL_CONFIG', None)
+    db.init_db()
+    return Config.DB_FILE
@@ -0,0 +1,128 @@
+from datetime import datetime, timezone
+import smtplib
+import sqlite3
+import pytest
+import alert_manager
+import db
+from config import Config
+
+T0 = 1_800_000_000.0
+
+class FakeSmtp:
+    """Serwer SMTP w pamięci; fail = wyjątek dla kolejnych wywołań sendmail (None = sukces)"""
+    connections = 0
+    sent = []
+    fail = []
+    refuse_connect = False
+
+    def __init__(self, host, port, timeout=None):
+        if FakeSmtp.refuse_connect:
+            raise ConnectionRefusedError("connection refused")
+        FakeSmtp.connections += 1
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def sendmail(self, sender, recipients, message):
+        error = FakeSmtp.fail.pop(0) if FakeSmtp.fail else None
+        if error is not None:
+            raise error
+        FakeSmtp.sent.append(recipients)
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def outbox(db_file, monkeypatch):
+    for name, value in (('EMAIL_FROM', 'monitor@example.com'), ('EMAIL_TO', 'admin@example.com'),
+                        ('SMTP_HOST', 'localhost'), ('SMTP_PORT', 25), ('SMTP_USER', 'u'), ('SMTP_PASS', 'p')):
+        monkeypatch.setattr(Config, name, value, raising=False)
+    monkeypatch.setattr(smtplib, 'SMTP', FakeSmtp)
+    monkeypatch.setattr(FakeSmtp, 'connections', 0)
+    monkeypatch.setattr(FakeSmtp, 'sent', [])
+    monkeypatch.setattr(FakeSmtp, 'fail', [])
+    monkeypatch.setattr(FakeSmtp, 'refuse_connect', False)
+    conn = db.connect(row_factory=sqlite3.Row)
+    yield conn
+    conn.close()
+
+def _alert(conn, created, alert_type='security_ban', details='203.0.113.5'):
+    created_at = datetime.fromtimestamp(created, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute("INSERT INTO alerts (alert_type, severity, message, details, created_at) VALUES (?, ?, ?, ?, ?)",
+                 (alert_type, 'critical', 'banned', details, created_at))
+    conn.commit()
+
+def _queue(conn, count, created=T0):
+    for n in range(count):
+        conn.execute('''
+            INSERT INTO email_outbox (subject, recipients, message, next_attempt_at, created_at)
+            VALUES ('s', 'admin@example.com', 'm', ?, ?)
+        ''', (created, created))
+    conn.commit()
+
+def _outbox(conn):
+    return [tuple(row) for row in conn.execute(
+        "SELECT state, attempts, next_attempt_at FROM email_outbox ORDER BY id")]
+
+def test_alerts_coalesce_into_one_digest(outbox):
+    for n in range(3):
+        _alert(outbox, T0 + n, details=f'203.0.113.{n}')
+    _alert(outbox, T0, alert_type='failed_login')
+    # Najstarszy alert czeka EMAIL_COALESCE_SECONDS na kolejne
+    assert alert_manager.enqueue_alerts(outbox, T0 + 10) == 0
+    assert alert_manager.enqueue_alerts(outbox, T0 + Config.EMAIL_COALESCE_SECONDS) == 1
+    assert outbox.execute("SELECT alert_count FROM email_outbox").fetchall()[0][0] == 3
+    assert outbox.execute("SELECT COUNT(*) FROM alerts WHERE email_sent = 0").fetchone()[0] == 0
+
+    # Kolejny digest najwcześniej po EMAIL_DIGEST_INTERVAL
+    _alert(outbox, T0 + 100)
+    assert alert_manager.enqueue_alerts(outbox, T0 + 200) == 0
+    assert alert_manager.enqueue_alerts(outbox, T0 + Config.EMAIL_COALESCE_SECONDS
+                                        + Config.EMAIL_DIGEST_INTERVAL) == 1
+
+def test_batch_goes_over_one_connection(outbox):
+    _queue(outbox, 3)
+    assert alert_manager.deliver(outbox, T0) == (3, 0)
+    assert FakeSmtp.connections == 1
+    assert [state for state, _, _ in _outbox(outbox)] == ['sent'] * 3
+    assert alert_manager.deliver(outbox, T0 + 1) == (0, 0)
+
+def test_failed_connection_backs_off_exponentially(outbox, monkeypatch):
+    monkeypatch.setattr(Config, 'EMAIL_MAX_ATTEMPTS', 3)
+    _queue(outbox, 2)
+    FakeSmtp.refuse_connect = True
+    assert alert_manager.deliver(outbox, T0) == (0, 2)
+    assert _outbox(outbox) == [('pending', 1, T0 + Config.EMAIL_RETRY_BASE)] * 2
+
+    # Przed terminem nic nie jest należne
+    assert alert_manager.deliver(outbox, T0 + Config.EMAIL_RETRY_BASE - 1) == (0, 0)
+    now = T0 + Config.EMAIL_RETRY_BASE
+    assert alert_manager.deliver(outbox, now) == (0, 2)
+    assert _outbox(outbox)[0] == ('pending', 2, now + 2 * Config.EMAIL_RETRY_BASE)
+
+    # Trzecia nieudana próba = EMAIL_MAX_ATTEMPTS - wiadomość zostaje jako 'failed'
+    assert alert_manager.deliver(outbox, now + 2 * Config.EMAIL_RETRY_BASE) == (0, 2)
+    assert _outbox(outbox) == [('failed', 3, None)] * 2
+    assert alert_manager.deliver(outbox, now + Config.EMAIL_RETRY_MAX) == (0, 0)
+
+def test_refused_recipient_does_not_stop_the_batch(outbox):
+    _queue(outbox, 3)
+    FakeSmtp.fail = [None, smtplib.SMTPRecipientsRefused({'admin@example.com': (550, b'no')}), None]
+    assert alert_manager.deliver(outbox, T0) == (2, 1)
+    assert [state for state, _, _ in _outbox(outbox)] == ['sent', 'pending', 'sent']
+
+    # Zerwane połączenie odkłada resztę paczki
+    _queue(outbox, 2, created=T0 + 1)
+    FakeSmtp.fail = [smtplib.SMTPServerDisconnected('gone')]
+    assert alert_manager.deliver(outbox, T0 + 1) == (0, 2)
+
+def test_retry_delay_is_capped():
+    assert [alert_manager.retry_delay(n) for n in (1, 2, 3)] == \
+        [Config.EMAIL_RETRY_BASE, 2 * Config.EMAIL_RETRY_BASE, 4 * Config.EMAIL_RETRY_BASE]
+    assert alert_manager.retry_delay(50) == Config.EMAIL_RETRY_MAX
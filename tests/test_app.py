@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import app as dashboard
+import db
+
+@pytest.fixture
+def client(db_file):
+    dashboard.app.config['TESTING'] = True
+    return dashboard.app.test_client()
+
+def test_range_with_utc_offset(client):
+    end = datetime.now(timezone(timedelta(hours=2))).replace(microsecond=0)
+    start = end - timedelta(hours=6)
+    query = {'from': start.isoformat(), 'to': end.isoformat()}
+    for path in ('/api/ssh_timeline', '/api/system_history', '/api/network_history'):
+        assert client.get(path, query_string=query).status_code == 200, path
+    # Odwrócony zakres z przesunięciem to nadal 400, a nie TypeError
+    reversed_range = {'from': end.isoformat(), 'to': start.isoformat()}
+    assert client.get('/api/ssh_timeline', query_string=reversed_range).status_code == 400
+
+def test_range_mixing_offset_and_local_time(client):
+    local_end = datetime.now().replace(microsecond=0)
+    aware_start = (local_end - timedelta(hours=1)).astimezone(timezone.utc)
+    query = {'from': aware_start.isoformat(), 'to': local_end.isoformat()}
+    assert client.get('/api/system_history', query_string=query).status_code == 200
+
+@pytest.fixture
+def quiet_dashboard(client, monkeypatch):
+    """Bez wątku samplera i podprocesów: stała migawka i stałe sekcje na żywo"""
+    monkeypatch.setattr(dashboard, 'start_system_sampler', lambda: None)
+    monkeypatch.setattr(dashboard, '_system_snapshot', {'cpu_percent': 1.0})
+    monkeypatch.setattr(dashboard, '_live_sections', {})
+    dashboard._snapshot_ready.set()
+    calls = []
+    for name in ('_systemd_services_data', '_disk_partitions_data', '_cached_apps_data',
+                 '_banned_ips_data', '_fail2ban_config_data'):
+        monkeypatch.setattr(dashboard, name, lambda name=name: calls.append(name) or [name])
+    return calls
+
+def test_dashboard_unchanged_data_gives_304(client, quiet_dashboard):
+    first = client.get('/api/dashboard')
+    assert first.status_code == 200
+    body = first.get_json()
+    assert set(body['sections']) == set(body['versions'])
+    assert len(quiet_dashboard) == 5
+
+    # Bez nowych danych: ten sam ETag, a sprawdzenie wersji nie woła sekcji na żywo
+    second = client.get('/api/dashboard', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert len(quiet_dashboard) == 5
+
+    # Nowy log SSH zmienia tylko sekcje zależne od ssh_logs
+    conn = db.connect(writer=True)
+    db.insert_ssh_events(conn.cursor(), [(datetime.now(), 'root', '203.0.113.9', None, 22, 'failed', 'x')])
+    conn.commit()
+    conn.close()
+    known = ','.join(f"{name}:{version}" for name, version in body['versions'].items())
+    third = client.get('/api/dashboard', query_string={'known': known},
+                       headers={'If-None-Match': first.headers['ETag']})
+    assert third.status_code == 200
+    assert set(third.get_json()['sections']) == {'stats', 'ssh_timeline', 'top_ips', 'trusted_hosts',
+                                                 'recent_logs'}
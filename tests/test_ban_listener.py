@@ -0,0 +1,101 @@
+import signal
+import socket
+import threading
+import time
+import pytest
+import ban_listener
+import create_ban_alert
+import db
+from ban_listener import BanQueue, alert_for, parse_command
+from config import Config
+
+def test_queue_keeps_ban_unban_ban_order():
+    queue = BanQueue()
+    for action in ('ban', 'ban', 'unban', 'ban', 'ban'):
+        queue.add(action, '203.0.113.5')
+    queue.add('ban', '198.51.100.7')
+    assert queue.take() == [('ban', '203.0.113.5'), ('unban', '203.0.113.5'), ('ban', '203.0.113.5'),
+                            ('ban', '198.51.100.7')]
+    # Nowa paczka nie pamięta akcji z poprzedniej
+    queue.add('ban', '203.0.113.5')
+    assert queue.take() == [('ban', '203.0.113.5')]
+
+def test_failed_batch_goes_back_before_newer_events():
+    queue = BanQueue()
+    queue.add('ban', '203.0.113.5')
+    failed = queue.take()
+    queue.add('unban', '203.0.113.5')
+    queue.put_back(failed)
+    assert queue.take() == [('ban', '203.0.113.5'), ('unban', '203.0.113.5')]
+
+def test_parse_command():
+    assert parse_command('ban 2001:db8::0001') == ('ban', '2001:db8::1')
+    for line in ('ban', 'kick 1.2.3.4', 'ban not-an-ip'):
+        with pytest.raises(ValueError):
+            parse_command(line)
+    assert alert_for('unban', '1.2.3.4')[:2] == ('security_unban', 'info')
+
+@pytest.fixture
+def listener(db_file, tmp_path, monkeypatch):
+    """BanServer i wątek zapisu jak w serve(), zatrzymywane po teście"""
+    path = str(tmp_path / 'bans.sock')
+    monkeypatch.setattr(Config, 'BAN_SOCKET', path)
+    monkeypatch.setattr(Config, 'BAN_FLUSH_INTERVAL', 0.05)
+    queue = ban_listener.BanQueue()
+    server = ban_listener.BanServer(path, queue)
+    stop = threading.Event()
+    threads = [threading.Thread(target=server.serve_forever),
+               threading.Thread(target=ban_listener._writer_loop, args=(queue, stop))]
+    for thread in threads:
+        thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+def _alerts():
+    conn = db.connect()
+    try:
+        return conn.execute("SELECT alert_type, details FROM alerts ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+def _wait_for_alerts(count):
+    deadline = time.monotonic() + 5
+    while len(_alerts()) < count and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return _alerts()
+
+def test_client_events_are_written_in_order(listener):
+    assert create_ban_alert.send_to_listener('ban', '203.0.113.5')
+    assert create_ban_alert.send_to_listener('unban', '203.0.113.5')
+    with pytest.raises(ValueError):
+        create_ban_alert.send_to_listener('kick', '203.0.113.5')
+    assert _wait_for_alerts(2) == [('security_ban', '203.0.113.5'), ('security_unban', '203.0.113.5')]
+
+def test_idle_client_is_closed(listener, monkeypatch):
+    monkeypatch.setattr(ban_listener.BanHandler, 'timeout', 0.1)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(listener)
+        sock.sendall(b"ban 198.51.100.7\n")
+        assert sock.recv(16) == b"ok\n"
+        # Bez EOF od klienta serwer zamyka połączenie po BanHandler.timeout
+        assert sock.recv(16) == b""
+    assert _wait_for_alerts(1) == [('security_ban', '198.51.100.7')]
+
+def test_client_writes_directly_without_listener(db_file, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'BAN_SOCKET', str(tmp_path / 'missing.sock'))
+    create_ban_alert.trigger_ban_alert('203.0.113.9')
+    assert _alerts() == [('security_ban', '203.0.113.9')]
+
+def test_bind_failure_leaves_no_writer_thread(db_file, tmp_path, monkeypatch):
+    # Ścieżka dłuższa niż limit AF_UNIX - bind kończy się błędem
+    monkeypatch.setattr(Config, 'BAN_SOCKET', str(tmp_path / ('x' * 120) / 'bans.sock'))
+    monkeypatch.setattr(signal, 'signal', lambda *args: None)
+    before = threading.active_count()
+    with pytest.raises(OSError):
+        ban_listener.serve()
+    assert threading.active_count() == before
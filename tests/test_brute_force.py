@@ -0,0 +1,70 @@
+import time
+from datetime import datetime
+import db
+from brute_force import BruteForceDetector, Rule, SlidingWindow
+
+RULES = [Rule('1m', 60, 10, 'critical'), Rule('10m', 600, 20, 'warning'),
+         Rule('1h', 3600, 50, 'warning'), Rule('jail', 600, 4, 'warning')]
+
+def _failed(t, ip='192.0.2.10'):
+    return (datetime.fromtimestamp(t), 'root', ip, None, 22, 'failed', 'Failed password')
+
+def _alerts(conn):
+    return conn.execute("SELECT severity, message FROM alerts ORDER BY id").fetchall()
+
+def test_sliding_window_expires_old_buckets():
+    window = SlidingWindow(60, 60)
+    for t in range(1000, 1030):
+        window.add(t)
+    assert window.total == 30
+    # Okno [1002, 1061]: kubełki 1000 i 1001 wypadają
+    assert window.add(1061) == 29
+    window.expire(1200)
+    assert window.total == 0
+
+def test_sliding_window_late_event_lands_in_its_bucket():
+    window = SlidingWindow(60, 6)
+    window.add(1000)
+    window.add(1050)
+    assert window.add(1020) == 3
+    # Za stare względem najnowszego kubełka - pomijane
+    assert window.add(900) == 3
+
+def test_one_alert_per_burst_with_escalation(db_file):
+    conn = db.connect()
+    cursor = conn.cursor()
+    detector = BruteForceDetector(RULES)
+    now = time.time()
+    # 60 prób w 50 s przekracza wszystkie cztery reguły
+    detector.observe(cursor, [_failed(now - 50 + i * 50 / 60) for i in range(60)])
+    alerts = _alerts(conn)
+    # jail (warning) przy 5. próbie, potem tylko eskalacja do critical z okna 1 min
+    assert [severity for severity, _message in alerts] == ['warning', 'critical']
+    assert 'fail2ban findtime' in alerts[0][1]
+    assert 'last 1 min' in alerts[1][1]
+    assert conn.execute("SELECT COUNT(*) FROM detector_state").fetchone()[0] == 4
+    conn.close()
+
+def test_dedupe_survives_restart(db_file):
+    conn = db.connect()
+    cursor = conn.cursor()
+    now = time.time()
+    detector = BruteForceDetector(RULES)
+    detector.observe(cursor, [_failed(now - 30 + i) for i in range(12)])
+    conn.commit()
+    count = len(_alerts(conn))
+
+    restarted = BruteForceDetector(RULES)
+    restarted.load(cursor)
+    restarted.observe(cursor, [_failed(now - 17 + i) for i in range(5)])
+    assert len(_alerts(conn)) == count
+    conn.close()
+
+def test_other_ips_are_independent(db_file):
+    conn = db.connect()
+    cursor = conn.cursor()
+    detector = BruteForceDetector(RULES)
+    now = time.time()
+    detector.observe(cursor, [_failed(now - 10, ip=f'198.51.100.{i}') for i in range(40)])
+    assert _alerts(conn) == []
+    conn.close()
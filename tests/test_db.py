@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+import db
+from config import Config
+
+def test_connection_pragmas(db_file):
+    conn = db.connect()
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == Config.DB_BUSY_TIMEOUT_MS
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == db.MIGRATIONS[-1][0]
+    finally:
+        conn.close()
+
+def test_insert_in_batches_keeps_every_event(db_file, monkeypatch):
+    monkeypatch.setattr(Config, 'DB_BATCH_SIZE', 7)
+    start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    events = [(start + timedelta(minutes=n), f'user{n % 4}', f'203.0.113.{n % 3}', None, 22,
+               'accepted' if n % 5 == 0 else 'failed', 'message') for n in range(30)]
+    conn = db.connect(writer=True)
+    try:
+        assert db.insert_ssh_events(conn.cursor(), events) == 30
+        conn.commit()
+        ids = [row[0] for row in conn.execute("SELECT id FROM ssh_logs ORDER BY timestamp")]
+        assert ids == sorted(ids) and len(set(ids)) == 30
+        assert conn.execute("SELECT SUM(accepted_count), SUM(failed_count) FROM ips").fetchone() == (6, 24)
+        usernames = conn.execute("SELECT usernames FROM ips WHERE ip_address = '203.0.113.0'").fetchone()[0]
+        assert set(usernames.split(',')) == {'user0', 'user1', 'user2', 'user3'}
+    finally:
+        conn.close()
+
+def test_migrations_are_idempotent(db_file):
+    db.init_db()
+    conn = db.connect()
+    try:
+        assert db.migrate(conn) == db.MIGRATIONS[-1][0]
+    finally:
+        conn.close()
@@ -0,0 +1,57 @@
+import threading
+import time
+import db
+import dns_resolver
+from dns_resolver import DnsResolver
+
+def test_lookup_never_blocks_and_results_land_in_cache(db_file, monkeypatch):
+    release = threading.Event()
+    names = {'203.0.113.1': 'scanner.example.net', '203.0.113.2': None}
+    monkeypatch.setattr(dns_resolver, 'reverse_lookup', lambda ip: release.wait(5) and names[ip])
+    conn = db.connect()
+    cursor = conn.cursor()
+    resolver = DnsResolver(workers=2, timeout=5)
+    try:
+        started = time.monotonic()
+        assert resolver.lookup(cursor, '203.0.113.1') is None
+        assert resolver.lookup(cursor, '203.0.113.2') is None
+        # To samo IP nie idzie do puli drugi raz
+        assert resolver.lookup(cursor, '203.0.113.1') is None
+        assert time.monotonic() - started < 1
+        assert resolver.pending_count() == 2
+        assert resolver.apply_results(cursor) == 0
+
+        release.set()
+        assert resolver.finish(cursor) == 2
+        conn.commit()
+        rows = dict(conn.execute("SELECT ip_address, dns_name FROM ip_dns_cache").fetchall())
+        assert rows == names
+    finally:
+        conn.close()
+
+    # Nowy resolver czyta trwały cache - bez zapytań DNS
+    monkeypatch.setattr(dns_resolver, 'reverse_lookup', lambda ip: 1 / 0)
+    conn = db.connect()
+    resolver = DnsResolver(workers=1)
+    try:
+        assert resolver.lookup(conn.cursor(), '203.0.113.1') == 'scanner.example.net'
+        assert resolver.pending_count() == 0
+    finally:
+        resolver.finish(conn.cursor(), 0)
+        conn.close()
+
+def test_slow_lookup_counts_as_missing_ptr(db_file, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(dns_resolver, 'reverse_lookup', lambda ip: release.wait(5) and 'late.example.net')
+    conn = db.connect()
+    cursor = conn.cursor()
+    resolver = DnsResolver(workers=1, timeout=0.05)
+    try:
+        resolver.lookup(cursor, '198.51.100.3')
+        time.sleep(0.2)
+        assert resolver.apply_results(cursor) == 1
+        assert conn.execute("SELECT dns_name FROM ip_dns_cache").fetchall() == [(None,)]
+    finally:
+        release.set()
+        resolver.finish(cursor, 0)
+        conn.close()
@@ -0,0 +1,33 @@
+import downsample
+
+def _rows(n):
+    # CPU ma pik w wierszu 37, pamięć w wierszu 71 - oba muszą przetrwać
+    return [{'timestamp': 1000 + 60 * i,
+             'cpu_percent': 90.0 if i == 37 else 5.0,
+             'memory_percent': 80.0 if i == 71 else 40.0,
+             'net_sent_bytes': 1000 * i}
+            for i in range(n)]
+
+def test_columns_come_from_the_same_rows():
+    rows = _rows(200)
+    data = downsample.series_columns(rows, 20, ('cpu_percent', 'memory_percent'), ('net_sent_bytes',))
+    by_ts = {row['timestamp']: row for row in rows}
+    assert len(data['timestamp']) == 20
+    for i, ts in enumerate(data['timestamp']):
+        assert data['cpu_percent'][i] == by_ts[ts]['cpu_percent']
+        assert data['memory_percent'][i] == by_ts[ts]['memory_percent']
+
+def test_peaks_of_every_gauge_are_kept():
+    data = downsample.series_columns(_rows(200), 20, ('cpu_percent', 'memory_percent'), ())
+    assert 90.0 in data['cpu_percent']
+    assert 80.0 in data['memory_percent']
+
+def test_counter_rates_per_bucket():
+    data = downsample.series_columns(_rows(200), 20, ('cpu_percent',), ('net_sent_bytes',))
+    rates = [rate for rate in data['net_sent_bytes_rate'] if rate is not None]
+    assert rates and all(abs(rate - 1000 / 60) < 0.1 for rate in rates)
+
+def test_short_series_is_returned_as_is():
+    rows = _rows(5)
+    data = downsample.series_columns(rows, 20, ('cpu_percent',), ())
+    assert data['timestamp'] == [row['timestamp'] for row in rows]
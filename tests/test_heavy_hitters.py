@@ -0,0 +1,56 @@
+import random
+from heavy_hitters import SpaceSaving
+
+def _stream(seed, size):
+    rng = random.Random(seed)
+    # Kilku dużych atakujących na tle długiego ogona
+    heavy = [f'198.51.100.{n}' for n in range(5)]
+    return [rng.choice(heavy) if rng.random() < 0.4 else f'203.0.{rng.randrange(64)}.{rng.randrange(256)}'
+            for _ in range(size)]
+
+def _bounds_hold(summary, truth):
+    for item, (count, error) in summary.counters.items():
+        assert count - error <= truth.get(item, 0) <= count
+    for item, true_count in truth.items():
+        if item not in summary.counters:
+            assert true_count <= summary.min_count()
+
+def _count(stream):
+    truth = {}
+    for item in stream:
+        truth[item] = truth.get(item, 0) + 1
+    return truth
+
+def test_update_keeps_bounds():
+    stream = _stream(1, 5000)
+    summary = SpaceSaving(50)
+    for item in stream:
+        summary.update(item)
+    assert summary.total == len(stream)
+    _bounds_hold(summary, _count(stream))
+
+def test_merge_keeps_bounds_and_heavy_hitters():
+    streams = [_stream(seed, 2000) for seed in range(6)]
+    summaries = []
+    for stream in streams:
+        summary = SpaceSaving(40)
+        for item in stream:
+            summary.update(item)
+        summaries.append(summary)
+    merged = SpaceSaving.merge(summaries, 40)
+    truth = _count([item for stream in streams for item in stream])
+    assert merged.total == sum(truth.values())
+    assert len(merged.counters) <= 40
+    _bounds_hold(merged, truth)
+    top = {item for item, _ in merged.top(5)}
+    assert top == {f'198.51.100.{n}' for n in range(5)}
+
+def test_json_roundtrip_keeps_floor():
+    summary = SpaceSaving(2)
+    for item in ('a', 'b', 'c', 'c'):
+        summary.update(item)
+    restored = SpaceSaving.from_json(2, summary.total, summary.to_json())
+    assert restored.counters == summary.counters
+    assert restored.min_count() == summary.min_count()
+    assert restored.top(1) == [('c', [3, 1])]
+    assert restored.top(1, exclude=lambda item: item == 'c') == [('b', [1, 0])]
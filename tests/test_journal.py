@@ -0,0 +1,73 @@
+import json
+import os
+from datetime import datetime
+import pytest
+import db
+import dns_resolver
+import log_parser
+
+FAKE_JOURNALCTL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_journalctl')
+
+@pytest.fixture
+def journal(db_file, tmp_path, monkeypatch):
+    """journalctl z PATH wskazuje na atrapę czytającą FAKE_JOURNAL"""
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    os.symlink(FAKE_JOURNALCTL, bin_dir / 'journalctl')
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    path = tmp_path / 'journal.json'
+    path.write_text('')
+    monkeypatch.setenv('FAKE_JOURNAL', str(path))
+    monkeypatch.setenv('FAKE_JOURNAL_LOG', str(tmp_path / 'calls.log'))
+    monkeypatch.setattr(dns_resolver, 'reverse_lookup', lambda ip_address: None)
+    monkeypatch.setattr(log_parser, '_dns_resolver', None)
+    log_parser.reset_detector()
+    yield path
+    log_parser.reset_detector()
+
+def _append(path, start, count):
+    base = int(datetime.now().replace(day=1, hour=12, minute=0, second=0, microsecond=0).timestamp())
+    with open(path, 'a') as f:
+        for n in range(start, start + count):
+            f.write(json.dumps({
+                '__CURSOR': f's=1;i={n}',
+                '__REALTIME_TIMESTAMP': str((base + n) * 1_000_000),
+                'MESSAGE': f'Failed password for root from 203.0.113.{n % 250} port {40000 + n} ssh2',
+            }) + '\n')
+        # Wpis spoza sshd - przesuwa kursor, ale nie jest zdarzeniem
+        f.write(json.dumps({'__CURSOR': f's=1;i={start + count}x', '__REALTIME_TIMESTAMP': '0',
+                            'MESSAGE': 'Server listening on 0.0.0.0 port 22.'}) + '\n')
+
+def _tail():
+    conn = db.connect(writer=True)
+    try:
+        return log_parser.tail_journal(conn), log_parser.load_journal_cursor(conn.cursor())
+    finally:
+        conn.close()
+
+def test_resumes_after_saved_cursor(journal, tmp_path):
+    _append(journal, 0, 5)
+    assert _tail() == (5, 's=1;i=5x')
+    _append(journal, 10, 3)
+    assert _tail() == (3, 's=1;i=13x')
+    calls = (tmp_path / 'calls.log').read_text().splitlines()
+    assert '--after-cursor' not in calls[0]
+    assert calls[1].endswith('--after-cursor s=1;i=5x')
+
+def test_failed_batch_keeps_cursor(journal, monkeypatch):
+    _append(journal, 0, 3)
+    assert _tail() == (3, 's=1;i=3x')
+    _append(journal, 10, 3)
+
+    def broken_insert(cursor, events):
+        raise RuntimeError("disk full")
+    with monkeypatch.context() as patch:
+        patch.setattr(log_parser, 'insert_events', broken_insert)
+        with pytest.raises(RuntimeError):
+            _tail()
+
+    # Kursor i dane wycofane razem - powtórka bierze tę samą paczkę
+    conn = db.connect()
+    assert log_parser.load_journal_cursor(conn.cursor()) == 's=1;i=3x'
+    conn.close()
+    assert _tail() == (3, 's=1;i=13x')
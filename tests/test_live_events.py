@@ -0,0 +1,25 @@
+import threading
+from live_events import EventHub
+
+def test_reader_gets_events_after_its_id():
+    hub = EventHub(size=10)
+    hub.publish('ssh', [{'id': 1}])
+    hub.publish('alert', [{'id': 2}])
+    texts, after, missed = hub.wait_for(1, 0)
+    assert (len(texts), after, missed) == (1, 2, False)
+    assert texts[0].startswith('id: 2\nevent: alert\n')
+
+def test_wait_wakes_on_publish():
+    hub = EventHub(size=10)
+    threading.Timer(0.05, hub.publish, ('ssh', [])).start()
+    texts, after, missed = hub.wait_for(hub.last_seq(), 5)
+    assert (len(texts), after, missed) == (1, 1, False)
+
+def test_reader_behind_the_buffer_must_resync():
+    hub = EventHub(size=3)
+    for n in range(6):
+        hub.publish('ssh', [{'id': n}])
+    texts, after, missed = hub.wait_for(1, 0)
+    assert (len(texts), after, missed) == (3, 6, True)
+    # Numer z poprzedniego życia procesu (większy niż bieżący)
+    assert hub.wait_for(100, 0) == ([], 6, True)
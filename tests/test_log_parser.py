@@ -0,0 +1,75 @@
+import os
+import pytest
+import db
+import dns_resolver
+import log_parser
+from config import Config
+
+@pytest.fixture
+def auth_log(db_file, tmp_path, monkeypatch):
+    """auth.log w tmp_path, świeże detektory i resolver bez zapytań DNS"""
+    path = tmp_path / 'auth.log'
+    path.write_bytes(b'')
+    monkeypatch.setattr(Config, 'AUTH_LOG', str(path))
+    monkeypatch.setattr(dns_resolver, 'reverse_lookup', lambda ip_address: None)
+    monkeypatch.setattr(log_parser, '_dns_resolver', None)
+    log_parser.reset_detector()
+    yield path
+    log_parser.reset_detector()
+
+def _lines(start, count):
+    return ''.join(f"2026-01-06T18:{n // 60:02d}:{n % 60:02d}.000000+01:00 host sshd[{100 + n}]: "
+                   f"Failed password for root from 203.0.113.{n % 250} port {40000 + n} ssh2\n"
+                   for n in range(start, start + count)).encode()
+
+def _append(path, data):
+    with open(path, 'ab') as f:
+        f.write(data)
+
+def _tail():
+    conn = db.connect(writer=True)
+    try:
+        return log_parser.tail_auth_log(conn)
+    finally:
+        conn.close()
+
+def _checkpoint():
+    conn = db.connect()
+    try:
+        return log_parser.load_checkpoint(conn.cursor(), Config.AUTH_LOG)
+    finally:
+        conn.close()
+
+def test_resumes_from_checkpoint(auth_log):
+    _append(auth_log, _lines(0, 5))
+    assert _tail() == 5
+    assert _checkpoint()['offset'] == os.path.getsize(auth_log)
+
+    # Niedokończona linia czeka na \n - checkpoint zostaje przed nią
+    _append(auth_log, _lines(5, 3) + b'2026-01-06T18:10:00 host sshd[9]: Failed pass')
+    assert _tail() == 3
+    assert _checkpoint()['offset'] == len(_lines(0, 8))
+    assert _tail() == 0
+
+def test_rotation_finishes_previous_file(auth_log):
+    _append(auth_log, _lines(0, 4))
+    assert _tail() == 4
+    # Dopisane przed rotacją, jeszcze nieprzeczytane
+    _append(auth_log, _lines(4, 2))
+    os.rename(auth_log, f"{auth_log}.1")
+    auth_log.write_bytes(_lines(6, 3))
+
+    assert _tail() == 5
+    checkpoint = _checkpoint()
+    assert checkpoint['inode'] == os.stat(auth_log).st_ino
+    assert checkpoint['offset'] == os.path.getsize(auth_log)
+
+def test_truncation_rereads_from_start(auth_log):
+    _append(auth_log, _lines(0, 6))
+    assert _tail() == 6
+    # Ten sam inode, krótszy plik z nowymi liniami
+    with open(auth_log, 'r+b') as f:
+        f.truncate(0)
+        f.write(_lines(20, 2))
+    assert _tail() == 2
+    assert _checkpoint()['offset'] == os.path.getsize(auth_log)
@@ -0,0 +1,49 @@
+import metrics_ring
+from metrics_ring import RingReader, RingWriter
+
+def test_ring_keeps_last_slots_in_order(tmp_path):
+    path = str(tmp_path / 'metrics.ring')
+    writer = RingWriter(path, slots=4)
+    reader = RingReader(path)
+    assert reader.read() == []
+    for n in range(6):
+        writer.write(1000.0 + n, float(n), 50.0, n * 10, n * 20)
+    samples = reader.read()
+    assert [s['timestamp'] for s in samples] == [1002.0, 1003.0, 1004.0, 1005.0]
+    assert samples[-1]['net_recv_bytes'] == 100
+    assert [s['timestamp'] for s in reader.read(since=1004.0)] == [1004.0, 1005.0]
+    writer.close()
+
+    # Nowy pisarz kontynuuje licznik zapisów z nagłówka
+    writer = RingWriter(path, slots=4)
+    writer.write(1006.0, 0.0, 0.0, 0, 0)
+    assert [s['timestamp'] for s in reader.read()] == [1003.0, 1004.0, 1005.0, 1006.0]
+    writer.close()
+    reader.close()
+
+def test_reader_skips_slot_being_written(tmp_path):
+    path = str(tmp_path / 'metrics.ring')
+    writer = RingWriter(path, slots=4)
+    for n in range(3):
+        writer.write(1000.0 + n, 0.0, 0.0, 0, 0)
+    # Nieparzysty seq - pisarz w trakcie zapisu slotu 1
+    offset = metrics_ring.HEADER_SIZE + metrics_ring.SLOT_SIZE
+    seq = metrics_ring.SEQ.unpack_from(writer._map, offset)[0]
+    metrics_ring.SEQ.pack_into(writer._map, offset, seq + 1)
+    reader = RingReader(path)
+    assert [s['timestamp'] for s in reader.read()] == [1000.0, 1002.0]
+
+    metrics_ring.SEQ.pack_into(writer._map, offset, seq + 2)
+    assert [s['timestamp'] for s in reader.read()] == [1000.0, 1001.0, 1002.0]
+    writer.close()
+    reader.close()
+
+def test_writer_recreates_ring_with_other_size(tmp_path):
+    path = str(tmp_path / 'metrics.ring')
+    writer = RingWriter(path, slots=4)
+    writer.write(1000.0, 0.0, 0.0, 0, 0)
+    writer.close()
+    writer = RingWriter(path, slots=8)
+    assert writer.write_count == 0
+    assert RingReader(path).read() == []
+    writer.close()
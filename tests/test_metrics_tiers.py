@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+import sqlite3
+import db
+import metrics_tiers
+from config import Config
+
+T0 = datetime(2026, 3, 1, 10, 0, 0)
+
+def _insert_samples(conn, start, count, step=timedelta(seconds=10)):
+    conn.executemany('''
+        INSERT INTO system_metrics (cpu_percent, memory_percent, disk_percent, timestamp,
+                                    net_sent_bytes, net_recv_bytes)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(float(n % 6), 50.0, 40.0, (start + n * step).strftime(metrics_tiers.TS_FORMAT), n * 100, n * 200)
+          for n in range(count)])
+    conn.commit()
+
+def _rows(conn, sql):
+    return conn.execute(sql).fetchall()
+
+def test_compaction_is_incremental(db_file):
+    conn = db.connect()
+    _insert_samples(conn, T0, 6 * 150)  # 2.5 h, co 10 s
+    steps, _deleted = metrics_tiers.compact(conn)
+    assert steps > 0
+
+    # Ostatnia (niepełna) minuta czeka na kolejne próbki; 1h tylko pełne godziny
+    minutes = _rows(conn, "SELECT bucket, samples, cpu_min, cpu_avg, cpu_max, net_sent_bytes FROM system_metrics_1m")
+    assert len(minutes) == 149
+    assert minutes[0] == ('2026-03-01 10:00:00', 6, 0.0, 2.5, 5.0, 500)
+    assert _rows(conn, "SELECT bucket, samples FROM system_metrics_1h") == \
+        [('2026-03-01 10:00:00', 360), ('2026-03-01 11:00:00', 360)]
+    assert metrics_tiers.get_watermark(conn.cursor(), '1m') == '2026-03-01 12:29:00'
+
+    # Bez nowych danych nic do zrobienia; nowe próbki kompaktujemy od znacznika
+    assert metrics_tiers.compact(conn)[0] == 0
+    _insert_samples(conn, T0 + timedelta(minutes=150), 6 * 40)
+    metrics_tiers.compact(conn)
+    assert _rows(conn, "SELECT COUNT(*), SUM(samples) FROM system_metrics_1m")[0] == (189, 189 * 6)
+    assert _rows(conn, "SELECT bucket, samples FROM system_metrics_1h")[-1] == ('2026-03-01 12:00:00', 360)
+    conn.close()
+
+def test_retention_waits_for_compaction(db_file, monkeypatch):
+    conn = db.connect()
+    monkeypatch.setattr(Config, 'METRICS_RAW_RETENTION_DAYS', 1 / 24)  # 1 h
+    monkeypatch.setattr(Config, 'METRICS_COMPACT_MAX_STEPS', 1)
+    monkeypatch.setattr(Config, 'METRICS_COMPACT_BATCH', 30)
+    _insert_samples(conn, T0, 6 * 180)  # 3 h
+
+    # Jedna paczka = 30 minut w 1m - starsze surowe próbki, ale jeszcze nieskompaktowane, zostają
+    steps, deleted = metrics_tiers.compact(conn)
+    assert steps == 1
+    assert deleted == 6 * 30
+    assert _rows(conn, "SELECT MIN(timestamp) FROM system_metrics")[0][0] == '2026-03-01 10:30:00'
+
+    while metrics_tiers.compact(conn)[0]:
+        pass
+    # Zostaje ostatnia godzina przed najnowszą próbką
+    assert _rows(conn, "SELECT MIN(timestamp) FROM system_metrics")[0][0] == '2026-03-01 11:59:50'
+    conn.close()
+
+def test_history_picks_tier_within_point_budget(db_file):
+    conn = db.connect(row_factory=sqlite3.Row)
+    _insert_samples(conn, T0, 6 * 180)
+    while metrics_tiers.compact(conn)[0]:
+        pass
+    start, end = T0, T0 + timedelta(hours=3)
+    assert metrics_tiers.history(conn, start, end, 2000)[0] == 'raw'
+    tier, rows = metrics_tiers.history(conn, start, end, 200)
+    assert tier == '1m'
+    # Agregaty do znacznika, reszta z surowych próbek
+    assert rows[0]['timestamp'] == '2026-03-01 10:00:00' and rows[-1]['timestamp'] == '2026-03-01 12:59:50'
+    tier, rows = metrics_tiers.history(conn, start, end, 20)
+    assert tier == '1h'
+    conn.close()
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+import db
+import net_rates
+from net_rates import WRAP_32, counter_delta
+
+MAX_RATE = 1.25e9
+
+def test_increase_is_plain_difference():
+    assert counter_delta(1000, 5000, 300, MAX_RATE) == 4000
+
+def test_wrap_near_32bit_limit():
+    assert counter_delta(WRAP_32 - 1000, 500, 300, MAX_RATE) == 1500
+
+def test_reset_below_4gib_is_not_a_wrap():
+    # ip link down/up: licznik od zera, a nie skok o ~4 GiB
+    assert counter_delta(3 * 2 ** 30 // 2, 10_000, 300, MAX_RATE) == 10_000
+    assert counter_delta(1_000_000, 10_000, 300, MAX_RATE) == 10_000
+
+def test_reset_of_64bit_counter():
+    assert counter_delta(2 ** 40, 10_000, 300, MAX_RATE) == 10_000
+
+def test_wrap_faster_than_possible_is_reset():
+    assert counter_delta(WRAP_32 - 1000, 10_000, 0.000001, MAX_RATE) == 10_000
+
+def test_compute_rates_after_reboot_counts_from_boot():
+    previous = {'eth0': {'timestamp': 1000, 'boot_time': 100, 'bytes_sent': 5000, 'bytes_recv': 5000,
+                         'packets_sent': 50, 'packets_recv': 50}}
+    current = {'eth0': {'bytes_sent': 600, 'bytes_recv': 600, 'packets_sent': 6, 'packets_recv': 6}}
+    rates = net_rates.compute_rates(previous, current, 1300, 1000)
+    assert rates['eth0']['seconds'] == 300
+    assert rates['eth0']['bytes_sent_rate'] == 2.0
+
+def test_history_buckets_use_local_time(db_file):
+    conn = db.connect()
+    end = datetime.now().replace(second=0, microsecond=0)
+    sample = end - timedelta(minutes=30)
+    conn.execute('''
+        INSERT INTO nic_rates (timestamp, nic, bytes_sent_rate, bytes_recv_rate,
+                               packets_sent_rate, packets_recv_rate, seconds)
+        VALUES (?, 'eth0', 100, 200, 1, 2, 300)
+    ''', (sample.strftime('%Y-%m-%d %H:%M:%S'),))
+    conn.commit()
+    data = net_rates.history(conn, end - timedelta(hours=1), end, 60)
+    conn.close()
+    index = data['timestamp'].index(sample.strftime('%Y-%m-%d %H:%M:%S'))
+    assert data['nics']['eth0']['bytes_sent_rate'][index] == 100
+    assert data['total']['bytes_recv_rate'][index] == 200
+    assert sum(value is not None for value in data['total']['bytes_sent_rate']) == 1
@@ -0,0 +1,81 @@
+from datetime import datetime
+import db
+from password_spray import SprayDetector
+
+def _failed(username, ip, when=None):
+    return (when or datetime.now(), username, ip, None, 22, 'failed', 'Failed password')
+
+def _state(conn):
+    return {(kind, key, generation): data for generation, kind, key, data
+            in conn.execute("SELECT generation, kind, key, data FROM sketch_state")}
+
+def test_spray_alert_for_many_sources(db_file):
+    conn = db.connect()
+    detector = SprayDetector()
+    events = [_failed('admin', f'198.51.{i // 250}.{i % 250}') for i in range(60)]
+    assert detector.observe(conn.cursor(), events) >= 1
+    alerts = conn.execute("SELECT alert_type, details FROM alerts").fetchall()
+    assert ('password_spray_user', 'admin') in alerts
+    conn.close()
+
+def test_checkpoint_writes_only_changed_sketches(db_file):
+    conn = db.connect()
+    cursor = conn.cursor()
+    detector = SprayDetector()
+    detector.observe(cursor, [_failed(f'user{u}', f'203.0.113.{i}') for u in range(10) for i in range(10)])
+    first = detector.checkpoint(cursor)
+    conn.commit()
+    before = _state(conn)
+    assert first == len(before)
+
+    # Jedno nowe źródło dla user3 - zmienia się Count-Min i co najwyżej HLL user3 oraz podsieci
+    detector.observe(cursor, [_failed('user3', '192.0.2.77')])
+    written = detector.checkpoint(cursor)
+    conn.commit()
+    after = _state(conn)
+    assert written <= 4
+    assert before.keys() <= after.keys()
+    changed = {key for key in after if before.get(key) != after[key]}
+    assert {kind for kind, _key, _gen in changed} <= {'user_attempts', 'subnet_attempts',
+                                                      'user_sources', 'subnet_users'}
+    assert all(key in ('', 'user3', '192.0.2.0/24') for _kind, key, _gen in changed)
+
+    # Bez zmian - nic do zapisania
+    assert detector.checkpoint(cursor) == 0
+    conn.close()
+
+def test_restore_from_checkpoint(db_file):
+    conn = db.connect()
+    cursor = conn.cursor()
+    detector = SprayDetector()
+    detector.observe(cursor, [_failed('root', f'198.51.100.{i}') for i in range(15)])
+    detector.checkpoint(cursor)
+    conn.commit()
+
+    restored = SprayDetector()
+    restored.load(cursor)
+    original = detector.current.tracked['user_sources']['root']
+    assert restored.current.tracked['user_sources']['root'].registers == original.registers
+    assert restored.current.user_attempts.estimate('root') == 15
+    # Kolejne źródła doliczają się do wczytanego stanu i przekraczają próg
+    assert restored.observe(cursor, [_failed('root', f'198.51.101.{i}') for i in range(15)]) == 1
+    conn.close()
+
+def test_load_restores_weights_whatever_the_row_order(db_file):
+    conn = db.connect()
+    cursor = conn.cursor()
+    detector = SprayDetector()
+    detector.observe(cursor, [_failed(f'user{u}', f'203.0.113.{i}') for u in range(3) for i in range(u * 5 + 5)])
+    detector.checkpoint(cursor)
+    # Count-Min zapisany ponownie - w ORDER BY generation przychodzi po HLL-ach
+    counts = conn.execute("SELECT generation, kind, key, data FROM sketch_state "
+                          "WHERE kind IN ('user_attempts', 'subnet_attempts')").fetchall()
+    conn.execute("DELETE FROM sketch_state WHERE kind IN ('user_attempts', 'subnet_attempts')")
+    conn.executemany("INSERT INTO sketch_state (generation, kind, key, data) VALUES (?, ?, ?, ?)", counts)
+    conn.commit()
+
+    restored = SprayDetector()
+    restored.load(cursor)
+    assert restored.current.weights == detector.current.weights
+    assert restored.current.weights['user_sources']['user2'] == 15
+    conn.close()
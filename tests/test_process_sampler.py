@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+import time
+import uuid
+from process_sampler import ProcessSampler
+
+def test_cpu_measured_between_ticks_and_dead_processes_dropped():
+    # Wzorce unikalne dla przebiegu - nie mogą trafić w linię poleceń innego procesu
+    marker = f'hoblera-sampler-{os.getpid()}-{uuid.uuid4().hex}'
+    absent = f'hoblera-absent-{uuid.uuid4().hex}'
+    busy = subprocess.Popen([sys.executable, '-c', 'while True: pass', marker])
+    sampler = ProcessSampler(top_k=3)
+    try:
+        assert sampler.latest() is None
+        sampler.tick()
+        time.sleep(0.5)
+        sampler.tick()
+        found = sampler.find([marker, absent])
+        assert list(found) == [marker]
+        assert found[marker]['pid'] == busy.pid
+        # Procent CPU od poprzedniego ticku, a nie 0.0 z pierwszego wywołania
+        assert found[marker]['cpu_percent'] > 10
+        latest = sampler.latest()
+        assert len(latest['by_cpu']) == 3 and 'cmdline' not in latest['by_cpu'][0]
+    finally:
+        busy.kill()
+        busy.wait()
+    sampler.tick()
+    assert sampler.find([marker]) == {}
+    assert busy.pid not in sampler._procs
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+import db
+import rollups
+
+DAY = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _event(timestamp, ip, status='failed'):
+    return (timestamp, 'root', ip, None, 22, status, 'Failed password')
+
+def _insert(conn, events):
+    db.insert_ssh_events(conn.cursor(), events)
+    conn.commit()
+
+def _raw_count(conn, start, end):
+    return conn.execute("SELECT COUNT(*) FROM ssh_logs WHERE timestamp >= ? AND timestamp < ?",
+                        (start.strftime(rollups.TS_FORMAT), end.strftime(rollups.TS_FORMAT))).fetchone()[0]
+
+def test_unique_ips_across_batches(db_file):
+    conn = db.connect(writer=True)
+    nine = DAY.replace(hour=9)
+    _insert(conn, [_event(nine + timedelta(minutes=n), f'203.0.113.{n % 3}') for n in range(6)])
+    # Drugi batch: dwa znane IP i jedno nowe w tej samej godzinie, jedno w nowej
+    _insert(conn, [_event(nine + timedelta(minutes=30), '203.0.113.1'),
+                   _event(nine + timedelta(minutes=31), '203.0.113.9'),
+                   _event(nine + timedelta(minutes=70), '203.0.113.1')])
+    hourly = conn.execute("SELECT bucket, count, unique_ips FROM ssh_rollup_hourly ORDER BY bucket").fetchall()
+    assert [(bucket[11:13], count, unique) for bucket, count, unique in hourly] == [('09', 8, 4), ('10', 1, 1)]
+    assert conn.execute("SELECT count, unique_ips FROM ssh_rollup_daily").fetchall() == [(9, 4)]
+    conn.close()
+
+def test_counts_match_raw_logs_for_any_range(db_file):
+    conn = db.connect(writer=True)
+    statuses = ('failed', 'invalid', 'accepted')
+    _insert(conn, [_event(DAY + timedelta(minutes=7 * n), f'198.51.100.{n % 11}', statuses[n % 3])
+                   for n in range(600)])  # ~70 h
+    ranges = [(DAY + timedelta(minutes=13), DAY + timedelta(minutes=95)),            # surowe
+              (DAY + timedelta(hours=1, minutes=20), DAY + timedelta(hours=30, minutes=5)),  # godzinowe
+              (DAY + timedelta(minutes=50), DAY + timedelta(days=9))]                # dzienne
+    assert [rollups.pick_tier(start, end) for start, end in ranges] == ['raw', 'hourly', 'daily']
+    for start, end in ranges:
+        counts = rollups.ssh_counts(conn, start, end)
+        assert counts['total'] == _raw_count(conn, start, end)
+        timeline = rollups.ssh_timeline(conn, start, end)
+        assert sum(row['count'] for row in timeline) == _raw_count(conn, start, end)
+    conn.close()
+
+def test_timeline_columns_fill_empty_buckets(db_file):
+    conn = db.connect(writer=True)
+    _insert(conn, [_event(DAY.replace(hour=2, minute=5), '203.0.113.1'),
+                   _event(DAY.replace(hour=5, minute=5), '203.0.113.2', 'accepted')])
+    data = rollups.ssh_timeline_columns(conn, DAY, DAY.replace(hour=6))
+    assert data['tier'] == 'hourly' and data['bucket_seconds'] == 3600
+    assert data['failed'] == [0, 0, 1, 0, 0, 0]
+    assert data['accepted'] == [0, 0, 0, 0, 0, 1]
+    # Sklejanie kubełków: liczby się sumują
+    data = rollups.ssh_timeline_columns(conn, DAY, DAY.replace(hour=6), max_points=3)
+    assert data['bucket_seconds'] == 7200 and data['failed'] == [0, 1, 0] and data['accepted'] == [0, 0, 1]
+    conn.close()
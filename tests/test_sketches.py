@@ -0,0 +1,37 @@
+from sketches import CountMinSketch, HyperLogLog
+
+def test_hll_merge_counts_union():
+    a, b = HyperLogLog(p=10), HyperLogLog(p=10)
+    for n in range(3000):
+        a.add(f'10.0.{n // 256}.{n % 256}')
+    for n in range(2000, 5000):
+        b.add(f'10.0.{n // 256}.{n % 256}')
+    union = a.count(b)
+    # Błąd standardowy ~3% dla p=10; zostawiamy zapas na 3 sigma
+    assert abs(union - 5000) < 5000 * 0.1
+    assert abs(a.count() - 3000) < 3000 * 0.1
+    a.merge(b)
+    assert a.count() == union
+
+def test_hll_roundtrip_and_small_counts():
+    hll = HyperLogLog(p=8)
+    for value in ('root', 'admin', 'root', 'test'):
+        hll.add(value)
+    assert hll.count() == 3
+    assert not hll.add('root')
+    restored = HyperLogLog.from_bytes(hll.to_bytes())
+    assert (restored.p, restored.registers) == (8, hll.registers)
+
+def test_cms_merge_never_underestimates():
+    a, b = CountMinSketch(width=64, depth=4), CountMinSketch(width=64, depth=4)
+    truth = {}
+    for n in range(500):
+        key = f'user{n % 97}'
+        (a if n % 2 else b).add(key)
+        truth[key] = truth.get(key, 0) + 1
+    a.merge(b)
+    restored = CountMinSketch.from_bytes(a.to_bytes())
+    for key, count in truth.items():
+        assert restored.estimate(key) >= count
+    # Zawyżenie ograniczone przez e/width * suma (z dużym prawdopodobieństwem)
+    assert max(restored.estimate(key) - count for key, count in truth.items()) <= 500 * 2.72 / 64
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+import os
+import sqlite3
+import pytest
+import db
+import rollups
+import ssh_partitions
+from config import Config
+
+def _old_month():
+    """Miesiąc sprzed dwóch miesięcy - maintain() zawsze go zamyka"""
+    first = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return ((first - timedelta(days=1)).replace(day=1) - timedelta(days=1)).replace(day=1)
+
+def _event(timestamp, ip, status='failed'):
+    return (timestamp, 'root', ip, None, 22, status, 'Failed password')
+
+def _insert(events):
+    conn = db.connect(writer=True)
+    try:
+        db.insert_ssh_events(conn.cursor(), events)
+        conn.commit()
+    finally:
+        conn.close()
+
+@pytest.fixture
+def sealed_month(db_file):
+    """Zdarzenia 10. dnia starego miesiąca (11:00-12:59), miesiąc zamknięty"""
+    day = _old_month().replace(day=10)
+    _insert([_event(day.replace(hour=11 + n % 2, minute=n), f'203.0.113.{n % 5}') for n in range(40)])
+    conn = db.connect(writer=True)
+    try:
+        sealed, _dropped = ssh_partitions.maintain(conn)
+    finally:
+        conn.close()
+    assert sealed == [day.strftime('%Y-%m')]
+    return day
+
+def test_timeline_inside_sealed_month_uses_rollups(sealed_month):
+    conn = db.connect()
+    try:
+        assert ssh_partitions.raw_since(conn) > sealed_month
+        # Zakres krótszy niż ROLLUP_RAW_MAX_HOURS i z niepełnymi godzinami na obu brzegach
+        start, end = sealed_month.replace(hour=11, minute=30), sealed_month.replace(hour=12, minute=30)
+        timeline = rollups.ssh_timeline(conn, start, end)
+        assert [(row['hour'][11:13], row['count'], row['unique_ips']) for row in timeline] == \
+            [('11', 20, 5), ('12', 20, 5)]
+        assert rollups.ssh_counts(conn, start, end)['failed'] == 40
+    finally:
+        conn.close()
+
+def test_plan_segments_before_raw_since():
+    raw_since = datetime(2026, 10, 1)
+    start, end = datetime(2026, 8, 10, 11, 30), datetime(2026, 8, 10, 12, 30)
+    assert rollups.plan_segments(start, end, raw_since=raw_since) == \
+        [('hourly', datetime(2026, 8, 10, 11), datetime(2026, 8, 10, 13))]
+    # Zakres przez granicę raw_since: stary brzeg z agregatu, nowy z surowych logów
+    start, end = datetime(2026, 9, 30, 22, 30), datetime(2026, 10, 1, 1, 30)
+    assert rollups.plan_segments(start, end, 'hourly', raw_since) == [
+        ('hourly', datetime(2026, 9, 30, 22), datetime(2026, 10, 1, 1)),
+        ('raw', datetime(2026, 10, 1, 1), end),
+    ]
+    assert rollups.plan_segments(start, end, 'raw', None) == [('raw', start, end)]
+
+def test_seal_compresses_and_catalogs_month(sealed_month):
+    month = sealed_month.strftime('%Y-%m')
+    assert ssh_partitions.list_partitions()[month] is True
+    assert not os.path.exists(ssh_partitions.partition_path(month))
+    conn = db.connect()
+    try:
+        rows, sealed_at = conn.execute("SELECT rows, sealed_at FROM ssh_partitions WHERE month = ?",
+                                       (month,)).fetchone()
+        assert rows == 40 and sealed_at is not None
+        # Zbiory IP kubełków zamkniętego miesiąca są już zbędne
+        assert conn.execute("SELECT COUNT(*) FROM ssh_rollup_seen_ips").fetchone()[0] == 0
+        assert month not in ssh_partitions.attached_months(conn)
+        schema = ssh_partitions.open_archive(conn, month)
+        assert conn.execute(f"SELECT COUNT(*) FROM {schema}.ssh_logs").fetchone()[0] == 40
+    finally:
+        conn.close()
+
+def test_reader_attaches_read_only(db_file):
+    _insert([_event(datetime.now(), '203.0.113.1')])
+    conn = db.connect()
+    try:
+        month = ssh_partitions.current_month()
+        assert ssh_partitions.attached_months(conn) == [month]
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute(f"DELETE FROM {ssh_partitions.insert_table(month)}")
+        # Czytelnik nie rozpakowuje ani nie tworzy partycji
+        ssh_partitions.attach(conn, extra_months=['2001-01'])
+        assert ssh_partitions.attached_months(conn) == [month]
+        assert '2001-01' not in ssh_partitions.list_partitions()
+    finally:
+        conn.close()
+
+def test_late_event_reopens_sealed_month(sealed_month):
+    month = sealed_month.strftime('%Y-%m')
+    conn = db.connect(writer=True)
+    try:
+        newest = conn.execute("SELECT MAX(last_id) FROM ssh_partitions").fetchone()[0]
+        late = sealed_month.replace(hour=11, minute=50)
+        # Jedno znane IP tego kubełka i jedno nowe
+        db.insert_ssh_events(conn.cursor(), [_event(late, '203.0.113.1'), _event(late, '203.0.113.99')])
+        conn.commit()
+
+        assert ssh_partitions.list_partitions()[month] is False
+        rows, last_id, sealed_at = conn.execute(
+            "SELECT rows, last_id, sealed_at FROM ssh_partitions WHERE month = ?", (month,)).fetchone()
+        assert (rows, last_id, sealed_at) == (42, newest + 2, None)
+        hourly = conn.execute("SELECT count, unique_ips FROM ssh_rollup_hourly WHERE bucket = ?",
+                              (late.strftime(rollups.HOUR_FORMAT),)).fetchone()
+        assert hourly == (22, 6)
+    finally:
+        conn.close()
+
+    # Kolejne maintain() zamyka miesiąc ponownie
+    conn = db.connect(writer=True)
+    try:
+        assert ssh_partitions.maintain(conn)[0] == [month]
+    finally:
+        conn.close()
+
+def test_ensure_refuses_attach_inside_transaction(db_file):
+    conn = db.connect(writer=True)
+    try:
+        conn.execute("INSERT INTO alerts (alert_type, severity, message) VALUES ('test', 'info', 'x')")
+        with pytest.raises(RuntimeError):
+            ssh_partitions.ensure(conn, ['2001-01'])
+        # Niezatwierdzona transakcja nie została zatwierdzona po cichu
+        conn.rollback()
+        assert conn.execute("SELECT COUNT(*) FROM alerts").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+def test_retention_drops_old_archives(sealed_month, monkeypatch):
+    monkeypatch.setattr(Config, 'SSH_RETENTION_MONTHS', 1)
+    month = sealed_month.strftime('%Y-%m')
+    conn = db.connect(writer=True)
+    try:
+        assert ssh_partitions.maintain(conn) == ([], [month])
+        assert month not in ssh_partitions.list_partitions()
+        assert conn.execute("SELECT COUNT(*) FROM ssh_partitions WHERE month = ?", (month,)).fetchone()[0] == 0
+    finally:
+        conn.close()
@@ -0,0 +1,55 @@
+import os
+import pytest
+from config import Config
+import systemd_status
+
+FAKE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_systemctl')
+
+@pytest.fixture
+def fake_systemctl(tmp_path, monkeypatch):
+    """Atrapa systemctl; zwraca plik z argumentami kolejnych wywołań"""
+    log = tmp_path / 'calls'
+    monkeypatch.setattr(Config, 'SYSTEMCTL_BIN', FAKE)
+    monkeypatch.setenv('FAKE_SYSTEMCTL_LOG', str(log))
+    monkeypatch.setattr(systemd_status, '_cache', {})
+    return log
+
+def test_blocks_map_to_units_in_argument_order(fake_systemctl):
+    statuses = systemd_status.query_units(['cron', 'sshd', 'nginx'])
+    assert statuses['cron']['active_state'] == 'failed'
+    assert statuses['cron']['main_pid'] is None
+    assert statuses['sshd']['id'] == 'ssh.service'
+    assert statuses['sshd']['memory_bytes'] is None
+    assert statuses['sshd']['cpu_nsec'] is None
+    assert statuses['nginx']['main_pid'] == 812
+    assert systemd_status.summarize(statuses['nginx']) == {
+        'active': True, 'status': 'active', 'sub_state': 'running', 'main_pid': 812,
+        'memory_mb': 50.0, 'cpu_seconds': 1.5,
+    }
+
+def test_missing_unit_is_inactive_not_shifted(fake_systemctl):
+    statuses = systemd_status.query_units(['nginx', 'no-such-app', 'sshd'])
+    assert statuses['no-such-app']['load_state'] == 'not-found'
+    assert statuses['no-such-app']['active_state'] == 'inactive'
+    assert statuses['sshd']['id'] == 'ssh.service'
+    assert statuses['nginx']['id'] == 'nginx.service'
+
+def test_block_count_mismatch_reports_unknown(fake_systemctl, monkeypatch):
+    monkeypatch.setenv('FAKE_SYSTEMCTL_MODE', 'short')
+    statuses = systemd_status.query_units(['nginx', 'sshd'])
+    assert {status['active_state'] for status in statuses.values()} == {'unknown'}
+
+def test_missing_binary_reports_unknown(fake_systemctl, monkeypatch):
+    monkeypatch.setattr(Config, 'SYSTEMCTL_BIN', '/nonexistent/systemctl')
+    assert systemd_status.query_units(['nginx'])['nginx']['active_state'] == 'unknown'
+
+def test_one_call_for_all_units_and_cache(fake_systemctl):
+    systemd_status.get_unit_statuses(['nginx', 'sshd', 'cron'])
+    systemd_status.get_unit_statuses(['nginx', 'sshd', 'cron'])
+    calls = fake_systemctl.read_text().splitlines()
+    assert len(calls) == 1
+    assert calls[0].endswith('-- nginx sshd cron')
+    # Nowy unit - jedno wywołanie tylko dla niego
+    statuses = systemd_status.get_unit_statuses(['nginx', 'docker'])
+    assert fake_systemctl.read_text().splitlines()[1].endswith('-- docker')
+    assert statuses['docker']['load_state'] == 'not-found'